@@ -6,18 +6,13 @@
 # This script looks for files in the /agave/inputs directory whose names are the id's of the inputs
 # and whose contents are the URIs to pass to the agave job.
 
-# compiles a job template with the following:
+# builds a job description with the following:
 #   app_id: the app to submit to
 #   system_id: the system to archive to
-#   inputs: list of objects with the following:
-#       id: the id for the input
-#       uris: list of objects with the following:
-#           - uri_str: the full URI including quotes and trailing comma,
-#                      e.g. "agave://example.orf//data/input.txt",
-#
-#   parameters: list of objects with the following:
-#       id: the id for the parameter
-#       value: the value for the parameter; this needs to be the proper JSON object with quotes and trailing commas.
+#   inputs: list of (input_id, uris) pairs where uris is the list of URIs to pass for that input,
+#       e.g. ('input_id', ['agave://example.orf//data/input.txt'])
+#   parameters: dictionary mapping each parameter id to its value as given on the command line; values are
+#       converted to the proper JSON type by core.jobs.param_value.
 
 
 
@@ -27,23 +22,24 @@ import sys
 
 sys.path.append('/')
 
-import jinja2
-
 from agavepy.agave import Agave
-from core.template import ConfigGen
 from core.error import Error
-from core.executors import AgaveAsyncResponse
+from core.executors import AgaveAsyncResponse, TERMINAL_JOB_STATUSES
+from core.jobs import app_job
+from core.journal import Journal
 
 
 HERE = os.path.dirname(os.path.abspath((__file__)))
 
-JOB_TEMPLATE = '/job.j2'
-
 VERIFY = False
 
+# journal of the job submitted by this container, kept with the outputs on the host so that a container started again
+# after an interruption reattaches to the job instead of submitting it again.
+JOURNAL = Journal('/agave/outputs/.eod_job.json')
+
 def get_inputs():
-    """Returns a list of dictionaries of the form
-    [ { 'id': <input_id>, 'uris': [<uri_1>, ...,<uri_n>] }]. """
+    """Returns a list of pairs of the form
+    [ (<input_id>, [<uri_1>, ...,<uri_n>]) ]. """
     # immediate subdirectories are the input ids
     input_ids = [y for y in os.listdir('/agave/inputs') if os.path.isdir(os.path.join('/agave/inputs', y))]
     inputs = []
@@ -53,10 +49,8 @@ def get_inputs():
             with open(os.path.join('/agave/inputs/',input_id, name), 'r') as f:
                 uri = f.readline().strip('\n')
                 if '://' in uri:
-                    uris.append('"' + uri + '",')
-        # remove trailing comma from last entry:
-        uris[-1] = uris[-1][:-1]
-        inputs.append({'id': input_id, 'uris': uris})
+                    uris.append(uri)
+        inputs.append((input_id, uris))
     return inputs
 
 def get_outputs():
@@ -70,33 +64,10 @@ def get_outputs():
             outputs.append(line.strip('\n'))
     return outputs
 
-def quote(elm):
-    """Custom jinja2 filter to properly quote an element of a JSON document."""
-    try:
-        int(elm)
-    except (TypeError, ValueError):
-        if isinstance(elm, str):
-            if elm.lower() == 'true' or elm.lower() == 'false':
-                return elm.lower()
-            return '"{}"'.format(elm)
-    return elm
-
 def submit_job(app_id, inputs, params, outputs, system_id,
                access_token, refresh_token, api_server, api_key, api_secret, verify):
-    parameters = []
-    for k,v in params.items():
-        parm = {'id':k, 'value': v}
-        parameters.append(parm)
-    print("parameters: {}".format(parameters))
-    context = {'app_id': app_id,
-               'system_id': system_id,
-               'inputs': inputs,
-               'parameters': parameters,
-               }
-    conf = ConfigGen(JOB_TEMPLATE)
-    env = jinja2.Environment(loader=jinja2.FileSystemLoader(HERE), trim_blocks=True, lstrip_blocks=True)
-    env.filters['quote'] = quote
-    job = conf.compile(context, env)
+    print("parameters: {}".format(params))
+    job = app_job(app_id, inputs, params, system_id)
 
     ag = Agave(api_server=api_server,
                api_key=api_key,
@@ -104,12 +75,23 @@ def submit_job(app_id, inputs, params, outputs, system_id,
                token=access_token,
                refresh_token=refresh_token,
                verify=verify)
+    job_id = JOURNAL.find_job(app_id, job)
+    if job_id:
+        try:
+            rsp = ag.jobs.get(jobId=job_id)
+        except Exception as e:
+            print("Unable to retrieve job {} submitted previously: {}".format(job_id, e))
+            rsp = None
+        if rsp and not (rsp.get('status') in TERMINAL_JOB_STATUSES and not rsp.get('status') == 'FINISHED'):
+            print("Reattaching to job submitted previously. job_id:{}".format(job_id))
+            return AgaveAsyncResponse(ag, rsp), job_id
     print("Submitting job: {}".format(job))
     try:
         rsp = ag.jobs.submit(body=job)
     except Exception as e:
         raise Error("Got an exception trying to submit the job: {}".format(e))
     job_id = rsp.get('id')
+    JOURNAL.job_submitted(app_id, job, job_id)
     print("Job submitted. job_id:{}".format(job_id))
     return AgaveAsyncResponse(ag, rsp), job_id
 
@@ -188,9 +170,11 @@ def main():
     print("Async response object from submit: {}".format(rsp.response))
     result = rsp.result()
     if not result == 'FINISHED':
+        JOURNAL.job_failed(app_id)
         raise Error("Job for app_id: " + app_id + " failed to complete. Job status: " + result + ". URL: " + rsp.url)
     print("Job completed.")
     write_outputs(outputs, job_id, api_server)
+    JOURNAL.task_done(app_id)
     print("Outputs written:{}".format(outputs))
 
 
@@ -0,0 +1,53 @@
+"""
+Storing benchmark results as a baseline and comparing later runs against it.
+
+A baseline is a JSON file mapping scenario names to dictionaries of metrics. All compared metrics are "lower is
+better" (seconds, bytes of memory, ...).
+"""
+
+from __future__ import print_function
+
+import json
+import os
+
+
+def save(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print("Baseline written to: {}".format(path))
+
+def compare(results, baseline, tolerance, metrics):
+    """Return a list of regressions of results with respect to baseline."""
+    regressions = []
+    for name, result in sorted(results.items()):
+        if not name in baseline:
+            continue
+        for metric in metrics:
+            old, new = baseline[name].get(metric), result.get(metric)
+            if old and new is not None and new > old * (1 + tolerance):
+                regressions.append("{} {}: {:.4g} -> {:.4g} (+{:.0%})".format(name, metric, old, new, new / old - 1))
+    return regressions
+
+def check(results, path, tolerance, metrics, save_baseline=False):
+    """
+    Save results as the baseline at path if save_baseline is set, otherwise compare them to it. Returns the exit
+    status for the benchmark: 1 if anything regressed by more than tolerance, 0 otherwise. Baselines depend on the
+    machine they were recorded on, so none is committed and a missing one is only a warning.
+    """
+    if save_baseline:
+        save(results, path)
+        return 0
+    if not os.path.exists(path):
+        print("Warning: no baseline at {}, so regressions are not checked; record one on this machine with "
+              "--save-baseline.".format(path))
+        return 0
+    with open(path) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, tolerance, metrics)
+    if regressions:
+        print("REGRESSIONS (tolerance {:.0%}):".format(tolerance))
+        for regression in regressions:
+            print("  " + regression)
+        return 1
+    print("No regressions with respect to {}.".format(path))
+    return 0
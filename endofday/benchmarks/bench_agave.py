@@ -0,0 +1,184 @@
+"""
+Benchmark of the Agave transfer and job submission paths against the local fake Agave server.
+
+Drives AgaveExecutor the same way a workflow run does and reports, for each operation, the number of operations,
+the wall clock time, the throughput and the median and 95th percentile latency:
+  - mkdir: create_dir() of remote working directories,
+  - upload: upload_file() followed by wait_for_uploads(),
+  - download: download_file() of the uploaded files,
+  - jobs: submit() of eod jobs followed by wait_for_job() until they finish. The reported latency is the time
+    from the moment a job finished on the server to the moment the engine noticed, i.e. the polling overhead.
+
+Results are compared to a stored baseline and the benchmark exits with a non-zero status if any metric regressed by
+more than the tolerance.
+
+To run the benchmark from the endofday directory:
+    $ python -m benchmarks.bench_agave --jobs 500 --concurrency 500 --latency 0.02 --job-duration 10
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from core.executors import AgaveExecutor
+from core.jobs import eod_job
+
+from . import baseline
+from .fake_agave import FakeAgave
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_BASELINE = os.path.join(HERE, 'agave_baseline.json')
+
+STORAGE_SYSTEM = 'bench.storage'
+
+# metrics compared against the baseline; lower is better for all of them
+METRICS = ('seconds', 'p50_seconds', 'p95_seconds')
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def run_concurrently(fn, items, concurrency):
+    """Call fn on every item from concurrency threads. Returns (wall clock seconds, list of fn results)."""
+    items = list(items)
+    results = [None] * len(items)
+    errors = []
+    lock = threading.Lock()
+    position = [0]
+
+    def worker():
+        while True:
+            with lock:
+                idx = position[0]
+                position[0] += 1
+            if idx >= len(items) or errors:
+                return
+            try:
+                results[idx] = fn(items[idx])
+            except BaseException as e:
+                errors.append(e)
+                return
+
+    start = time.time()
+    threads = [threading.Thread(target=worker) for _ in range(min(concurrency, len(items)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return time.time() - start, results
+
+def summary(seconds, latencies, size=None):
+    result = {'count': len(latencies),
+              'seconds': seconds,
+              'ops_per_second': len(latencies) / seconds,
+              'p50_seconds': percentile(latencies, 0.5),
+              'p95_seconds': percentile(latencies, 0.95)}
+    if size is not None:
+        result['mb_per_second'] = len(latencies) * size / seconds / 1e6
+    return result
+
+def timed(fn):
+    def wrapper(item):
+        start = time.time()
+        fn(item)
+        return time.time() - start
+    return wrapper
+
+def bench_mkdir(executor, count, concurrency):
+    seconds, latencies = run_concurrently(timed(lambda idx: executor.create_dir('bench/dir_{}'.format(idx))),
+                                          range(count), concurrency)
+    return summary(seconds, latencies)
+
+def bench_upload(executor, paths, concurrency, size):
+    def upload(path):
+        executor.wait_for_uploads([executor.upload_file(local_path=path, remote_path='bench/files')])
+    seconds, latencies = run_concurrently(timed(upload), paths, concurrency)
+    return summary(seconds, latencies, size)
+
+def bench_download(executor, paths, concurrency, size):
+    def download(path):
+        executor.download_file(local_path=path + '.down',
+                               remote_path=os.path.join('bench/files', os.path.basename(path)))
+    seconds, latencies = run_concurrently(timed(download), paths, concurrency)
+    return summary(seconds, latencies, size)
+
+def bench_jobs(executor, server, count, concurrency):
+    wf_path = 'agave://{}//{}/bench/wf.yml'.format(STORAGE_SYSTEM, executor.home_dir)
+    job_duration = server.state.job_duration
+
+    def submit_and_wait(idx):
+        job = eod_job('bench', wf_path, [], STORAGE_SYSTEM, task_name='task_{}'.format(idx))
+        rsp = executor.submit(job, 'task_{}'.format(idx))
+        submitted = server.state.jobs[rsp.response.get('id')]['submitted']
+        result = executor.wait_for_job(rsp, 'task_{}'.format(idx))
+        if not result == 'FINISHED':
+            raise RuntimeError("Job {} ended with status {}".format(rsp.response.get('id'), result))
+        # time between the job finishing on the server and the engine noticing
+        return time.time() - (submitted + job_duration)
+
+    seconds, latencies = run_concurrently(submit_and_wait, range(count), concurrency)
+    return summary(seconds, latencies)
+
+def main(args):
+    server = FakeAgave(latency=args.latency, bandwidth=args.bandwidth, job_duration=args.job_duration,
+                       token_lifetime=args.token_lifetime, home_dir='/').start()
+    work_dir = tempfile.mkdtemp(prefix='eod_bench_agave')
+    stdout = sys.stdout
+    results = {}
+    try:
+        # the executor reports every operation on stdout; keep only the benchmark report.
+        sys.stdout = open(os.devnull, 'w')
+        executor = AgaveExecutor('bench', url=server.url, username='bench', password='bench', client_name='bench',
+                                 client_key='bench', client_secret='bench', storage_system=STORAGE_SYSTEM,
+                                 home_dir='bench', verify=False)
+        paths = []
+        for idx in range(args.files):
+            path = os.path.join(work_dir, 'file_{}.dat'.format(idx))
+            with open(path, 'wb') as f:
+                f.write(b'x' * args.bytes)
+            paths.append(path)
+        results['mkdir'] = bench_mkdir(executor, args.files, args.concurrency)
+        results['upload'] = bench_upload(executor, paths, args.concurrency, args.bytes)
+        results['download'] = bench_download(executor, paths, args.concurrency, args.bytes)
+        results['jobs'] = bench_jobs(executor, server, args.jobs, args.concurrency)
+    finally:
+        sys.stdout = stdout
+        shutil.rmtree(work_dir)
+        server.stop()
+    for name in ('mkdir', 'upload', 'download', 'jobs'):
+        result = results[name]
+        line = "{:<9} count: {:>5}  wall: {:>7.2f}s  ops/s: {:>8.1f}  p50: {:>7.3f}s  p95: {:>7.3f}s".format(
+            name, result['count'], result['seconds'], result['ops_per_second'], result['p50_seconds'],
+            result['p95_seconds'])
+        if 'mb_per_second' in result:
+            line += "  MB/s: {:>7.2f}".format(result['mb_per_second'])
+        print(line)
+    print("Requests served: " + ", ".join("{} {}".format(k, v) for k, v in sorted(server.state.counts.items())))
+    return baseline.check(results, args.baseline, args.tolerance, METRICS, args.save_baseline)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark Agave transfers and job submission against a fake server.')
+    parser.add_argument('-j', '--jobs', type=int, default=100, help='Number of jobs to submit')
+    parser.add_argument('-f', '--files', type=int, default=100, help='Number of files to upload and download')
+    parser.add_argument('-b', '--bytes', type=int, default=1 << 20, help='Size of every file')
+    parser.add_argument('-c', '--concurrency', type=int, default=32, help='Number of concurrent operations')
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds added to every request')
+    parser.add_argument('--bandwidth', type=float, help='File transfer rate limit in bytes per second')
+    parser.add_argument('--job-duration', type=float, default=5.0, help='Seconds from submission to FINISHED')
+    parser.add_argument('--token-lifetime', type=float, help='Seconds after which access tokens expire')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline file to compare to')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative increase of a metric before it counts as a regression')
+    parser.add_argument('--save-baseline', action='store_true', help='Record the results as the new baseline')
+    sys.exit(main(parser.parse_args()))
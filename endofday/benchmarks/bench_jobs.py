@@ -0,0 +1,67 @@
+"""
+Microbenchmark of job document generation throughput.
+
+Measures the number of job descriptions and sub-workflow definitions generated per second, both with the shared,
+compile-once template environment and with a fresh jinja2 environment per document (the behavior of earlier
+releases).
+
+To run the benchmark from the endofday directory:
+    $ python -m benchmarks.bench_jobs -n 2000
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+
+import jinja2
+
+from core.jobs import eod_job
+from core.template import ConfigGen, HERE
+
+SYSTEM_ID = 'endofday.local.storage.com'
+WF_PATH = 'agave://endofday.local.storage.com//home/jdoe/bench_wf/task/task.yml'
+EOD_CONF = ConfigGen('eod.j2')
+
+
+def task_context(num_inputs):
+    inputs = [{'src': 'input_{}.txt'.format(idx), 'label': 'input_{}'.format(idx)} for idx in range(num_inputs)]
+    process = {'name': 'task',
+               'image': 'jstubbs/add_n',
+               'command': 'python add_n.py -i 5',
+               'inputs': [{'label': 'inputs.' + inp['label'], 'dest': '/data/' + inp['src']} for inp in inputs],
+               'outputs': [{'src': '/data/output.txt', 'label': 'output'}]}
+    return {'wf_name': 'task', 'global_inputs': inputs, 'processes': [process]}
+
+def job_document(input_uris):
+    return eod_job('bench_wf', WF_PATH, input_uris, SYSTEM_ID, task_name='task', email='jdoe@example.com')
+
+def cached_defn(context):
+    return EOD_CONF.compile(context)
+
+def uncached_defn(context):
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(HERE), trim_blocks=True, lstrip_blocks=True)
+    return EOD_CONF.compile(context, env)
+
+def rate(fn, arg, number):
+    seconds = min(timeit.repeat(lambda: fn(arg), number=number, repeat=3))
+    return number / seconds
+
+def main(number, num_inputs):
+    context = task_context(num_inputs)
+    input_uris = ['agave://{}//home/jdoe/bench_wf/{}'.format(SYSTEM_ID, inp['src'])
+                  for inp in context['global_inputs']]
+    print("Documents per second ({} inputs, best of 3 x {}):".format(num_inputs, number))
+    print("  job description (dict -> JSON):      {:>10.0f}".format(rate(job_document, input_uris, number)))
+    print("  task definition (cached template):   {:>10.0f}".format(rate(cached_defn, context, number)))
+    print("  task definition (fresh environment): {:>10.0f}".format(rate(uncached_defn, context, number)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark job document generation.')
+    parser.add_argument('-n', '--number', type=int, default=1000,
+                        help='Number of documents generated per measurement')
+    parser.add_argument('-i', '--inputs', type=int, default=10,
+                        help='Number of inputs per task')
+    args = parser.parse_args()
+    main(args.number, args.inputs)
@@ -0,0 +1,196 @@
+"""
+End to end benchmark of the eod engine on synthetic workflows.
+
+Generates layered workflows of configurable width, depth, fan-in and file size and runs them with a stand-in docker
+binary (fake_docker.py) whose containers only sleep and write their outputs, so the measurements reflect the
+engine itself. For every scenario the benchmark reports:
+  - plan time: time to parse the workflow and create its tasks (best of the repetitions),
+  - makespan: wall clock time of the complete eod run,
+  - overhead per task: makespan minus the ideal makespan given the number of processes, divided by the number of
+    tasks,
+  - peak RSS: the largest resident set size of the eod process and its workers.
+
+Results are compared to a stored baseline and the benchmark exits with a non-zero status if any metric regressed by
+more than the tolerance.
+
+The benchmark has to run in the eod image, from an empty directory (it removes the doit database in the current
+working directory between runs):
+    $ docker run --rm -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=$(pwd) -w / --entrypoint=python jstubbs/eod -m benchmarks.bench_workflows
+
+Record a new baseline with --save-baseline.
+"""
+
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import time
+
+from core.docker import DOCKER_BASE
+
+from . import baseline
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+
+# name: (width, depth, fan_in)
+SCENARIOS = {
+    'chain': (1, 20, 1),
+    'wide': (32, 1, 1),
+    'diamond': (8, 4, 4),
+    'grid': (16, 8, 2),
+}
+
+# metrics compared against the baseline; lower is better for all of them
+METRICS = ('plan_seconds', 'makespan_seconds', 'overhead_per_task_seconds', 'peak_rss_kb')
+
+
+def workflow(name, width, depth, fan_in, size, sleep):
+    """
+    Return the yaml description of a layered workflow with depth levels of width tasks each. Every task of the
+    first level reads a global input; every other task reads the outputs of fan_in tasks of the previous level.
+    """
+    lines = ['name: {}'.format(name), '', 'inputs:']
+    lines.extend('    - in_{} <- {}_inputs/in_{}.dat'.format(idx, name, idx) for idx in range(width))
+    lines.extend(['', 'outputs:'])
+    lines.extend('    - t{}_{}.out'.format(depth - 1, idx) for idx in range(width))
+    lines.extend(['', 'processes:'])
+    for level in range(depth):
+        for idx in range(width):
+            if level == 0:
+                sources = ['inputs.in_{}'.format(idx)]
+            else:
+                sources = ['t{}_{}.out'.format(level - 1, (idx + k) % width) for k in range(min(fan_in, width))]
+            command = '--sleep {} --bytes {}'.format(sleep, size)
+            lines.append('    t{}_{}:'.format(level, idx))
+            lines.append('        image: eod/fake')
+            lines.append('        inputs:')
+            for k, source in enumerate(sources):
+                lines.append('            - {} -> /data/in_{}'.format(source, k))
+                command += ' --in /data/in_{}'.format(k)
+            lines.append('        outputs:')
+            lines.append('            - /data/out/out.dat -> out')
+            lines.append('        command: {} --out /data/out/out.dat'.format(command))
+    return '\n'.join(lines) + '\n'
+
+def ideal_makespan(width, depth, sleep, processes):
+    """Makespan of the workflow with zero engine overhead."""
+    return depth * -(-width // processes) * sleep
+
+def setup(name, width, depth, fan_in, size, sleep):
+    """Write the workflow file and its global inputs to the staging directory and return the workflow path."""
+    inputs_dir = os.path.join(DOCKER_BASE, name + '_inputs')
+    if not os.path.exists(inputs_dir):
+        os.makedirs(inputs_dir)
+    for idx in range(width):
+        with open(os.path.join(inputs_dir, 'in_{}.dat'.format(idx)), 'wb') as f:
+            f.write(b'x' * size)
+    path = os.path.join(DOCKER_BASE, name + '.yml')
+    with open(path, 'w') as f:
+        f.write(workflow(name, width, depth, fan_in, size, sleep))
+    return path
+
+def install_fake_docker():
+    """Copy the fake docker binary to the staging directory and return the environment to run eod with it."""
+    path = os.path.join(DOCKER_BASE, '.eod_bench', 'docker')
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    shutil.copy(os.path.join(HERE, 'fake_docker.py'), path)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    env = dict(os.environ)
+    # the engine runs DOCKER_BINARY through the /host mount, so it must be given as a host path
+    env['DOCKER_BINARY'] = os.path.join(os.environ.get('STAGING_DIR', DOCKER_BASE), '.eod_bench', 'docker')
+    return env
+
+def clean(name):
+    """Remove the results of a previous run so that every task executes again."""
+    for fname in os.listdir(DOCKER_BASE):
+        if fname.startswith('.doit.db'):
+            os.remove(os.path.join(DOCKER_BASE, fname))
+    work_dir = os.path.join(DOCKER_BASE, name)
+    if os.path.exists(work_dir):
+        shutil.rmtree(work_dir)
+
+def plan_seconds(path):
+    # the engine reports every task it creates on stdout; keep only the benchmark report.
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        from core.tasks import parse_yaml
+        start = time.time()
+        parse_yaml(path)
+        return time.time() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+def run(path, env):
+    """Run eod on the workflow at path and return (makespan, peak RSS in kB)."""
+    start = time.time()
+    with open(os.devnull, 'w') as devnull:
+        proc = subprocess.Popen([sys.executable, '-m', 'core.tasks', path], cwd='/', env=env,
+                                stdout=devnull, stderr=subprocess.STDOUT)
+        # wait4 reports the resource usage of the eod process together with its (reaped) workers
+        _, status, usage = os.wait4(proc.pid, 0)
+    makespan = time.time() - start
+    proc.returncode = os.WEXITSTATUS(status)
+    if proc.returncode:
+        raise RuntimeError("eod run of {} failed with exit code {}".format(path, proc.returncode))
+    return makespan, usage.ru_maxrss
+
+def bench(name, width, depth, fan_in, size, sleep, repeat, env):
+    path = setup(name, width, depth, fan_in, size, sleep)
+    processes = multiprocessing.cpu_count()
+    results = []
+    for _ in range(repeat):
+        clean(name)
+        plan = plan_seconds(path)
+        clean(name)
+        makespan, rss = run(path, env)
+        results.append({'plan_seconds': plan,
+                        'makespan_seconds': makespan,
+                        'overhead_per_task_seconds':
+                            (makespan - ideal_makespan(width, depth, sleep, processes)) / (width * depth),
+                        'peak_rss_kb': rss})
+    best = dict((metric, min(result[metric] for result in results)) for metric in METRICS)
+    best['tasks'] = width * depth
+    return best
+
+def main(args):
+    scenarios = dict(SCENARIOS)
+    if args.width or args.depth or args.fan_in:
+        scenarios = {'custom': (args.width or 1, args.depth or 1, args.fan_in or 1)}
+    elif args.scenario:
+        scenarios = dict((name, SCENARIOS[name]) for name in args.scenario)
+    env = install_fake_docker()
+    results = {}
+    for name, (width, depth, fan_in) in sorted(scenarios.items()):
+        wf_name = 'bench_' + name
+        results[name] = bench(wf_name, width, depth, fan_in, args.bytes, args.sleep, args.repeat, env)
+        result = results[name]
+        print("{:<10} tasks: {:>4}  plan: {:>7.3f}s  makespan: {:>7.2f}s  overhead/task: {:>7.3f}s  "
+              "peak RSS: {:>7} kB".format(name, result['tasks'], result['plan_seconds'], result['makespan_seconds'],
+                                          result['overhead_per_task_seconds'], result['peak_rss_kb']))
+    return baseline.check(results, args.baseline, args.tolerance, METRICS, args.save_baseline)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the eod engine on synthetic workflows.')
+    parser.add_argument('-s', '--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Scenario to run; may be repeated. Defaults to all scenarios.')
+    parser.add_argument('-w', '--width', type=int, help='Tasks per level of a custom workflow')
+    parser.add_argument('-d', '--depth', type=int, help='Number of levels of a custom workflow')
+    parser.add_argument('-f', '--fan-in', type=int, help='Inputs per task of a custom workflow')
+    parser.add_argument('-b', '--bytes', type=int, default=1024, help='Size of every input and output file')
+    parser.add_argument('--sleep', type=float, default=0.1, help='Run time of every task in seconds')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Runs per scenario; the best run is reported')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline file to compare to')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative increase of a metric before it counts as a regression')
+    parser.add_argument('--save-baseline', action='store_true', help='Record the results as the new baseline')
+    sys.exit(main(parser.parse_args()))
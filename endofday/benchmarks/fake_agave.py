@@ -0,0 +1,484 @@
+"""
+Local stand-in for the Agave API used to exercise AgaveExecutor, agaverun, submit.py and download.py without a
+tenant.
+
+Implements the endpoints used by endofday: token creation and refresh, systems, files (import, download, listing,
+mkdir, delete and transfer history) and jobs (submission, status and history). Files are kept in memory. Every
+request is delayed by a configurable latency, file transfers are throttled to a configurable bandwidth, and jobs go
+through the usual status sequence in a configurable amount of time. Files requested from the archive directory of a
+finished job are generated on the fly.
+
+agavepy always talks to the API over HTTPS and only sends the access token to an api_server without a port, so
+the server listens on port 443 by default and uses TLS with a self-signed certificate (generated with the openssl
+command unless one is given); clients must be configured with verify: False.
+
+To run the server on its own, from the endofday directory:
+    $ python -m benchmarks.fake_agave --latency 0.05 --job-duration 10
+
+and point api_server in endofday.conf (or the api_server argument of submit.py and download.py) to
+https://<host>.
+"""
+
+from __future__ import print_function
+
+import argparse
+import cgi
+import json
+import os
+import posixpath
+import re
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import urlparse
+import uuid
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+# job statuses with the fraction of the job duration after which each of them is reached
+JOB_STATUSES = (('PENDING', 0.0),
+                ('STAGING_INPUTS', 0.05),
+                ('STAGED', 0.15),
+                ('QUEUED', 0.2),
+                ('RUNNING', 0.3),
+                ('ARCHIVING', 0.9),
+                ('ARCHIVING_FINISHED', 1.0),
+                ('FINISHED', 1.0))
+
+FILES_RE = re.compile(r'^/files/v2/(media|listings|history)/system/([^/]+)/?(.*)$')
+JOBS_RE = re.compile(r'^/jobs/v2/?([^/]*)/?(status|history)?$')
+SYSTEMS_RE = re.compile(r'^/systems/v2/([^/]+)$')
+
+
+def timestamp(seconds):
+    """Format seconds since the epoch the way Agave does, e.g. 2016-02-28T16:00:00.000+00:00."""
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds)) + '.{:03d}+00:00'.format(
+        int(seconds % 1 * 1000))
+
+def normalize(path):
+    return posixpath.normpath('/' + path.strip('/'))
+
+def self_signed_certificate():
+    """Generate a self-signed certificate for 127.0.0.1 and return the path of the PEM file holding it and its key."""
+    path = os.path.join(tempfile.mkdtemp(prefix='fake_agave'), 'server.pem')
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                               '-subj', '/CN=127.0.0.1', '-keyout', path, '-out', path],
+                              stdout=devnull, stderr=devnull)
+    return path
+
+
+class FakeAgaveState(object):
+    """In memory files, jobs and tokens of the fake tenant."""
+    def __init__(self, home_dir='/', job_duration=5.0, token_lifetime=None, archive_bytes=1024):
+        self.home_dir = home_dir
+        self.job_duration = job_duration
+        self.token_lifetime = token_lifetime
+        self.archive_bytes = archive_bytes
+        self.lock = threading.Lock()
+        # path: (contents, last modified)
+        self.files = {}
+        self.dirs = set(['/'])
+        # job id: job description
+        self.jobs = {}
+        # access token: expiration time (or None)
+        self.tokens = {}
+        self.counts = {}
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def issue_token(self):
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.tokens[token] = time.time() + self.token_lifetime if self.token_lifetime else None
+        return {'access_token': token,
+                'refresh_token': uuid.uuid4().hex,
+                'expires_in': self.token_lifetime or 14400,
+                'token_type': 'bearer',
+                'scope': 'default'}
+
+    def token_valid(self, token):
+        with self.lock:
+            if not token in self.tokens:
+                # tokens issued elsewhere (e.g. passed in with -z) are accepted and start their lifetime now
+                self.tokens[token] = time.time() + self.token_lifetime if self.token_lifetime else None
+            expires = self.tokens[token]
+        return expires is None or time.time() < expires
+
+    def mkdir(self, path):
+        path = normalize(path)
+        with self.lock:
+            while not path in self.dirs:
+                self.dirs.add(path)
+                path = posixpath.dirname(path)
+
+    def put_file(self, path, contents):
+        path = normalize(path)
+        self.mkdir(posixpath.dirname(path))
+        with self.lock:
+            self.files[path] = (contents, time.time())
+
+    def get_file(self, path):
+        path = normalize(path)
+        with self.lock:
+            if path in self.files:
+                return self.files[path]
+        for job in self.jobs.values():
+            if path.startswith(normalize(job['archivePath']) + '/') and self.job_status(job) == 'FINISHED':
+                self.put_file(path, b'0' * self.archive_bytes)
+                return self.files[path]
+        return None
+
+    def delete(self, path):
+        path = normalize(path)
+        with self.lock:
+            for name in [f for f in self.files if f == path or f.startswith(path + '/')]:
+                self.files.pop(name)
+            for name in [d for d in self.dirs if d == path or d.startswith(path + '/')]:
+                self.dirs.discard(name)
+
+    def listing(self, path, system_id):
+        path = normalize(path)
+        with self.lock:
+            if path in self.files:
+                names = [path]
+            elif path in self.dirs:
+                names = sorted(name for name in self.files.keys() + list(self.dirs)
+                               if posixpath.dirname(name) == path and not name == path)
+            else:
+                return None
+            return [self.file_description(name, system_id) for name in names]
+
+    def file_description(self, path, system_id):
+        if path in self.files:
+            contents, modified = self.files[path]
+            length, kind = len(contents), 'file'
+        else:
+            length, modified, kind = 4096, 0, 'dir'
+        return {'name': posixpath.basename(path) or '/',
+                'path': path,
+                'system': system_id,
+                'length': length,
+                'lastModified': timestamp(modified),
+                'format': 'raw' if kind == 'file' else 'folder',
+                'type': kind}
+
+    def submit(self, body, base_url):
+        job_id = '{}-007'.format(uuid.uuid4())
+        job = {'id': job_id,
+               'name': body.get('name'),
+               'appId': body.get('appId'),
+               'archivePath': posixpath.join(self.home_dir, 'archive/jobs', 'job-' + job_id),
+               'archiveSystem': body.get('archiveSystem'),
+               'inputs': body.get('inputs', {}),
+               'parameters': body.get('parameters', {}),
+               'submitTime': timestamp(time.time()),
+               'submitted': time.time(),
+               '_links': {'self': {'href': '{}/jobs/v2/{}'.format(base_url, job_id)},
+                          'history': {'href': '{}/jobs/v2/{}/history'.format(base_url, job_id)}}}
+        with self.lock:
+            self.jobs[job_id] = job
+        return job
+
+    def job_history(self, job):
+        elapsed = time.time() - job['submitted']
+        return [{'status': status,
+                 'created': timestamp(job['submitted'] + fraction * self.job_duration),
+                 'description': 'Job status changed to ' + status}
+                for status, fraction in JOB_STATUSES if elapsed >= fraction * self.job_duration]
+
+    def job_status(self, job):
+        return self.job_history(job)[-1]['status']
+
+    def job_description(self, job):
+        description = dict((k, v) for k, v in job.items() if not k == 'submitted')
+        description['status'] = self.job_status(job)
+        return description
+
+
+class FakeAgaveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        # the TLS handshake happens in the thread handling the connection rather than in the accepting thread
+        if self.server.certfile:
+            self.request = ssl.wrap_socket(self.request, certfile=self.server.certfile, server_side=True)
+        BaseHTTPRequestHandler.setup(self)
+
+    @property
+    def state(self):
+        return self.server.state
+
+    @property
+    def base_url(self):
+        return '{}://{}'.format(self.server.scheme, self.headers.get('Host'))
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def reply(self, result, code=200, message=None):
+        body = json.dumps({'status': 'success' if code < 400 else 'error',
+                           'message': message,
+                           'version': '2.1.8',
+                           'result': result})
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def error(self, code, message):
+        self.reply(None, code, message)
+
+    def throttle(self, size):
+        if self.server.bandwidth:
+            time.sleep(float(size) / self.server.bandwidth)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        data = self.rfile.read(length) if length else ''
+        self.throttle(len(data))
+        return data
+
+    def authorized(self):
+        header = self.headers.get('Authorization') or ''
+        if header.startswith('Bearer ') and self.state.token_valid(header[len('Bearer '):]):
+            return True
+        # the same fault returned by the Agave API manager for expired tokens, which triggers a refresh in agavepy
+        body = json.dumps({'fault': {'code': 900903,
+                                     'message': 'Invalid Credentials',
+                                     'description': 'Access token is expired or invalid'}})
+        self.read_body()
+        self.send_response(401)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return False
+
+    def dispatch(self, method):
+        time.sleep(self.server.latency)
+        path = urlparse.urlparse(self.path).path
+        self.state.count(method + ' ' + path.split('/')[1])
+        if path.rstrip('/') == '/token' and method == 'POST':
+            self.read_body()
+            return self.reply_token()
+        if not self.authorized():
+            return
+        match = FILES_RE.match(path)
+        if match:
+            return getattr(self, 'files_' + method.lower())(match.group(1), match.group(2), match.group(3))
+        match = JOBS_RE.match(path)
+        if match:
+            return getattr(self, 'jobs_' + method.lower())(match.group(1), match.group(2))
+        match = SYSTEMS_RE.match(path)
+        if match and method == 'GET':
+            return self.reply({'id': match.group(1),
+                               'type': 'STORAGE',
+                               'storage': {'homeDir': self.state.home_dir, 'protocol': 'SFTP'}})
+        self.read_body()
+        self.error(404, 'Unknown resource: ' + path)
+
+    def reply_token(self):
+        body = json.dumps(self.state.issue_token())
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def files_get(self, kind, system_id, path, head=False):
+        if kind == 'listings':
+            listing = self.state.listing(path, system_id)
+            if listing is None:
+                return self.error(404, 'File/folder does not exist')
+            return self.reply(listing)
+        if kind == 'history':
+            return self.reply([{'status': 'STAGING_QUEUED', 'created': timestamp(time.time())},
+                               {'status': 'STAGING_COMPLETED', 'created': timestamp(time.time())}])
+        found = self.state.get_file(path)
+        if found is None:
+            return self.error(404, 'File/folder does not exist')
+        contents, modified = found
+        etag = '"{}-{}"'.format(len(contents), int(modified * 1000))
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(contents)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(modified)))
+        self.end_headers()
+        if not head:
+            self.throttle(len(contents))
+            self.wfile.write(contents)
+
+    def files_head(self, kind, system_id, path):
+        return self.files_get(kind, system_id, path, head=True)
+
+    def files_post(self, kind, system_id, path):
+        if not kind == 'media':
+            self.read_body()
+            return self.error(400, 'Unsupported operation')
+        length = int(self.headers.get('Content-Length') or 0)
+        form = cgi.FieldStorage(fp=self.rfile, headers=self.headers,
+                                environ={'REQUEST_METHOD': 'POST',
+                                         'CONTENT_TYPE': self.headers.get('Content-Type'),
+                                         'CONTENT_LENGTH': str(length)})
+        self.throttle(length)
+        if not 'fileToUpload' in form:
+            return self.error(400, 'No file or url specified')
+        upload = form['fileToUpload']
+        name = form.getvalue('fileName') or posixpath.basename(upload.filename or 'upload')
+        file_path = posixpath.join(normalize(path), name)
+        self.state.put_file(file_path, upload.value)
+        links = {'self': {'href': '{}/files/v2/media/system/{}{}'.format(self.base_url, system_id, file_path)},
+                 'history': {'href': '{}/files/v2/history/system/{}{}'.format(self.base_url, system_id, file_path)}}
+        self.reply({'name': name, 'path': file_path, 'status': 'STAGING_QUEUED', '_links': links}, 202)
+
+    def files_put(self, kind, system_id, path):
+        data = self.read_body()
+        try:
+            body = json.loads(data)
+        except ValueError:
+            body = dict(urlparse.parse_qsl(data))
+        if not body.get('action') == 'mkdir':
+            return self.error(400, 'Unsupported action: ' + str(body.get('action')))
+        new_dir = normalize(posixpath.join(path, body.get('path', '')))
+        if new_dir in self.state.dirs:
+            return self.error(400, 'Directory already exists: ' + new_dir)
+        self.state.mkdir(new_dir)
+        self.reply(self.state.file_description(new_dir, system_id), 201)
+
+    def files_delete(self, kind, system_id, path):
+        self.read_body()
+        self.state.delete(path)
+        self.reply({})
+
+    def jobs_get(self, job_id, sub_resource):
+        job = self.state.jobs.get(job_id)
+        if not job:
+            return self.error(404, 'No job found with job id ' + job_id)
+        if sub_resource == 'history':
+            return self.reply(self.state.job_history(job))
+        if sub_resource == 'status':
+            return self.reply({'id': job_id, 'status': self.state.job_status(job)})
+        self.reply(self.state.job_description(job))
+
+    def jobs_post(self, job_id, sub_resource):
+        data = self.read_body()
+        if job_id:
+            return self.error(400, 'Unsupported operation')
+        try:
+            body = json.loads(data)
+        except ValueError:
+            return self.error(400, 'Job description is not valid JSON')
+        if not body.get('appId'):
+            return self.error(400, 'appId is required')
+        self.reply(self.state.job_description(self.state.submit(body, self.base_url)), 201)
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_HEAD(self):
+        self.dispatch('HEAD')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+
+class FakeAgave(ThreadingMixIn, HTTPServer):
+    """
+    The fake Agave server. latency is added to every request (in seconds), bandwidth limits file transfers (in
+    bytes per second, None for unlimited), job_duration is the time from submission to the FINISHED status and
+    token_lifetime the number of seconds after which access tokens expire (None for never). Pass certfile=False to
+    serve plain HTTP.
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, port=443, latency=0.0, bandwidth=None, job_duration=5.0, token_lifetime=None, home_dir='/',
+                 archive_bytes=1024, certfile=None, verbose=False):
+        HTTPServer.__init__(self, ('127.0.0.1', port), FakeAgaveHandler)
+        self.certfile = None
+        self.scheme = 'http'
+        if certfile is not False:
+            self.certfile = certfile or self_signed_certificate()
+            self.scheme = 'https'
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.verbose = verbose
+        self.state = FakeAgaveState(home_dir=home_dir, job_duration=job_duration, token_lifetime=token_lifetime,
+                                    archive_bytes=archive_bytes)
+        # open client connections, closed by stop()
+        self.connections = set()
+
+    def process_request(self, request, client_address):
+        self.connections.add(request)
+        ThreadingMixIn.process_request(self, request, client_address)
+
+    def shutdown_request(self, request):
+        self.connections.discard(request)
+        HTTPServer.shutdown_request(self, request)
+
+    def handle_error(self, request, client_address):
+        # clients closing their connections abruptly are common under load and not worth a stack trace
+        if self.verbose:
+            HTTPServer.handle_error(self, request, client_address)
+
+    @property
+    def url(self):
+        port = self.server_address[1]
+        if (self.scheme, port) in (('https', 443), ('http', 80)):
+            return '{}://127.0.0.1'.format(self.scheme)
+        return '{}://127.0.0.1:{}'.format(self.scheme, port)
+
+    def start(self):
+        """Serve requests from a background thread."""
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the connections kept alive by clients."""
+        self.shutdown()
+        for request in list(self.connections):
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        self.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local stand-in for the Agave API.')
+    parser.add_argument('--port', type=int, default=443)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request')
+    parser.add_argument('--bandwidth', type=float, help='File transfer rate limit in bytes per second')
+    parser.add_argument('--job-duration', type=float, default=5.0, help='Seconds from submission to FINISHED')
+    parser.add_argument('--token-lifetime', type=float, help='Seconds after which access tokens expire')
+    parser.add_argument('--certfile', help='PEM file with the certificate and key to use for TLS')
+    parser.add_argument('--no-tls', action='store_true', help='Serve plain HTTP')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args()
+    server = FakeAgave(port=args.port, latency=args.latency, bandwidth=args.bandwidth,
+                       job_duration=args.job_duration, token_lifetime=args.token_lifetime,
+                       certfile=False if args.no_tls else args.certfile, verbose=args.verbose)
+    print("Fake Agave API listening on {}".format(server.url))
+    server.serve_forever()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Stand-in for the docker binary used by the workflow benchmarks.
+
+Understands the subset of the docker CLI used by the eod engine (run, create, start -a, exec, rm, inspect and pull)
+and, instead of running an image, executes the synthetic task described by the container command:
+
+    --sleep SECONDS   time the task takes
+    --bytes N         size of each output file
+    --in PATH         input file (container path) that must exist; may be repeated
+    --out PATH        output file (container path) to write; may be repeated
+
+Volume mounts are resolved the same way as in the eod container: host paths below STAGING_DIR are found under
+/staging and all other host paths under /host. Detached containers (run -d) run nothing until a command is executed
+in them with exec; the symbolic links the eod engine sets up in reused containers are resolved like volume mounts.
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import re
+import shlex
+import sys
+import time
+import uuid
+
+# directory holding the arguments of created but not yet started containers
+STATE_DIR = os.environ.get('FAKE_DOCKER_STATE', '/tmp/eod_fake_docker')
+
+
+def to_local(host_path):
+    staging_dir = os.environ.get('STAGING_DIR')
+    if staging_dir and host_path.startswith(staging_dir):
+        return host_path.replace(staging_dir, '/staging', 1)
+    return os.path.join('/host', host_path[1:])
+
+def parse(args):
+    """Parse the arguments of a run or create command into (mounts, command)."""
+    mounts = []
+    idx = 0
+    while idx < len(args):
+        arg = args[idx]
+        if arg in ('-v', '--volume'):
+            host_path, container_path = args[idx + 1].split(':')[:2]
+            mounts.append((container_path, to_local(host_path)))
+            idx += 2
+        elif arg in ('-e', '--env', '--name', '-w', '--entrypoint'):
+            idx += 2
+        elif arg.startswith('-'):
+            idx += 1
+        else:
+            # first positional argument is the image; the rest is the command
+            return mounts, args[idx + 1:]
+    return mounts, []
+
+def resolve(mounts, container_path):
+    """Return the local path of container_path using the most specific mount containing it."""
+    best = None
+    for mount, local in mounts:
+        if container_path == mount or container_path.startswith(mount.rstrip('/') + '/'):
+            if best is None or len(mount) > len(best[0]):
+                best = (mount, local)
+    if best is None:
+        return None
+    return best[1] + container_path[len(best[0]):]
+
+def links(script):
+    """Return the (container path, target) pairs of the symbolic links created by an exec script."""
+    return [(shlex.split(path)[0], shlex.split(target)[0])
+            for target, path in re.findall(r"ln -sfn ('[^']*'|[^\s;]+) ('[^']*'|[^\s;]+)", script)]
+
+def execute(args, extra_mounts=()):
+    mounts, command = parse(args)
+    for path, target in extra_mounts:
+        mounts.append((path, resolve(mounts, target)))
+    sleep, size, inputs, outputs = 0, 0, [], []
+    idx = 0
+    while idx < len(command) - 1:
+        opt, value = command[idx], command[idx + 1]
+        if opt == '--sleep':
+            sleep = float(value)
+        elif opt == '--bytes':
+            size = int(value)
+        elif opt == '--in':
+            inputs.append(value)
+        elif opt == '--out':
+            outputs.append(value)
+        idx += 2
+    for path in inputs:
+        local = resolve(mounts, path)
+        if not local or not os.path.exists(local):
+            print("fake docker: missing input {}".format(path), file=sys.stderr)
+            return 1
+        with open(local, 'rb') as f:
+            while f.read(1 << 20):
+                pass
+    time.sleep(sleep)
+    for path in outputs:
+        local = resolve(mounts, path)
+        if not local:
+            print("fake docker: output {} is not in a mounted volume".format(path), file=sys.stderr)
+            return 1
+        if not os.path.exists(os.path.dirname(local)):
+            os.makedirs(os.path.dirname(local))
+        with open(local, 'wb') as f:
+            f.write(b'x' * size)
+    return 0
+
+def main(argv):
+    if not argv:
+        return 0
+    cmd, args = argv[0], argv[1:]
+    if cmd == 'run' and not '-d' in args:
+        return execute(args)
+    if cmd in ('create', 'run'):
+        if not os.path.exists(STATE_DIR):
+            os.makedirs(STATE_DIR)
+        container_id = uuid.uuid4().hex
+        with open(os.path.join(STATE_DIR, container_id), 'w') as f:
+            json.dump(args, f)
+        print(container_id)
+        return 0
+    if cmd == 'start':
+        with open(os.path.join(STATE_DIR, args[-1])) as f:
+            return execute(json.load(f))
+    if cmd == 'exec':
+        while args[0] in ('-e', '--env', '-i', '-t'):
+            args = args[2:] if args[0] in ('-e', '--env') else args[1:]
+        with open(os.path.join(STATE_DIR, args[0])) as f:
+            container_args = json.load(f)
+        # sh -c <script> sh <command>: run the command with the links of the script
+        image_idx = len(container_args) - len(parse(container_args)[1]) - 1
+        return execute(container_args[:image_idx + 1] + args[5:], links(args[3]))
+    if cmd == 'rm':
+        path = os.path.join(STATE_DIR, args[-1])
+        if os.path.exists(path):
+            os.remove(path)
+        return 0
+    # inspect, pull, version, ...: every image is available locally
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,4 +1,8 @@
 #!/bin/bash
+if [ "$1" = "--submit" ]; then
+  # submit to the eod daemon serving this directory, started with: endofday.sh --serve
+  exec python $(dirname $0)/eod_client.py "${@:2}"
+fi
 cmd=$(which docker)
 version=$(docker version -f '{{.Server.APIVersion}}')
 docker run -t -v /:/host -v $(pwd):/staging -e DOCKER_API_VERSION=$version -e AGAVE_USERNAME=$username -e RUNNING_IN_DOCKER=true -e STAGING_DIR=$(pwd) --rm -v /var/run/docker.sock:/var/run/docker.sock jstubbs/eod $*
\ No newline at end of file
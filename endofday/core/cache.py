@@ -0,0 +1,168 @@
+# Host-level cache for remote (URI) inputs shared across workflow executions.
+#
+# Each cached resource is stored once, keyed by its URI, together with the validators (ETag, Last-Modified, or
+# Agave file metadata) returned by the remote server, so that the same file pulled by many workflows is transferred
+# only once. Consumers receive a copy of the cached file rather than a hard link to it, since containers mount their
+# inputs read-write and a consumer writing to its input would otherwise corrupt the file for every workflow on the
+# host. On filesystems supporting it, the copy is a copy-on-write clone sharing the disk space of the cached file.
+
+from __future__ import print_function
+
+import errno
+import fcntl
+import hashlib
+import os
+import shutil
+import time
+
+from .config import Config
+from .locks import locked_json
+
+# name of the index file within the cache directory
+INDEX_FILE = 'index.json'
+
+# name of the lock file used to serialize updates to the index across processes and workflows
+LOCK_FILE = '.lock'
+
+# subdirectory of the cache directory holding the cached files themselves
+DATA_DIR = 'data'
+
+# ioctl cloning a file on Linux (FICLONE in linux/fs.h)
+FICLONE = 0x40049409
+
+
+def uri_key(uri):
+    """Return the cache key for a URI."""
+    return hashlib.sha1(uri.encode('utf-8')).hexdigest()
+
+def clone_file(src, dest):
+    """
+    Replace dest with a copy of src, cloned (reflinked) when the filesystem supports it and the two paths are on the
+    same filesystem.
+    """
+    base_dir = os.path.dirname(dest)
+    if base_dir and not os.path.exists(base_dir):
+        os.makedirs(base_dir)
+    tmp_path = '{}.{}.tmp'.format(dest, os.getpid())
+    try:
+        with open(src, 'rb') as f_src, open(tmp_path, 'wb') as f_dest:
+            fcntl.ioctl(f_dest.fileno(), FICLONE, f_src.fileno())
+        shutil.copystat(src, tmp_path)
+    except (IOError, OSError) as e:
+        if e.errno not in (errno.EXDEV, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOTTY):
+            raise
+        shutil.copy2(src, tmp_path)
+    os.rename(tmp_path, dest)
+
+
+class UriCache(object):
+    """
+    A directory of downloaded URI resources with an LRU eviction policy bounded by max_bytes. The cache is safe
+    to use from multiple processes and from multiple concurrently running workflows since every read-modify-write
+    of the index happens while holding an exclusive lock.
+    """
+    def __init__(self, cache_dir, max_bytes=None):
+        # directory (as seen by the eod process) containing the cache
+        self.cache_dir = cache_dir
+
+        # maximum total size of the cached files; None or 0 means unbounded
+        self.max_bytes = max_bytes
+
+        self.data_dir = os.path.join(self.cache_dir, DATA_DIR)
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+        self.index_path = os.path.join(self.cache_dir, INDEX_FILE)
+        self.lock_path = os.path.join(self.cache_dir, LOCK_FILE)
+
+    def locked_index(self):
+        """Context manager yielding the index dictionary while holding the cache lock. Changes made to the
+        dictionary are written back when the block exits."""
+        return locked_json(self.index_path, self.lock_path)
+
+    def data_path(self, uri):
+        """Path of the cached copy of uri."""
+        return os.path.join(self.data_dir, uri_key(uri))
+
+    def lookup(self, uri):
+        """Return the index entry for uri, or None if the uri is not cached."""
+        with self.locked_index() as index:
+            entry = index.get(uri_key(uri))
+            if entry and not os.path.exists(self.data_path(uri)):
+                index.pop(uri_key(uri))
+                entry = None
+            return entry
+
+    def fetch(self, uri, dest, check):
+        """
+        Copy the cached copy of uri to dest if it is still valid. check is a callable taking (uri, validators) and
+        returning a pair (changed, validators) obtained with a conditional request against the remote server.
+        Returns True on a cache hit.
+        """
+        entry = self.lookup(uri)
+        if not entry:
+            return False
+        try:
+            changed, validators = check(uri, entry.get('validators'))
+        # the executors report errors with Error, which exits
+        except (Exception, SystemExit) as e:
+            print("Could not revalidate cached URI {}: {}".format(uri, e))
+            return False
+        if changed:
+            print("Cached copy of {} is stale.".format(uri))
+            self.remove(uri)
+            return False
+        with self.locked_index() as index:
+            entry = index.get(uri_key(uri))
+            if not entry:
+                return False
+            entry['last_access'] = time.time()
+            if validators:
+                entry['validators'] = validators
+            clone_file(self.data_path(uri), dest)
+        print("Using cached copy of {} for {}".format(uri, dest))
+        return True
+
+    def insert(self, uri, path, validators):
+        """Add the file at path to the cache as the current contents of uri."""
+        if not os.path.isfile(path):
+            return
+        size = os.path.getsize(path)
+        if self.max_bytes and size > self.max_bytes:
+            print("Not caching {}: size {} exceeds the cache quota.".format(uri, size))
+            return
+        with self.locked_index() as index:
+            clone_file(path, self.data_path(uri))
+            index[uri_key(uri)] = {'uri': uri,
+                                   'size': size,
+                                   'validators': validators or {},
+                                   'last_access': time.time()}
+            self.evict(index)
+
+    def remove(self, uri):
+        with self.locked_index() as index:
+            self._remove(index, uri_key(uri))
+
+    def _remove(self, index, key):
+        index.pop(key, None)
+        path = os.path.join(self.data_dir, key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def evict(self, index):
+        """Evict least recently used entries until the cache fits in max_bytes. Must be called with the lock held."""
+        if not self.max_bytes:
+            return
+        total = sum(entry['size'] for entry in index.values())
+        for key, entry in sorted(index.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            print("Evicting {} from the URI cache.".format(entry['uri']))
+            self._remove(index, key)
+            total -= entry['size']
+
+
+def get_uri_cache(cache_dir):
+    """Return a UriCache for cache_dir configured from endofday.conf, or None if caching is disabled."""
+    if not Config.get_bool('eod', 'uri_cache', default_value=True):
+        return None
+    return UriCache(cache_dir, max_bytes=Config.get_int('eod', 'uri_cache_max_bytes'))
@@ -0,0 +1,41 @@
+# Loading the Python functions run by processes with execution: python.
+#
+# A process given as callable: <module>:<function> is run by calling the function in the doit worker process running
+# the task, instead of starting a container. Functions are imported when the workflow is planned, so that a workflow
+# naming a missing function fails right away, and the doit workers, which are forked from the planning process,
+# inherit the imported modules: every function is imported once per run whatever the number of tasks calling it.
+
+from __future__ import print_function
+
+import importlib
+import sys
+
+from .error import Error
+
+# imported functions, by callable spec
+callables = {}
+
+
+def load(spec, path=()):
+    """
+    Return the function named by spec, of the form <module>:<function>, importing its module from sys.path or from the
+    directories of path.
+    """
+    if spec in callables:
+        return callables[spec]
+    module_name, sep, attr = spec.partition(':')
+    if not sep or not module_name or not attr:
+        raise Error("Invalid callable: {}. Format should be: <module>:<function>".format(spec))
+    for directory in path:
+        if not directory in sys.path:
+            sys.path.append(directory)
+    try:
+        fn = importlib.import_module(module_name)
+    except ImportError as e:
+        raise Error("Could not import module {} of callable {}: {}".format(module_name, spec, e))
+    for name in attr.split('.'):
+        fn = getattr(fn, name, None)
+    if not callable(fn):
+        raise Error("Callable not found: {}".format(spec))
+    callables[spec] = fn
+    return fn
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# Submit a workflow to an eod daemon (endofday.sh --serve) and stream the output of the run.
+#
+# Only uses the standard library so that it can run on the host, outside of the eod image:
+#    $ python eod_client.py workflow.yml [targets]
+# The exit code is the exit code of the run.
+
+from __future__ import print_function
+
+import json
+import os
+import socket
+import sys
+
+# socket the daemon listens on, in the directory it serves
+SOCKET_FILE = '.eod.sock'
+
+# start of the last line sent for a submission, followed by the exit code of the run
+EXIT_MARKER = b'<eod-exit> '
+
+
+def submit(yaml_file, targets=None, socket_path=None, out=None):
+    """Submit yaml_file to the daemon listening on socket_path, writing the output of the run to out."""
+    socket_path = socket_path or os.environ.get('EOD_SOCKET') or os.path.join(os.getcwd(), SOCKET_FILE)
+    out = out or getattr(sys.stdout, 'buffer', sys.stdout)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error as e:
+        print("Could not connect to the eod daemon at {}: {}".format(socket_path, e), file=sys.stderr)
+        return 1
+    try:
+        request = {'yaml_file': os.path.abspath(yaml_file), 'targets': targets or []}
+        sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        stream = sock.makefile('rb')
+        for line in iter(stream.readline, b''):
+            if line.startswith(EXIT_MARKER):
+                return int(line[len(EXIT_MARKER):])
+            out.write(line)
+            out.flush()
+    finally:
+        sock.close()
+    print("The eod daemon closed the connection before the run completed.", file=sys.stderr)
+    return 1
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: {} <workflow.yml> [targets]".format(sys.argv[0]), file=sys.stderr)
+        sys.exit(2)
+    sys.exit(submit(sys.argv[1], sys.argv[2:]))
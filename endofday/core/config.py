@@ -10,9 +10,24 @@ class AgaveConfigParser(ConfigParser.ConfigParser):
     def get(self, section, option, raw=False, vars=None, default_value=None):
         try:
             return ConfigParser.ConfigParser.get(self, section, option, raw, vars)
-        except ConfigParser.NoOptionError:
+        except (ConfigParser.NoOptionError, ConfigParser.NoSectionError):
             return default_value
 
+    def get_bool(self, section, option, default_value=False):
+        value = self.get(section, option)
+        if value is None:
+            return default_value
+        return value.strip().lower() in ('true', 'yes', '1', 'on')
+
+    def get_int(self, section, option, default_value=None):
+        value = self.get(section, option)
+        if value is None or not value.strip():
+            return default_value
+        try:
+            return int(value)
+        except ValueError:
+            raise Error("Invalid config: {} must be an integer, got {}".format(option, value))
+
 def read_config():
     parser = AgaveConfigParser()
     places = ['/host/home/eod/endofday.conf',
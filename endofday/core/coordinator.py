@@ -0,0 +1,150 @@
+# Fair sharing of the container slots of a host between the workflows running on it.
+#
+# Every eod run starts as many worker processes as the host has cores, so several workflows running at once would
+# oversubscribe the host. With fair sharing enabled, the runs on a host register in a state file in a host-wide
+# directory and take a slot from it before starting a container. The host has a fixed number of slots, and each
+# workflow with containers running or waiting to run is entitled to a share of them proportional to its weight (the
+# top-level weight of the workflow file, 1 by default). A workflow below its share always gets the next free slot;
+# a workflow at or above its share only gets a free slot when no workflow below its share is waiting, so slots are
+# never left idle. A small workflow with a high weight therefore starts its containers right away, even next to a large
+# sweep that keeps every slot busy.
+#
+# eod runs in containers with their own pid namespaces, so the runs cannot check whether the processes of other runs are
+# alive. Instead, every run refreshes a heartbeat in the state file, and runs whose heartbeat is older than
+# HEARTBEAT_TIMEOUT are dropped along with their slots.
+
+from __future__ import print_function
+
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from .config import Config
+from .limiter import POLL_INTERVAL, pid_alive
+from .locks import Current, StateFile, state_file_path
+
+# name of the state file in the host-wide directory
+STATE_FILE = 'eod_slots.json'
+
+# seconds between two heartbeats of a run, and after which a run without a heartbeat is considered gone
+HEARTBEAT_INTERVAL = 5
+HEARTBEAT_TIMEOUT = 60
+
+
+def fair_shares(runs, capacity):
+    """Return the share of the capacity slots of each run with containers running or waiting, by run id."""
+    active = dict((run_id, run) for run_id, run in runs.items() if run['running'] or run['waiting'])
+    total = float(sum(run['weight'] for run in active.values()))
+    return dict((run_id, capacity * run['weight'] / total) for run_id, run in active.items())
+
+
+class HostCoordinator(StateFile):
+    """Slots of the host shared by all the eod runs on it. Taking a slot of a disabled coordinator never blocks."""
+
+    def __init__(self, state_path=None, run_id=None, weight=1, capacity=1):
+        super(HostCoordinator, self).__init__(state_path)
+        self.run_id = run_id
+        self.weight = weight
+        self.capacity = capacity
+
+    def new_run(self):
+        return {'heartbeat': time.time(), 'weight': self.weight, 'running': [], 'waiting': []}
+
+    def register(self):
+        with self.locked() as state:
+            state.setdefault('runs', {})[self.run_id] = self.new_run()
+
+    def heartbeat(self):
+        with self.locked() as state:
+            state.setdefault('runs', {}).setdefault(self.run_id, self.new_run())['heartbeat'] = time.time()
+
+    def unregister(self):
+        with self.locked() as state:
+            state.get('runs', {}).pop(self.run_id, None)
+
+    def try_acquire(self):
+        pid = os.getpid()
+        with self.locked() as state:
+            runs = state.setdefault('runs', {})
+            # forget the runs that exited without cleaning up, and the slots of the workers of this run that died
+            for run_id, other in list(runs.items()):
+                if time.time() - other['heartbeat'] > HEARTBEAT_TIMEOUT and not run_id == self.run_id:
+                    del runs[run_id]
+            run = runs.setdefault(self.run_id, self.new_run())
+            run['running'] = [worker for worker in run['running'] if pid_alive(worker)]
+            run['waiting'] = [worker for worker in run['waiting'] if pid_alive(worker)]
+            if not pid in run['waiting']:
+                run['waiting'].append(pid)
+            if sum(len(other['running']) for other in runs.values()) >= self.capacity:
+                return False
+            shares = fair_shares(runs, self.capacity)
+            below_share = len(run['running']) < shares[self.run_id]
+            others_waiting = any(other['waiting'] and len(other['running']) < shares[run_id]
+                                 for run_id, other in runs.items() if not run_id == self.run_id)
+            if not below_share and others_waiting:
+                return False
+            run['waiting'].remove(pid)
+            run['running'].append(pid)
+            return True
+
+    def release(self):
+        pid = os.getpid()
+        with self.locked() as state:
+            run = state.get('runs', {}).get(self.run_id)
+            if run and pid in run['running']:
+                run['running'].remove(pid)
+
+    @contextmanager
+    def slot(self):
+        """Context manager holding a slot of the host, waiting for this run's turn."""
+        if not self.enabled:
+            yield
+            return
+        while not self.try_acquire():
+            time.sleep(POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class Heartbeat(threading.Thread):
+    """Daemon thread of the main eod process keeping the run registered with the coordinator of the host."""
+
+    def __init__(self, coordinator):
+        super(Heartbeat, self).__init__()
+        self.daemon = True
+        self.coordinator = coordinator
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(HEARTBEAT_INTERVAL):
+            self.coordinator.heartbeat()
+
+    def stop(self):
+        """Stop the heartbeat and give the slots of the run back."""
+        self.stopped.set()
+        self.coordinator.unregister()
+
+
+current = Current(HostCoordinator())
+
+def configure(state_dir, wf_name, weight=1):
+    """
+    Register a run of the workflow wf_name with the coordinator of the host keeping its state in state_dir if the
+    fair_share option is set in endofday.conf. Returns the heartbeat thread to start in the main process, or None.
+    """
+    if not Config.get_bool('eod', 'fair_share', default_value=False):
+        return None
+    capacity = Config.get_int('eod', 'host_slots', default_value=multiprocessing.cpu_count())
+    # the host name of the eod container tells apart runs in different containers with the same pid
+    run_id = '{}@{}:{}'.format(wf_name, socket.gethostname(), os.getpid())
+    coordinator = current.set(HostCoordinator(state_file_path(state_dir, STATE_FILE), run_id, weight, capacity))
+    coordinator.register()
+    return Heartbeat(coordinator)
+
+def get_coordinator():
+    return current.get()
@@ -6,11 +6,21 @@ if [ $ARG = "--setup" ]; then
   cp /core/alias.sh /staging/endofday.sh
   chmod +x /staging/endofday.sh
   cp /endofday.conf /staging/endofday.conf
+  cp /core/client.py /staging/eod_client.py
+elif [ $ARG = "--serve" ]; then
+  cd /
+  python -m core.server "${@:2}"
 elif [ $ARG = "--agave" ]; then
   python -m core.agaverun $STAGING/$2
+elif [ $ARG = "--materialize" ]; then
+  cd /
+  shift
+  wf_name=$1
+  shift
+  python -m core.materialize $wf_name "${@/#/$STAGING/}"
 else
   cd /
-  python -m core.tasks $STAGING/$ARG $2 $3
+  python -m core.tasks $STAGING/$ARG "${@:2}"
   # This used only for the nf backend
 #  /nextflow run "${ARG%.*}.nf"
 fi
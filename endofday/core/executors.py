@@ -10,17 +10,34 @@ import urlparse
 
 from agavepy.agave import Agave, AgaveException
 from agavepy.async import AgaveAsyncResponse
-import jinja2
 
 from .error import Error
 from .config import Config
 from .docker import RUNNING_IN_DOCKER, DOCKER_BASE
+from .jobs import eod_job
+from .journal import get_journal
+from .metrics import get_metrics
+from .placement import get_placement, task_keys
+from .prefetch import get_prefetcher
 from .template import ConfigGen
+from .trace import get_tracer, job_history_spans
 
-JOB_TEMPLATE = 'job.j2'
 EOD_TEMPLATE = 'eod.j2'
+EOD_CONF = ConfigGen(EOD_TEMPLATE)
 HERE = os.path.dirname(os.path.abspath((__file__)))
 
+# job statuses after which an Agave job will not change status again
+TERMINAL_JOB_STATUSES = ('FINISHED', 'FAILED', 'STOPPED', 'KILLED', 'ARCHIVING_FAILED')
+
+
+def read_uri(local_path):
+    """Return the URI contained in a file referencing a remote file."""
+    with open(local_path) as f:
+        uri = f.readline().strip('\n')
+    if not '://' in uri:
+        raise Error("File at path: " + local_path + " does not reference a remote file.")
+    return uri
+
 
 class AgaveExecutor(object):
     """Execute a task in the Agave cloud"""
@@ -150,14 +167,15 @@ class AgaveExecutor(object):
                                              'path':path})
             print "directory created."
         except Exception as e:
-            if 'already exists' in str(e.message):
+            # for errors raised by requests, the reason is in the body of the response
+            if 'already exists' in str(e.message) + getattr(getattr(e, 'response', None), 'text', ''):
                 print("Directory already exists.")
                 return True
             else:
                 raise Error("Error creating directory on default storage system. Path: " + path + "Msg:" + str(e))
         return rsp
 
-    def upload_file(self, local_path, remote_path):
+    def upload_file(self, local_path, remote_path, task_name=None):
         """Upload a file on the local system to remote storage. The remote_path param should
         be relative to the endofday home dir. The local_path should be absolute.
         """
@@ -165,9 +183,13 @@ class AgaveExecutor(object):
             remote_path = remote_path[1:]
         sourcefilePath = os.path.join(self.home_dir, remote_path)
         try:
-            rsp = self.ag.files.importData(systemId=self.storage_system,
-                                           filePath=sourcefilePath,
-                                           fileToUpload=open(local_path,'rb'))
+            start = time.time()
+            with get_tracer().span('upload', task=task_name, path=local_path, bytes=os.path.getsize(local_path)):
+                rsp = self.ag.files.importData(systemId=self.storage_system,
+                                               filePath=sourcefilePath,
+                                               fileToUpload=open(local_path,'rb'))
+            get_metrics().inc('eod_bytes_uploaded_total', os.path.getsize(local_path))
+            get_placement().record_transfer('upload', os.path.getsize(local_path), time.time() - start)
         except Exception as e:
             raise Error("Exception on file upload - local_path: " + local_path +
                         "; remote_path: " + remote_path + ' sourceFilePath: ' + sourcefilePath + "; e:" + str(e))
@@ -177,7 +199,7 @@ class AgaveExecutor(object):
                         '; remote_path: ' + remote_path + ' sourceFilePath: ' + sourcefilePath + '. Response:' + str(rsp))
         return AgaveAsyncResponse(self.ag, rsp)
 
-    def download_file(self, local_path, remote_path):
+    def download_file(self, local_path, remote_path, task_name=None):
         """
         Download a file from remote storage to the local path. The remote_path param should be relative to the
         endofday home dir and the local_path should be absolute.
@@ -186,17 +208,87 @@ class AgaveExecutor(object):
             remote_path = remote_path[1:]
         path = os.path.join(self.system_homedir, self.home_dir, remote_path)
         print "Downloading file from:", remote_path, " to:", local_path, "..."
-        with open(local_path, 'wb') as f:
+        start = time.time()
+        with get_tracer().span('download', task=task_name, path=local_path) as span, open(local_path, 'wb') as f:
             rsp = self.ag.files.download(systemId=self.storage_system, filePath=path)
             if type(rsp) == dict:
                 raise Error("Error downloading file at path: " + remote_path + ", filePath:"+ path+ ". Response: " + str(rsp))
+            span['bytes'] = 0
             for block in rsp.iter_content(1024):
                 if not block:
                     break
                 f.write(block)
+                span['bytes'] += len(block)
+        get_metrics().inc('eod_bytes_downloaded_total', span['bytes'])
+        get_placement().record_transfer('download', span['bytes'], time.time() - start)
         print "Download successful."
         return {'status': 'success'}
 
+    def remote_uri(self, remote_path):
+        """Return the agave URI for a path on the storage system relative to the endofday home dir."""
+        if remote_path.startswith('/'):
+            remote_path = remote_path[1:]
+        return 'agave://' + self.storage_system + '/' + os.path.join(self.system_homedir + '/', self.home_dir, remote_path)
+
+    def write_uri(self, local_path, uri):
+        """
+        Write a file at local_path referencing the remote file at uri. Such files can be materialized later on
+        with materialize().
+        """
+        base_dir = os.path.dirname(local_path)
+        if not os.path.exists(base_dir):
+            os.makedirs(base_dir)
+        with open(local_path, 'w') as f:
+            f.write(uri + '\n')
+
+    def materialize(self, local_path):
+        """Replace a file written by write_uri() with the contents of the remote file it references."""
+        uri = read_uri(local_path)
+        print "Materializing", uri, "to:", local_path, "..."
+        tmp_path = local_path + '.eod_download'
+        try:
+            self.ag.download_uri(uri, tmp_path)
+        except Exception as e:
+            raise Error("Error downloading URI: " + uri + ". Exception: " + str(e))
+        os.rename(tmp_path, local_path)
+        print "Download successful."
+
+    def check_uri(self, uri, validators=None):
+        """
+        Check whether the remote resource at uri has changed relative to the validators recorded for a previous
+        download. Agave URIs are checked against the file metadata returned by the files service; all other URIs
+        are checked with a conditional HEAD request using the ETag and Last-Modified headers.
+        Returns a pair (changed, validators) where validators describes the current version of the resource.
+        """
+        parsed = urlparse.urlparse(uri)
+        if parsed.scheme == 'agave':
+            path = parsed.path
+            if path.startswith('//'):
+                path = path[1:]
+            rsp = self.ag.files.list(systemId=parsed.netloc, filePath=path)
+            if not rsp or type(rsp) == dict:
+                raise Error("Unable to retrieve metadata for URI: " + uri + ". Response: " + str(rsp))
+            current = {'length': rsp[0].get('length'),
+                       'last_modified': str(rsp[0].get('lastModified'))}
+            return current != validators, current
+        headers = {}
+        if parsed.netloc == urlparse.urlparse(self.ag.api_server).netloc:
+            headers['Authorization'] = 'Bearer ' + self.ag.token.token_info.get('access_token')
+        if validators and validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators and validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        rsp = requests.head(uri, headers=headers, allow_redirects=True, verify=self.ag.verify)
+        if rsp.status_code == 304:
+            return False, validators
+        rsp.raise_for_status()
+        current = {'etag': rsp.headers.get('ETag'),
+                   'last_modified': rsp.headers.get('Last-Modified')}
+        if not current['etag'] and not current['last_modified']:
+            # the server offers no way to validate the resource, so we cannot safely reuse a cached copy.
+            return True, current
+        return current != validators, current
+
     def create_volumes(self, task):
         """
         Create volume directories on the local host and in the remote storage system to store outputs of the
@@ -214,12 +306,25 @@ class AgaveExecutor(object):
         for dir in task.volume_dirs:
             self.create_dir(path=dir.eod_rel_path)
 
-    def upload_inputs(self, task):
+    def input_uploads(self, task):
         """
-        Upload inputs needed for container execution.
+        Return the (input, local path, remote dir) triples of the inputs of task, or of an AgaveClusterTask, that are
+        uploaded from the host. Remote inputs are passed to the job as URIs and never go through the host.
         """
-        responses = []
-        for inpv in task.input_volumes:
+        uploads = []
+        if getattr(task, 'members', None):
+            remote_dir = os.path.join(self.wf_name, task.name, 'inputs')
+            for inp in task.inputs:
+                if inp.is_remote:
+                    continue
+                local_path = inp.real_source.abs_host_path
+                if RUNNING_IN_DOCKER:
+                    local_path = inp.real_source.eod_container_path
+                uploads.append((inp, local_path, remote_dir))
+            return uploads
+        for inp, inpv in zip(task.inputs, task.input_volumes):
+            if getattr(inp, 'is_remote', False):
+                continue
             if RUNNING_IN_DOCKER:
                 local_path = inpv.docker_host_path
             else:
@@ -227,15 +332,87 @@ class AgaveExecutor(object):
             remote_dir = inpv.eod_rel_path
             if not remote_dir[-1] == '/':
                 remote_dir = os.path.split(remote_dir)[0]
-            print "creating remote directory for input:", local_path, "remote dir path:", remote_dir
-            self.create_dir(remote_dir)
-            print "Uploading file", local_path, "to remote storage location:", inpv.eod_rel_path
-            rsp = self.upload_file(local_path=local_path, remote_path=remote_dir)
-            responses.append(rsp)
-        # block until transfers complete
+            uploads.append((inp, local_path, remote_dir))
+        return uploads
+
+    def upload_inputs(self, task):
+        """
+        Upload inputs needed for container execution.
+        """
+        for inp in task.inputs:
+            if getattr(inp, 'is_remote', False):
+                print "Input", inp.src, "is already in remote storage; skipping upload."
+        self.upload(task.name, [(local_path, remote_dir) for _, local_path, remote_dir in self.input_uploads(task)])
+
+    def upload(self, name, uploads):
+        """
+        Upload the files of uploads, a list of (local path, remote dir) pairs, for the task (or task group) called
+        name. Files uploaded ahead of time or by a previous run are skipped.
+        """
+        journal = get_journal()
+        prefetcher = get_prefetcher()
+        responses = []
+        done = []
+        created = set()
+        for local_path, remote_dir in uploads:
+            if prefetcher.claim(local_path, remote_dir):
+                print "Input", local_path, "was uploaded ahead of time; skipping upload."
+                continue
+            if journal.uploaded(name, local_path, remote_dir):
+                print "Input", local_path, "was uploaded by a previous run; skipping upload."
+                continue
+            if not remote_dir in created:
+                print "creating remote directory for input:", local_path, "remote dir path:", remote_dir
+                self.create_dir(remote_dir)
+                created.add(remote_dir)
+            print "Uploading file", local_path, "to remote storage location:", remote_dir
+            responses.append(self.upload_file(local_path=local_path, remote_path=remote_dir, task_name=name))
+            done.append((local_path, remote_dir))
+        self.wait_for_uploads(responses)
+        for local_path, remote_dir in done:
+            journal.upload_done(name, local_path, remote_dir)
+
+    def prefetch(self, task, inputs):
+        """
+        Upload the inputs of task, or of an AgaveClusterTask, that are in inputs ahead of time, from the main eod
+        process. Inputs claimed by the worker running the task or uploaded by a previous run are skipped.
+        """
+        journal = get_journal()
+        prefetcher = get_prefetcher()
+        name = task.name
+        responses = []
+        started = []
+        created = set()
+        try:
+            for inp, local_path, remote_dir in self.input_uploads(task):
+                if not inp in inputs or not os.path.exists(local_path):
+                    continue
+                if journal.uploaded(name, local_path, remote_dir) or not prefetcher.begin(local_path, remote_dir):
+                    continue
+                started.append((local_path, remote_dir))
+                if not remote_dir in created:
+                    self.create_dir(remote_dir)
+                    created.add(remote_dir)
+                print "Uploading file", local_path, "ahead of time to remote storage location:", remote_dir
+                responses.append(self.upload_file(local_path=local_path, remote_path=remote_dir, task_name=name))
+            self.wait_for_uploads(responses)
+        except (Exception, SystemExit):
+            # the worker running the task uploads them instead
+            for local_path, remote_dir in started:
+                prefetcher.finish(local_path, remote_dir, uploaded=False)
+            raise
+        for local_path, remote_dir in started:
+            journal.upload_done(name, local_path, remote_dir)
+            prefetcher.finish(local_path, remote_dir)
+
+    def wait_for_uploads(self, responses):
+        """
+        Block until the transfers described by the AgaveAsyncResponse objects in responses complete.
+        """
         for rsp in responses:
             print "Waiting on upload:", rsp.url
-            status = rsp.result()
+            with get_tracer().span('upload staging', url=rsp.url):
+                status = rsp.result()
             if status == 'FINISHED':
                 print "Upload finished."
             else:
@@ -280,15 +457,13 @@ class AgaveExecutor(object):
         :return:
         """
         context = self.get_task_context(task)
-        conf = ConfigGen(EOD_TEMPLATE)
-        env = jinja2.Environment(loader=jinja2.FileSystemLoader(HERE), trim_blocks=True, lstrip_blocks=True)
         # store yaml locally of the form <task.name>.yml
         if RUNNING_IN_DOCKER:
             path = os.path.join(task.docker_host_path, task.name + '.yml')
         else:
             path = os.path.join(task.base_path, task.name + '.yml')
         print "Generating eod file for task:", task.name, ' in:', path
-        conf.generate_conf(context, path, env)
+        EOD_CONF.generate_conf(context, path)
         return path
 
     def get_taskfile_context(self, taskfile):
@@ -326,12 +501,10 @@ class AgaveExecutor(object):
         :return:
         """
         context = self.get_taskfile_context(taskfile)
-        conf = ConfigGen(EOD_TEMPLATE)
-        env = jinja2.Environment(loader=jinja2.FileSystemLoader(HERE), trim_blocks=True, lstrip_blocks=True)
         # store yaml locally in taskfile workdir:
         path = os.path.join(taskfile.work_dir, taskfile.name + '.yml')
         print "Generating eod file for taskfile:", taskfile.name, ' in:', path
-        conf.generate_conf(context, path, env)
+        EOD_CONF.generate_conf(context, path)
         return path
 
     def get_docker_cmd(self, task):
@@ -353,15 +526,18 @@ class AgaveExecutor(object):
         """
         Generate and upload the yml file representing this task.
         :param task:
-        :return:
+        :return: the path of the yml file stored locally.
         """
         path = self.gen_task_defn(task)
         self.upload_file(local_path=path, remote_path=task.eod_rel_path)
+        return path
 
     def get_action(self, task):
         """
         Returns a callable for executing a task in the Agave cloud.
         """
+        if getattr(task, 'members', None):
+            return self.get_cluster_action(task)
 
         def action_fn():
             """
@@ -372,104 +548,287 @@ class AgaveExecutor(object):
             4. Download outputs from storage to the local system once job completes.
             :return:
             """
+            journal = get_journal()
+            journal.set_state(task.name, 'staging')
             self.create_volumes(task)
             self.upload_inputs(task)
-            self.upload_task_defn(task)
-            rsp = self.submit_job(task)
+            defn_path = self.upload_task_defn(task)
+            rsp = self.submit_job(task, defn_path)
             print "Job submitted successfully. URL:", rsp.url
-            # block until job completes
-            result = rsp.result()
+            result = self.wait_for_job(rsp, task.name, task_keys(task))
             if not result == 'FINISHED':
+                journal.job_failed(task.name)
                 raise Error("Job for task: " + task.name + " failed to complete. Job status: " + result + ". URL: " + rsp.url)
             print "Job completed."
-            # download results:
-            base_path = rsp.response.get('archivePath').strip(self.home_dir)
-            print "Base archive path: ", base_path
-            if base_path[0] == '/':
-                base_path = base_path[1:]
-            for output in task.outputs:
-                local_path = os.path.join(task.base_path, output.src[1:])
-                if RUNNING_IN_DOCKER:
-                    local_path = os.path.join(task.docker_host_path, output.src[1:])
-                # remote path is: <username>/<job-dir>/<wf_name>/<task_name>/<output>
-                # base_path contains <username>/<job-dir>; wf_name == task_name
-                remote_path = os.path.join(base_path, task.name, task.name, output.src[1:])
-                try:
-                    self.download_file(local_path=local_path, remote_path=remote_path)
-                except Error as e:
-                    print "Error downloading file. Job rsp: ", str(rsp), " Error: ", str(e)
+            journal.set_state(task.name, 'fetching')
+            # remote path is: <username>/<job-dir>/<wf_name>/<task_name>/<output>; wf_name == task_name
+            self.fetch_outputs(rsp, task.name, task.outputs)
+            journal.task_done(task.name)
+
+        return action_fn
+
+    def wait_for_job(self, rsp, name, keys=None):
+        """
+        Block until the job described by the AgaveAsyncResponse rsp completes and return its final status. When
+        tracing is enabled, the phases of the job are recorded from its status history, and when auto tasks are placed,
+        its queue wait and runtime are recorded under keys (by default, the key of name) from the history as well.
+        """
+        tracer = get_tracer()
+        placement = get_placement()
+        with tracer.span('poll', task=name, url=rsp.url):
+            if get_metrics().enabled:
+                result = self.poll_job_status(rsp)
+            else:
+                result = rsp.result()
+        if tracer.enabled or placement.enabled:
+            try:
+                history = self.ag.jobs.getHistory(jobId=rsp.response.get('id'))
+            except Exception as e:
+                print "Unable to retrieve job history:", str(e)
+                history = []
+            spans = job_history_spans(history)
+            for span_name, start, end in spans:
+                tracer.add(span_name, start, end, task=name, cat='agave', job_id=rsp.response.get('id'))
+            if result == 'FINISHED':
+                placement.record_job(spans, keys or ['task:' + name])
+        return result
+
+    def poll_job_status(self, rsp):
+        """
+        Poll the status of the job described by rsp until it reaches a terminal status, keeping the remote jobs
+        gauge up to date, and return that status. Also counts the access token refreshes done by the client while
+        polling.
+        """
+        metrics = get_metrics()
+        job_id = rsp.response.get('id')
+        interval = Config.get_int('eod', 'metrics_interval', default_value=5)
+        token = self.ag.token.token_info.get('access_token')
+        status = None
+        while not status in TERMINAL_JOB_STATUSES:
+            try:
+                new_status = self.ag.jobs.getStatus(jobId=job_id).get('status')
+            except Exception as e:
+                print "Unable to retrieve status of job", job_id, ":", str(e), "; waiting for it to complete."
+                new_status = rsp.result()
+            if not new_status == status:
+                metrics.move('eod_remote_jobs', status and {'state': status}, {'state': new_status})
+                status = new_status
+            new_token = self.ag.token.token_info.get('access_token')
+            if not new_token == token:
+                metrics.inc('eod_token_refreshes_total')
+                token = new_token
+            if not status in TERMINAL_JOB_STATUSES:
+                time.sleep(interval)
+        return status
+
+    def fetch_outputs(self, rsp, run_name, outputs):
+        """
+        Download the outputs archived by a finished eod job. run_name is the name of the workflow executed by the
+        job. Outputs not needed on the host are left in remote storage and only a reference to them is recorded; the
+        reference to the downloaded ones is recorded too, for the remote tasks consuming them.
+        """
+        base_path = rsp.response.get('archivePath').strip(self.home_dir)
+        print "Base archive path: ", base_path
+        if base_path[0] == '/':
+            base_path = base_path[1:]
+        for output in outputs:
+            local_path = output.abs_host_path
+            if RUNNING_IN_DOCKER:
+                local_path = output.eod_container_path
+            # base_path contains <username>/<job-dir>
+            remote_path = os.path.join(base_path, run_name, output.task_name, output.src[1:])
+            if not output.needs_local_copy():
+                print "Output", output.label, "not used locally; leaving it in remote storage."
+                self.write_uri(local_path, self.remote_uri(remote_path))
+                continue
+            if not os.path.exists(os.path.dirname(local_path)):
+                os.makedirs(os.path.dirname(local_path))
+            try:
+                self.download_file(local_path=local_path, remote_path=remote_path, task_name=output.task_name)
+            except Error as e:
+                print "Error downloading file. Job rsp: ", str(rsp), " Error: ", str(e)
+                continue
+            self.write_uri(output.get_uri_path(), self.remote_uri(remote_path))
+
+    def get_cluster_context(self, cluster):
+        """
+        Creates the context dictionary for generating an eod yaml file running all tasks of an AgaveClusterTask as
+        a single sub-workflow. Inputs coming from outside the cluster become global inputs of the sub-workflow and
+        only the boundary outputs are declared as global outputs.
+        """
+        context = {'wf_name': cluster.name}
+        context['global_inputs'] = []
+        labels = {}
+        for idx, (inp, src) in enumerate(zip(cluster.inputs, cluster.input_names)):
+            label = 'input_' + str(idx)
+            context['global_inputs'].append({'src': src, 'label': label})
+            labels[id(inp.real_source)] = 'inputs.' + label
+        member_names = [member.name for member in cluster.members]
+        processes = []
+        for member in cluster.members:
+            process = {'name': member.name, 'image': member.image, 'command': member.command}
+            process['inputs'] = []
+            for inp in member.inputs:
+                source = inp.real_source
+                if getattr(source, 'task_name', None) in member_names:
+                    label = source.task_name + '.' + source.label
+                else:
+                    label = labels[id(source)]
+                process['inputs'].append({'label': label, 'dest': inp.dest})
+            process['outputs'] = []
+            for output in member.outputs:
+                process['outputs'].append({'src': output.src, 'label': output.label})
+            processes.append(process)
+        context['processes'] = processes
+        context['global_outputs'] = [{'label': output.task_name + '.' + output.label} for output in cluster.outputs]
+        return context
+
+    def upload_cluster_inputs(self, cluster):
+        """
+        Upload the inputs of an AgaveClusterTask that live on the host and return the list of URIs to pass to the
+        job, in the order of cluster.inputs.
+        """
+        remote_dir = os.path.join(self.wf_name, cluster.name, 'inputs')
+        uris = []
+        for inp, name in zip(cluster.inputs, cluster.input_names):
+            if inp.is_remote:
+                uris.append(read_uri(inp.real_source.get_uri_path()))
+            else:
+                uris.append(self.remote_uri(os.path.join(remote_dir, name)))
+        self.upload(cluster.name, [(local_path, remote_dir) for _, local_path, remote_dir in
+                                   self.input_uploads(cluster)])
+        return uris
+
+    def get_cluster_job(self, cluster, input_uris):
+        """
+        Returns JSON description of an endofday job running the sub-workflow of an AgaveClusterTask.
+        """
+        wf_path = self.remote_uri(os.path.join(self.wf_name, cluster.name, cluster.name + '.yml'))
+        return eod_job(self.wf_name, wf_path, input_uris, self.storage_system, task_name=cluster.name,
+                       email=self.email)
+
+    def get_cluster_action(self, cluster):
+        """
+        Returns a callable for executing all tasks of an AgaveClusterTask in a single Agave job.
+        """
+
+        def action_fn():
+            """
+            1. Upload the inputs coming from the host and the generated sub-workflow definition.
+            2. Submit a single job executing the sub-workflow.
+            3. Download the boundary outputs once the job completes.
+            """
+            journal = get_journal()
+            journal.set_state(cluster.name, 'staging')
+            self.create_dir(os.path.join(self.wf_name, cluster.name))
+            input_uris = self.upload_cluster_inputs(cluster)
+            context = self.get_cluster_context(cluster)
+            path = os.path.join(cluster.eod_base_path, cluster.name + '.yml')
+            print "Generating eod file for task group:", cluster.name, ' in:', path
+            EOD_CONF.generate_conf(context, path)
+            self.wait_for_uploads([self.upload_file(local_path=path,
+                                                    remote_path=os.path.join(self.wf_name, cluster.name))])
+            rsp = self.submit(self.get_cluster_job(cluster, input_uris), cluster.name, defn_path=path)
+            print "Job submitted successfully. URL:", rsp.url
+            result = self.wait_for_job(rsp, cluster.name)
+            if not result == 'FINISHED':
+                journal.job_failed(cluster.name)
+                raise Error("Job for task group: " + cluster.name + " failed to complete. Job status: " + result
+                            + ". URL: " + rsp.url)
+            print "Job completed."
+            journal.set_state(cluster.name, 'fetching')
+            self.fetch_outputs(rsp, cluster.name, cluster.outputs)
+            journal.task_done(cluster.name)
 
         return action_fn
 
     def get_job(self, task):
         """
-        Returns JSON description of an endofday job after compiling the job.j2 template.
+        Returns JSON description of an endofday job executing a single task.
         :param task:
         :return:
         """
-        conf = ConfigGen(JOB_TEMPLATE)
-        env = jinja2.Environment(loader=jinja2.FileSystemLoader(HERE), trim_blocks=True, lstrip_blocks=True)
-        inputs = []
+        input_uris = []
         input_base = 'agave://' + self.storage_system + '/' + self.system_homedir + '/'
         wf_path = input_base + os.path.join(self.home_dir, task.eod_rel_path, task.name + '.yml')
-        for inpv in task.input_volumes:
-            inp = {'path_str': input_base + os.path.join(self.home_dir, inpv.eod_rel_path) + ','}
-            inputs.append(inp)
-        # remove trailing comma from last entry:
-        inputs[-1]['path_str'] = inputs[-1]['path_str'][:-1]
-        context = {'wf_name': self.wf_name,
-                   'task_name': task.name,
-                   'global_inputs': inputs,
-                   'wf_path': wf_path,
-                   'system_id': self.storage_system}
-        if self.email:
-            context['email'] = self.email
-        return conf.compile(context, env)
+        for task_inp, inpv in zip(task.inputs, task.input_volumes):
+            if getattr(task_inp, 'is_remote', False):
+                # the real source references the remote data, e.g. the archived output of a previous agave task.
+                input_uris.append(read_uri(task_inp.real_source.get_uri_path()))
+            else:
+                input_uris.append(input_base + os.path.join(self.home_dir, inpv.eod_rel_path))
+        return eod_job(self.wf_name, wf_path, input_uris, self.storage_system, task_name=task.name,
+                       email=self.email)
 
     def get_job_for_wf(self, taskfile, yaml_file_name):
         """
-        Returns JSON description of an endofday job for entire wf after compiling the job.j2 template.
+        Returns JSON description of an endofday job for entire wf.
         :param task:
         :return:
         """
-        conf = ConfigGen(JOB_TEMPLATE)
-        env = jinja2.Environment(loader=jinja2.FileSystemLoader(HERE), trim_blocks=True, lstrip_blocks=True)
-        inputs = []
+        input_uris = []
         input_base = 'agave://' + self.storage_system + '/'
         wf_path = input_base + os.path.join(self.system_homedir + '/', self.home_dir, taskfile.name, yaml_file_name)
         for gin in taskfile.global_inputs:
             # URIs get passed 'as is' to Agave:
             if '://' in gin.src:
-                path_str = gin.src
+                input_uris.append(gin.src)
             else:
-                path_str = input_base + os.path.join(self.system_homedir + '/',
-                                                     self.home_dir,
-                                                     taskfile.name,
-                                                     'global_inputs', os.path.split(gin.src)[1])
-            inp = {'path_str': path_str}
-            inputs.append(inp)
-        context = {'wf_name': self.wf_name,
-                   'global_inputs': inputs,
-                   'wf_path': wf_path,
-                   'system_id': self.storage_system}
-        if self.email:
-            context['email'] = self.email
-        return conf.compile(context, env)
-
-
-    def submit_job(self, task):
+                input_uris.append(input_base + os.path.join(self.system_homedir + '/',
+                                                            self.home_dir,
+                                                            taskfile.name,
+                                                            'global_inputs', os.path.split(gin.src)[1]))
+        return eod_job(self.wf_name, wf_path, input_uris, self.storage_system, email=self.email)
+
+    def submit_job(self, task, defn_path=None):
         """
         Submits an Agave job to execute an endofday step in the cloud.
         :return:
         """
-        job = self.get_job(task)
+        return self.submit(self.get_job(task), task.name, defn_path=defn_path)
+
+    def submit(self, job, name, defn_path=None):
+        """
+        Submits the JSON job description, job, for the task (or task group) called name. defn_path is the local copy
+        of the eod workflow definition uploaded for the job. If a previous run submitted the same job for the same
+        definition and was interrupted before the job completed, reattach to that job instead.
+        :return:
+        """
+        journal = get_journal()
+        defn = None
+        if defn_path:
+            with open(defn_path, 'rb') as f:
+                defn = f.read()
+        job_id = journal.find_job(name, job, defn)
+        if job_id:
+            rsp = self.reattach(job_id, name)
+            if rsp:
+                return rsp
         print "Submitting job: ", str(job)
         try:
-            rsp = self.ag.jobs.submit(body=job)
+            with get_tracer().span('job submit', task=name, cat='agave'):
+                rsp = self.ag.jobs.submit(body=job)
         except Exception as e:
-            raise Error("Exception trying to submit job for task: " + task.name + ' job: ' + str(job) + '. Exception: ' + str(e))
+            raise Error("Exception trying to submit job for task: " + name + ' job: ' + str(job) + '. Exception: ' + str(e))
         if type(rsp) == dict:
-            raise Error("Error trying to submit job for task: " + task.name + ' job: ' + str(job) + '. Response: ' + str(rsp))
+            raise Error("Error trying to submit job for task: " + name + ' job: ' + str(job) + '. Response: ' + str(rsp))
+        journal.job_submitted(name, job, rsp.get('id'), defn)
+        return AgaveAsyncResponse(self.ag, rsp)
+
+    def reattach(self, job_id, name):
+        """
+        Return an AgaveAsyncResponse for the job with id job_id submitted by a previous run for the task called name,
+        or None if the job cannot be retrieved or did not succeed.
+        """
+        try:
+            rsp = self.ag.jobs.get(jobId=job_id)
+        except Exception as e:
+            print "Unable to retrieve job", job_id, "submitted by a previous run:", str(e)
+            return None
+        if type(rsp) == dict or rsp.get('status') in TERMINAL_JOB_STATUSES and not rsp.get('status') == 'FINISHED':
+            print "Job", job_id, "submitted by a previous run did not succeed; submitting a new job."
+            return None
+        print "Reattaching task", name, "to job", job_id, "submitted by a previous run. Status:", rsp.get('status')
         return AgaveAsyncResponse(self.ag, rsp)
 
 
@@ -0,0 +1,66 @@
+# Builds the JSON job descriptions submitted to the Agave jobs service.
+#
+# Job descriptions are constructed as dictionaries and serialized with the json module rather than rendered from a
+# template, which is both faster and guarantees a valid document regardless of the number of inputs.
+
+import json
+from collections import OrderedDict
+
+# the Agave app executing an eod workflow
+EOD_APP_ID = 'endofday-local-0.0.1'
+
+# job events that trigger an email notification
+NOTIFICATION_EVENTS = ('FINISHED', 'FAILED', 'KILLED', 'STOPPED', 'RUNNING')
+
+
+def notifications(email):
+    """Return the notifications section sending an email to email on every notification event."""
+    return [OrderedDict([('url', email), ('event', event), ('persistent', True)]) for event in NOTIFICATION_EVENTS]
+
+def param_value(value):
+    """Convert a parameter value supplied as a string to the JSON type expected by Agave."""
+    if isinstance(value, basestring):
+        if value.lower() == 'true' or value.lower() == 'false':
+            return value.lower() == 'true'
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    return value
+
+def to_json(job):
+    return json.dumps(job, indent=2)
+
+def eod_job(wf_name, wf_path, input_uris, system_id, task_name='', email=None):
+    """
+    Returns the JSON description of a job executing the eod workflow at wf_path (an agave URI) with global inputs
+    staged from input_uris.
+    """
+    inputs = OrderedDict([('wf', [wf_path])])
+    if input_uris:
+        inputs['glob_in'] = list(input_uris)
+    job = OrderedDict([('name', 'eod-{}-{}'.format(wf_name, task_name)),
+                       ('appId', EOD_APP_ID),
+                       ('inputs', inputs),
+                       ('archive', True),
+                       ('archiveSystem', system_id)])
+    if email:
+        job['notifications'] = notifications(email)
+    return to_json(job)
+
+def app_job(app_id, inputs, parameters, system_id, wf_name='', task_name='', email=None):
+    """
+    Returns the JSON description of a job executing the Agave app app_id. inputs is a list of (input_id, uris)
+    pairs and parameters a dictionary of parameter values supplied as strings.
+    """
+    job = OrderedDict([('name', 'eod-{}-{}-{}'.format(wf_name, task_name, app_id)),
+                       ('appId', app_id)])
+    if inputs:
+        job['inputs'] = OrderedDict((input_id, list(uris)) for input_id, uris in inputs)
+    if parameters:
+        job['parameters'] = OrderedDict((k, param_value(v)) for k, v in parameters.items())
+    job['archive'] = False
+    job['archiveSystem'] = system_id
+    if email:
+        job['notifications'] = notifications(email)
+    return to_json(job)
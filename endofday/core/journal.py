@@ -0,0 +1,109 @@
+# Write-ahead journal of the remote work done by a run, so that a run interrupted while waiting on an Agave job can
+# reattach to the job on restart instead of submitting it again.
+#
+# The journal holds one entry per task (or task group) with:
+#   - state: the last step the task reached (staging, submitted, fetching),
+#   - job: a fingerprint of the job description and of the workflow definition it runs, and job_id: the id of the job
+#     submitted for it,
+#   - uploads: the inputs already uploaded, with the size and modification time of the local file.
+# An entry is removed once the task completes, so the journal only describes work in flight. Every step is written
+# as soon as the remote call it describes returns, under a file lock shared by the doit worker processes.
+
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+
+from .config import Config
+from .locks import Current, StateFile, state_file_path
+
+# name of the journal file in the workflow directory
+JOURNAL_FILE = '.eod_journal.json'
+
+
+def job_fingerprint(job, defn=None):
+    """
+    Return a fingerprint of the job description job and of defn, the contents of the eod workflow definition it runs.
+    The job only references the definition by path, which does not change when the definition does.
+    """
+    digest = hashlib.md5(json.dumps(job, sort_keys=True))
+    if defn is not None:
+        digest.update(hashlib.md5(defn).hexdigest())
+    return digest.hexdigest()
+
+def file_version(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+
+class Journal(StateFile):
+    """Journal of the remote work of a run. A disabled journal records nothing and never finds a job to reattach to."""
+
+    def entry(self, name):
+        return self.read().get(name, {})
+
+    def set_state(self, name, state):
+        if not self.enabled:
+            return
+        with self.locked() as journal:
+            journal.setdefault(name, {})['state'] = state
+
+    def find_job(self, name, job, defn=None):
+        """
+        Return the id of the job submitted for the task called name if its description was job and it ran the workflow
+        definition defn, else None.
+        """
+        entry = self.entry(name)
+        if entry.get('job_id') and entry.get('job') == job_fingerprint(job, defn):
+            return entry['job_id']
+        return None
+
+    def job_submitted(self, name, job, job_id, defn=None):
+        if not self.enabled:
+            return
+        with self.locked() as journal:
+            entry = journal.setdefault(name, {})
+            entry.update({'state': 'submitted', 'job': job_fingerprint(job, defn), 'job_id': job_id})
+
+    def job_failed(self, name):
+        """Forget the job of the task called name so that the next run submits a new one."""
+        if not self.enabled:
+            return
+        with self.locked() as journal:
+            entry = journal.get(name, {})
+            entry.pop('job', None)
+            entry.pop('job_id', None)
+
+    def uploaded(self, name, local_path, remote_path):
+        """Whether local_path was uploaded to remote_path for the task called name and has not changed since."""
+        upload = self.entry(name).get('uploads', {}).get(local_path)
+        return bool(upload) and upload == [remote_path] + file_version(local_path)
+
+    def upload_done(self, name, local_path, remote_path):
+        """Record an upload. A job submitted before the upload used other inputs, so it is forgotten."""
+        if not self.enabled:
+            return
+        with self.locked() as journal:
+            entry = journal.setdefault(name, {})
+            entry.setdefault('uploads', {})[local_path] = [remote_path] + file_version(local_path)
+            entry.pop('job', None)
+            entry.pop('job_id', None)
+
+    def task_done(self, name):
+        if not self.enabled:
+            return
+        with self.locked() as journal:
+            journal.pop(name, None)
+
+
+current = Current(Journal())
+
+def configure(work_dir):
+    """Enable the journal for a run whose files live in work_dir unless the journal option is off in endofday.conf."""
+    if not Config.get_bool('eod', 'journal', default_value=True):
+        return None
+    return current.set(Journal(state_file_path(work_dir, JOURNAL_FILE)))
+
+def get_journal():
+    return current.get()
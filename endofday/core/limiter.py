@@ -0,0 +1,173 @@
+# Adaptive limit on the number of containers running at once on the host, driven by host pressure signals.
+#
+# Tasks are started by the doit worker processes, so the limit and the containers currently running are kept in a JSON
+# state file updated under a lock: a worker takes a slot before starting a container and gives it back when the
+# container exits. A controller thread in the main process reads the pressure stall information (PSI) of the host in
+# /proc/pressure, or the load average where PSI is not available, and adjusts the limits: additive increase while the
+# host has spare capacity and the slots are all in use, multiplicative decrease when tasks stall.
+#
+# Tasks marked io_heavy take their slots from a separate pool limited by I/O pressure, so that a disk bound stage does
+# not hold back CPU bound tasks and the other way around.
+
+from __future__ import print_function
+
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from .config import Config
+from .locks import Current, StateFile, state_file_path
+from .metrics import get_metrics
+
+# pressure signals (PSI resources) limiting each pool
+POOLS = {'cpu': ('cpu', 'memory'),
+         'io': ('io', 'memory')}
+
+# percentage of time in the last 10 seconds some tasks stalled on a resource above which the limit is halved, and
+# below which it may grow
+HIGH_PRESSURE = 25.0
+LOW_PRESSURE = 5.0
+
+# name of the state file in the workflow directory
+STATE_FILE = '.concurrency.json'
+
+# seconds between two attempts of a worker to take a slot
+POLL_INTERVAL = 0.2
+
+
+def read_pressure(resource, root='/proc/pressure'):
+    """Return the share of time (in percent) some tasks stalled on resource in the last 10 seconds, or None."""
+    try:
+        with open(os.path.join(root, resource)) as f:
+            for line in f:
+                fields = line.split()
+                if fields and fields[0] == 'some':
+                    return float(dict(field.split('=') for field in fields[1:])['avg10'])
+    except (IOError, OSError, KeyError, ValueError):
+        pass
+    return None
+
+def host_pressure(root='/proc/pressure'):
+    """
+    Return the pressure on each resource of the host. Without PSI, CPU pressure is estimated from the 1 minute load
+    average as the share of runnable tasks exceeding the number of cores, and the other resources are unknown (None).
+    """
+    pressure = dict((resource, read_pressure(resource, root)) for resource in ('cpu', 'io', 'memory'))
+    if all(value is None for value in pressure.values()):
+        cpus = multiprocessing.cpu_count()
+        load = os.getloadavg()[0]
+        pressure['cpu'] = min(100.0, max(0.0, 100.0 * (load - cpus) / cpus))
+    return pressure
+
+
+class ConcurrencyLimiter(StateFile):
+    """
+    Slots for running containers shared by all processes of a run, in one pool per kind of task. Taking a slot of a
+    disabled limiter never blocks.
+    """
+    def __init__(self, state_path=None, initial=1, maximum=1):
+        super(ConcurrencyLimiter, self).__init__(state_path)
+        self.initial = initial
+        self.maximum = maximum
+
+    def reset(self):
+        with self.locked() as state:
+            state.clear()
+            for pool in POOLS:
+                state[pool] = {'limit': self.initial, 'holders': []}
+
+    def try_acquire(self, pool):
+        with self.locked() as state:
+            slots = state[pool]
+            # slots of processes that died without giving them back are free again
+            slots['holders'] = [pid for pid in slots['holders'] if pid_alive(pid)]
+            if len(slots['holders']) < slots['limit']:
+                slots['holders'].append(os.getpid())
+                return True
+        return False
+
+    def release(self, pool):
+        with self.locked() as state:
+            holders = state[pool]['holders']
+            if os.getpid() in holders:
+                holders.remove(os.getpid())
+
+    @contextmanager
+    def slot(self, pool):
+        """Context manager holding a slot of pool, waiting for one to become free."""
+        if not self.enabled:
+            yield
+            return
+        while not self.try_acquire(pool):
+            time.sleep(POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            self.release(pool)
+
+    def adjust(self, pressure):
+        """Update the limit of every pool given the host pressure; returns the new limits."""
+        limits = {}
+        with self.locked() as state:
+            for pool, resources in POOLS.items():
+                slots = state[pool]
+                values = [pressure[resource] for resource in resources if pressure.get(resource) is not None]
+                if not values:
+                    limits[pool] = slots['limit']
+                    continue
+                if max(values) > HIGH_PRESSURE:
+                    slots['limit'] = max(1, slots['limit'] // 2)
+                elif max(values) < LOW_PRESSURE and len(slots['holders']) >= slots['limit']:
+                    slots['limit'] = min(self.maximum, slots['limit'] + 1)
+                limits[pool] = slots['limit']
+        return limits
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+class ConcurrencyController(threading.Thread):
+    """Daemon thread of the main eod process adjusting the limits of limiter every interval seconds."""
+
+    def __init__(self, limiter, interval=2):
+        super(ConcurrencyController, self).__init__()
+        self.daemon = True
+        self.limiter = limiter
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            limits = self.limiter.adjust(host_pressure())
+            for pool, limit in limits.items():
+                get_metrics().set('eod_concurrency_limit', limit, pool=pool)
+
+    def stop(self):
+        self.stopped.set()
+
+
+current = Current(ConcurrencyLimiter())
+
+def configure(work_dir):
+    """
+    Enable the adaptive limiter for a run whose files live in work_dir if the adaptive_concurrency option is set in
+    endofday.conf. Returns the controller to start in the main process, or None.
+    """
+    if not Config.get_bool('eod', 'adaptive_concurrency', default_value=False):
+        return None
+    cpus = multiprocessing.cpu_count()
+    limiter = current.set(ConcurrencyLimiter(state_file_path(work_dir, STATE_FILE), initial=cpus,
+                                             maximum=Config.get_int('eod', 'max_concurrency', default_value=2 * cpus)))
+    limiter.reset()
+    return ConcurrencyController(limiter,
+                                 interval=Config.get_int('eod', 'concurrency_interval', default_value=2))
+
+def get_limiter():
+    return current.get()
@@ -0,0 +1,40 @@
+# Running the command of a process directly in the eod container, for trusted, lightweight steps such as
+# concatenations and renames that do not need an image of their own.
+#
+# The command runs in a sandbox directory in the base directory of the task, which mirrors the volumes a container of
+# the task would get: the container path of every output directory and input is a symbolic link, below the sandbox, to
+# the directory or file mounted there. The container paths in the command are rewritten to their paths below the
+# sandbox, so the command reads and writes the same files as it would in a container.
+
+from __future__ import print_function
+
+import os
+import re
+
+# directory, in the base directory of a task, holding its sandbox while its command runs
+SANDBOX_DIR = '.eod_local'
+
+
+def sandbox_command(command, container_paths, sandbox):
+    """Return command with the container paths of container_paths rewritten to their paths below sandbox."""
+    paths = sorted(set(path.rstrip('/') for path in container_paths), key=len, reverse=True)
+    if not paths:
+        return command
+    pattern = re.compile(r'(?<![\w./-])({})(?=[/\s\'";|&<>(),:]|$)'.format('|'.join(re.escape(path) for path in paths)))
+    return pattern.sub(lambda match: sandbox + match.group(1), command)
+
+def make_links(links):
+    """Create the symbolic links of links, a list of (path, target) pairs, in order."""
+    for path, target in links:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        # e.g. a file left in an output directory by the mount point of an earlier container
+        if os.path.lexists(path) and not os.path.isdir(path):
+            os.remove(path)
+        os.symlink(target, path)
+
+def remove_links(links):
+    """Remove the symbolic links created by make_links(links), in reverse order."""
+    for path, _ in reversed(links):
+        if os.path.islink(path):
+            os.remove(path)
@@ -0,0 +1,97 @@
+# Helpers for sharing small pieces of state between eod processes through files on the host.
+
+from __future__ import print_function
+
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+
+
+def read_json(path, default=None):
+    """Read the JSON document at path, returning default if the file is missing or corrupt."""
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except ValueError:
+        print("Ignoring corrupt state file at {}".format(path))
+        return default
+
+def write_json(path, obj):
+    """Atomically replace the JSON document at path with obj."""
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f)
+    os.rename(tmp_path, path)
+
+@contextmanager
+def file_lock(lock_path, shared=False):
+    """Context manager holding an flock on lock_path for the duration of the block."""
+    with open(lock_path, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+@contextmanager
+def locked_json(path, lock_path=None):
+    """
+    Context manager yielding the dictionary stored at path while holding an exclusive lock. Changes made to the
+    dictionary are written back when the block exits without an exception.
+    """
+    with file_lock(lock_path or path + '.lock'):
+        state = read_json(path, {})
+        yield state
+        write_json(path, state)
+
+def state_file_path(work_dir, name):
+    """Return the path of the state file called name in work_dir, creating the directory if needed."""
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir)
+    return os.path.join(work_dir, name)
+
+
+class StateFile(object):
+    """
+    Base class of the state of a run shared by its processes through a JSON file at state_path. Objects without a
+    state_path are disabled; the methods of subclasses then do nothing, or behave as if the feature was off.
+    """
+    def __init__(self, state_path=None):
+        self.state_path = state_path
+
+    @property
+    def enabled(self):
+        return bool(self.state_path)
+
+    def reset(self):
+        """Start the run with an empty state."""
+        write_json(self.state_path, {})
+
+    def read(self):
+        """Return a snapshot of the state, empty when disabled."""
+        if not self.enabled:
+            return {}
+        return read_json(self.state_path, {})
+
+    def locked(self):
+        """Context manager yielding the state for an update; see locked_json()."""
+        return locked_json(self.state_path)
+
+
+class Current(object):
+    """
+    Holder of the state object of the current run for a module, disabled until the configure() function of the module
+    replaces it with set().
+    """
+    def __init__(self, disabled):
+        self.value = disabled
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+        return value
@@ -0,0 +1,29 @@
+# Download remote files that were left in remote storage during a workflow execution.
+#
+# Outputs of tasks running in the Agave cloud that are not used by a local task nor declared as global outputs are
+# not downloaded; instead, a file containing the agave URI of the output is written in their place. This module
+# replaces such files with the actual remote contents.
+
+import argparse
+import requests
+
+from .executors import AgaveExecutor
+from .hosts import update_hosts
+
+
+def main(wf_name, paths):
+    ae = AgaveExecutor(wf_name=wf_name, create_home_dir=False)
+    for path in paths:
+        ae.materialize(path)
+
+
+if __name__ == '__main__':
+    requests.packages.urllib3.disable_warnings()
+    update_hosts()
+    parser = argparse.ArgumentParser(description='Download remote outputs referenced by local files.')
+    parser.add_argument('wf_name', type=str,
+                        help='Name of the workflow the outputs belong to')
+    parser.add_argument('paths', type=str, nargs='+',
+                        help='Paths of the files to materialize')
+    args = parser.parse_args()
+    main(args.wf_name, args.paths)
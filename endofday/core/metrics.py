@@ -0,0 +1,173 @@
+# Scheduler and transfer statistics for a running workflow, exported in the Prometheus text format.
+#
+# Counters and gauges are updated from the doit worker processes (running containers, transfers, remote jobs) and
+# from the main process (task states), so the values are kept in a JSON state file updated under a lock. The main
+# process periodically renders them to a metrics.prom file in the workflow directory and, optionally, serves them
+# over HTTP.
+
+from __future__ import print_function
+
+import os
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from .config import Config
+from .locks import Current, StateFile, state_file_path
+
+# metric name: (type, help)
+METRICS = {
+    'eod_ready_tasks': ('gauge', 'Tasks whose dependencies are complete but that have not started yet.'),
+    'eod_tasks': ('gauge', 'Tasks by state.'),
+    'eod_running_containers': ('gauge', 'Containers currently running on this host.'),
+    'eod_remote_jobs': ('gauge', 'Agave jobs submitted by this run by last known status.'),
+    'eod_bytes_uploaded_total': ('counter', 'Bytes uploaded to remote storage.'),
+    'eod_bytes_downloaded_total': ('counter', 'Bytes downloaded from remote storage.'),
+    'eod_retries_total': ('counter', 'Operations retried after a failure.'),
+    'eod_token_refreshes_total': ('counter', 'Agave access token refreshes observed.'),
+    'eod_concurrency_limit': ('gauge', 'Containers allowed to run at once on this host, by pool.'),
+}
+
+# metrics always present in the output, even before anything updated them
+DEFAULTS = ('eod_ready_tasks', 'eod_running_containers', 'eod_bytes_uploaded_total', 'eod_bytes_downloaded_total',
+            'eod_retries_total', 'eod_token_refreshes_total')
+
+
+def series_key(name, labels):
+    """Return the Prometheus series identifier for name and the labels dictionary."""
+    if not labels:
+        return name
+    return '{}{{{}}}'.format(name, ','.join('{}="{}"'.format(k, labels[k]) for k in sorted(labels)))
+
+def render(values):
+    """Render a dictionary of series identifiers to values in the Prometheus text exposition format."""
+    values = dict(values)
+    for name in DEFAULTS:
+        if not any(key.split('{')[0] == name for key in values):
+            values[name] = 0
+    lines = []
+    for name in sorted(set(key.split('{')[0] for key in values)):
+        kind, help_text = METRICS.get(name, ('untyped', ''))
+        lines.append('# HELP {} {}'.format(name, help_text))
+        lines.append('# TYPE {} {}'.format(name, kind))
+        for key in sorted(k for k in values if k.split('{')[0] == name):
+            lines.append('{} {}'.format(key, values[key]))
+    return '\n'.join(lines) + '\n'
+
+
+class Metrics(StateFile):
+    """Counters and gauges shared by all processes of a run. All the methods of disabled metrics are no-ops."""
+
+    def inc(self, name, value=1, **labels):
+        """Increment a counter or gauge; use a negative value to decrement a gauge."""
+        if not self.enabled:
+            return
+        with self.locked() as state:
+            key = series_key(name, labels)
+            state[key] = state.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self.locked() as state:
+            state[series_key(name, labels)] = value
+
+    def move(self, name, old_labels, new_labels):
+        """Move one unit of a gauge from the series with old_labels to the series with new_labels, e.g. when a
+        remote job changes status."""
+        if not self.enabled:
+            return
+        with self.locked() as state:
+            if old_labels is not None:
+                old_key = series_key(name, old_labels)
+                state[old_key] = state.get(old_key, 0) - 1
+            new_key = series_key(name, new_labels)
+            state[new_key] = state.get(new_key, 0) + 1
+
+    def values(self):
+        return self.read()
+
+
+class MetricsExporter(threading.Thread):
+    """
+    Daemon thread of the main eod process rewriting the metrics file every interval seconds. If port is given, the
+    metrics are also served over HTTP at http://<host>:<port>/metrics.
+    """
+    def __init__(self, metrics, path, interval=5, port=None, collect=None):
+        super(MetricsExporter, self).__init__()
+        self.daemon = True
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.port = port
+        # optional callable returning a dictionary of additional series computed in the main process
+        self.collect = collect
+        self.stopped = threading.Event()
+
+    def text(self):
+        values = self.metrics.values()
+        if self.collect:
+            values.update(self.collect())
+        return render(values)
+
+    def write(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.text())
+        os.rename(tmp_path, self.path)
+
+    def serve(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if not self.path.rstrip('/') in ('', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = exporter.text()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = HTTPServer(('', self.port), Handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        print("Serving metrics on port {}".format(self.port))
+
+    def run(self):
+        if self.port:
+            self.serve()
+        while not self.stopped.is_set():
+            self.write()
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        """Stop the exporter, writing the metrics file one last time."""
+        self.stopped.set()
+        self.write()
+
+
+current = Current(Metrics())
+
+
+def configure(work_dir):
+    """
+    Enable metrics for a run whose files live in work_dir if the metrics option is set in endofday.conf. Returns
+    the exporter to start in the main process, or None.
+    """
+    if not Config.get_bool('eod', 'metrics', default_value=False):
+        return None
+    metrics = current.set(Metrics(state_file_path(work_dir, '.metrics.json')))
+    metrics.reset()
+    return MetricsExporter(metrics,
+                           os.path.join(work_dir, 'metrics.prom'),
+                           interval=Config.get_int('eod', 'metrics_interval', default_value=5),
+                           port=Config.get_int('eod', 'metrics_port'))
+
+def get_metrics():
+    return current.get()
@@ -0,0 +1,140 @@
+# Choosing where to run the processes with execution: auto, on the host or in the Agave cloud.
+#
+# The placement of a task is decided when doit starts it, from what the run and the previous runs of the workflow
+# measured so far: the runtimes of the tasks on the host and in remote jobs, the bandwidth of uploads to and downloads
+# from remote storage, and the time remote jobs spent queued. Running on the host is estimated to take the runtime of
+# the task slowed down by the current CPU pressure on the host; running remotely to take uploading its inputs, the
+# queue wait, the remote runtime and downloading its outputs. The task runs where it is expected to finish first, which
+# keeps the host busy with the tasks it runs best and sends the others to the cloud when the host is overloaded. Since
+# every decision uses the latest measurements, e.g. the first shards of a fan-out inform the placement of the next
+# ones.
+#
+# Tasks are run by the doit worker processes, so the measurements are kept in a JSON state file in the workflow
+# directory updated under a lock. The file is kept between runs.
+
+from __future__ import print_function
+
+from .locks import Current, StateFile, state_file_path
+
+# name of the state file in the workflow directory
+STATE_FILE = '.eod_placement.json'
+
+# weight of a new measurement in the moving averages
+SMOOTHING = 0.3
+
+# estimates used until the first measurements: bandwidth in bytes per second, queue wait and runtimes in seconds
+DEFAULT_UPLOAD_BANDWIDTH = 10e6
+DEFAULT_DOWNLOAD_BANDWIDTH = 10e6
+DEFAULT_QUEUE_WAIT = 60.0
+DEFAULT_RUNTIME = 10.0
+
+# share of the CPU left to a task on a host under full pressure, bounding the slowdown of local runs
+MIN_CPU_SHARE = 0.1
+
+LOCAL = 'local'
+REMOTE = 'remote'
+
+
+def task_keys(task):
+    """
+    Return the keys under which the measurements of task are recorded, most specific first: its name, then its image,
+    which tasks never run before, such as the copies of a sweep or the shards of a split, share with others.
+    """
+    keys = ['task:' + task.name]
+    if getattr(task, 'image', None):
+        keys.append('image:' + task.image)
+    return keys
+
+def average(old, value):
+    """Return the moving average old updated with value."""
+    if old is None:
+        return value
+    return (1 - SMOOTHING) * old + SMOOTHING * value
+
+def lookup(values, keys):
+    """Return the value of the first of keys in values, or None."""
+    for key in keys:
+        if key in values:
+            return values[key]
+    return None
+
+def estimate(state, keys, in_bytes, cpu_pressure=None):
+    """
+    Return the estimated times (local, remote) in seconds to run the task with keys on the host and in the Agave cloud,
+    given the measurements in state, the in_bytes of inputs it would upload and the CPU pressure on the host in percent.
+    """
+    runtimes = state.get('runtime', {})
+    local_runtime = lookup(runtimes.get(LOCAL, {}), keys)
+    remote_runtime = lookup(runtimes.get(REMOTE, {}), keys)
+    # the same container runs in both places, so one runtime stands in for the other until both are measured
+    if local_runtime is None:
+        local_runtime = remote_runtime if remote_runtime is not None else DEFAULT_RUNTIME
+    if remote_runtime is None:
+        remote_runtime = local_runtime
+    out_bytes = lookup(state.get('output_bytes', {}), keys)
+    if out_bytes is None:
+        out_bytes = in_bytes
+    local = local_runtime / max(MIN_CPU_SHARE, 1 - (cpu_pressure or 0) / 100.0)
+    remote = (in_bytes / state.get('upload_bandwidth', DEFAULT_UPLOAD_BANDWIDTH)
+              + state.get('queue_wait', DEFAULT_QUEUE_WAIT)
+              + remote_runtime
+              + out_bytes / state.get('download_bandwidth', DEFAULT_DOWNLOAD_BANDWIDTH))
+    return local, remote
+
+def choose(local, remote):
+    """Return the placement expected to finish first given the estimates of estimate(); the host wins ties."""
+    return REMOTE if remote < local else LOCAL
+
+
+class PlacementStats(StateFile):
+    """
+    Measurements of the runs of a workflow used to place its auto tasks. Disabled stats record nothing, so the defaults
+    are used.
+    """
+    def record_runtime(self, placement, keys, seconds):
+        """Record that a task with keys ran for seconds on the host (LOCAL) or in a remote job (REMOTE)."""
+        if not self.enabled:
+            return
+        with self.locked() as state:
+            runtimes = state.setdefault('runtime', {}).setdefault(placement, {})
+            for key in keys:
+                runtimes[key] = average(runtimes.get(key), seconds)
+
+    def record_output_bytes(self, keys, nbytes):
+        """Record the size of the outputs of a task with keys."""
+        if not self.enabled:
+            return
+        with self.locked() as state:
+            sizes = state.setdefault('output_bytes', {})
+            for key in keys:
+                sizes[key] = average(sizes.get(key), nbytes)
+
+    def record_transfer(self, direction, nbytes, seconds):
+        """Record a transfer of nbytes to ('upload') or from ('download') remote storage that took seconds."""
+        # small files mostly measure the latency of a request, not the bandwidth
+        if not self.enabled or nbytes < 1e6 or seconds <= 0:
+            return
+        with self.locked() as state:
+            key = direction + '_bandwidth'
+            state[key] = average(state.get(key), nbytes / seconds)
+
+    def record_job(self, spans, keys):
+        """Record the queue wait and the runtime of a remote job from its phases, as given by job_history_spans()."""
+        if not self.enabled:
+            return
+        for name, start, end in spans:
+            if name == 'job queue wait':
+                with self.locked() as state:
+                    state['queue_wait'] = average(state.get('queue_wait'), end - start)
+            elif name == 'remote run':
+                self.record_runtime(REMOTE, keys, end - start)
+
+
+current = Current(PlacementStats())
+
+def configure(work_dir):
+    """Record the measurements used to place the auto tasks of the workflow in work_dir."""
+    current.set(PlacementStats(state_file_path(work_dir, STATE_FILE)))
+
+def get_placement():
+    return current.get()
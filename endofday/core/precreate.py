@@ -0,0 +1,115 @@
+# Creating the containers of tasks ahead of time, while their producers are still running.
+#
+# Creating a container (setting up the layers of the image and the mounts) is a noticeable part of a short task, and it
+# only starts once doit decides the task is ready. With precreate_containers set, the main eod process creates the
+# containers of the pending tasks whose producers are all running or done in a background thread, so that the worker
+# running the task only has to start its container.
+#
+# The inputs that do not exist yet cannot be mounted when the container is created: docker would create a directory in
+# their place, and an input that is about to be rewritten by its producer may be replaced by a new file. They are hard
+# linked when the task starts instead, either into a staged directory mounted in place of their container directory
+# or, for inputs within an output directory of the task, into the output directory itself. Tasks with such inputs that
+# cannot be linked, e.g. directories, are not created ahead of time.
+#
+# The main process and the workers share the containers through a state file in the workflow directory. A worker
+# claims the container of its task when the task starts, so a container whose creation completes after that is removed
+# instead of being used.
+
+from __future__ import print_function
+
+from .config import Config
+from .locks import Current, StateFile, state_file_path
+from .threads import QueueThread
+
+# name of the state file in the workflow directory
+STATE_FILE = '.eod_precreated.json'
+
+# states of a task in the state file besides the record of its container
+CREATING = 'creating'
+CLAIMED = 'claimed'
+
+
+def candidates(order, states, producers, finished_states):
+    """
+    Return the names, in order, of the pending tasks about to become ready: those whose producers are all running or
+    in one of finished_states, with at least one of them still running.
+    """
+    result = []
+    for name in order:
+        if not states.get(name) == 'pending':
+            continue
+        producer_states = [states.get(producer) for producer in producers.get(name, ())]
+        if 'running' in producer_states and all(state == 'running' or state in finished_states
+                                                for state in producer_states):
+            result.append(name)
+    return result
+
+
+class Precreator(StateFile):
+    """
+    Containers created ahead of time for the tasks of a run, at most ahead of them at a time. A disabled precreator
+    never creates a container ahead of time.
+    """
+    def __init__(self, state_path=None, ahead=0):
+        super(Precreator, self).__init__(state_path)
+        self.ahead = ahead
+
+    def begin(self, name):
+        """Mark the container of task name as being created. Returns False if the task was already claimed."""
+        with self.locked() as state:
+            if name in state:
+                return False
+            state[name] = CREATING
+            return True
+
+    def finish(self, name, record):
+        """
+        Record the container created for task name; record holds its id and the links to make when the task starts.
+        Returns False if the task was claimed in the meantime, in which case the container must be removed.
+        """
+        with self.locked() as state:
+            if not state.get(name) == CREATING:
+                return False
+            state[name] = record
+            return True
+
+    def abandon(self, name):
+        """Forget a container that could not be created, so that the task runs normally."""
+        with self.locked() as state:
+            if state.get(name) == CREATING:
+                del state[name]
+
+    def claim(self, name):
+        """Claim task name for the worker starting it. Returns the record of its container, or None."""
+        if not self.enabled:
+            return None
+        with self.locked() as state:
+            record = state.get(name)
+            state[name] = CLAIMED
+        return record if isinstance(record, dict) else None
+
+    def leftovers(self):
+        """Claim and return the records of the containers that were not used, by task name."""
+        with self.locked() as state:
+            result = dict((name, record) for name, record in state.items() if isinstance(record, dict))
+            for name in result:
+                state[name] = CLAIMED
+        return result
+
+
+current = Current(Precreator())
+
+def configure(work_dir):
+    """
+    Create containers ahead of time for the run of the workflow in work_dir if the precreate_containers option is set
+    in endofday.conf. Returns the thread creating them, to start in the main process, or None.
+    """
+    ahead = Config.get_int('eod', 'precreate_containers', default_value=0)
+    if ahead <= 0:
+        return None
+    precreator = current.set(Precreator(state_file_path(work_dir, STATE_FILE), ahead))
+    precreator.reset()
+    return QueueThread('create a container')
+
+def get_precreator():
+    return current.get()
@@ -0,0 +1,87 @@
+# Uploading the inputs of remote tasks ahead of time.
+#
+# A task with execution: agave uploads its inputs when it starts, so uploads of inputs that existed long before, such as
+# the global inputs of the workflow, are on the critical path of the run. With prefetch_inputs on, the main eod process
+# uploads the inputs of the remote tasks that will run in a background thread as soon as they are available: the
+# global inputs when the run starts and the outputs of other tasks once these complete. Only the inputs produced last
+# are left to upload when the task starts.
+#
+# The main process and the workers share the uploads through a state file in the workflow directory. The worker running
+# a remote task claims each of its inputs before uploading it: an input uploaded ahead of time is skipped, one being
+# uploaded is waited for, and the others are uploaded by the worker, and no longer ahead of time.
+
+from __future__ import print_function
+
+import time
+
+from .config import Config
+from .limiter import POLL_INTERVAL
+from .locks import Current, StateFile, state_file_path
+from .threads import QueueThread
+
+# name of the state file in the workflow directory
+STATE_FILE = '.eod_prefetched.json'
+
+# states of an upload in the state file
+UPLOADING = 'uploading'
+DONE = 'done'
+CLAIMED = 'claimed'
+
+
+def upload_key(local_path, remote_dir):
+    return local_path + ' -> ' + remote_dir
+
+
+class Prefetcher(StateFile):
+    """Uploads done ahead of time for the remote tasks of a run. A disabled prefetcher never uploads ahead of time."""
+
+    def begin(self, local_path, remote_dir):
+        """Mark an upload as started. Returns False if it was already started or claimed."""
+        with self.locked() as state:
+            key = upload_key(local_path, remote_dir)
+            if key in state:
+                return False
+            state[key] = UPLOADING
+            return True
+
+    def finish(self, local_path, remote_dir, uploaded=True):
+        """Record the end of an upload; an upload that failed is left to the worker running the task."""
+        with self.locked() as state:
+            key = upload_key(local_path, remote_dir)
+            if uploaded:
+                state[key] = DONE
+            else:
+                del state[key]
+
+    def claim(self, local_path, remote_dir):
+        """
+        Claim an upload for the worker running its task, waiting for it to complete if it is being uploaded ahead of
+        time. Returns True if the file was uploaded ahead of time, False if the worker must upload it.
+        """
+        if not self.enabled:
+            return False
+        key = upload_key(local_path, remote_dir)
+        while True:
+            with self.locked() as state:
+                if state.get(key) == DONE:
+                    return True
+                if not state.get(key) == UPLOADING:
+                    state[key] = CLAIMED
+                    return False
+            time.sleep(POLL_INTERVAL)
+
+
+current = Current(Prefetcher())
+
+def configure(work_dir):
+    """
+    Upload the inputs of remote tasks ahead of time for the run of the workflow in work_dir unless the prefetch_inputs
+    option is turned off in endofday.conf. Returns the thread uploading them, to start in the main process, or None.
+    """
+    if not Config.get_bool('eod', 'prefetch_inputs', default_value=True):
+        return None
+    current.set(Prefetcher(state_file_path(work_dir, STATE_FILE))).reset()
+    return QueueThread('upload inputs')
+
+def get_prefetcher():
+    return current.get()
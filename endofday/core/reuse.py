@@ -0,0 +1,134 @@
+# Reusing long-lived containers for processes marked reuse: true.
+#
+# Starting and removing a container can take longer than a short process itself, e.g. for the shards of a fan-out.
+# Processes marked with reuse run in a small pool of long-lived containers of their image instead, through docker exec.
+# The containers of a pool mount the whole working directory of the host at REUSE_MOUNT rather than the volumes of a
+# task: before running the command of a task, the container paths of its output directories and inputs are replaced by
+# symbolic links to their paths under REUSE_MOUNT, and the links are removed again when the command exits. Each task
+# therefore still writes its outputs to its own directory on the host. A container runs one task at a time.
+#
+# Tasks are run by the doit worker processes, so the containers of the pools are kept in a JSON state file updated under
+# a lock, and leased by a worker for the duration of a task. The containers are removed at the end of the run.
+
+from __future__ import print_function
+
+import multiprocessing
+import os
+import pipes
+
+from .config import Config
+from .limiter import pid_alive
+from .locks import Current, StateFile, state_file_path
+
+# name of the state file in the workflow directory
+STATE_FILE = '.eod_pool.json'
+
+# path of the working directory of the host in the containers of the pools
+REUSE_MOUNT = '/.eod_work'
+
+# command keeping the containers of the pools alive between tasks
+KEEP_ALIVE = 'while true; do sleep 3600; done'
+
+# exit code of an exec whose symbolic links could not be set up; the task then runs in a new container
+SETUP_FAILED = 213
+
+
+def exec_script(links):
+    """
+    Return a shell script that replaces the container paths of links, a list of (container path, target) pairs, by
+    symbolic links to the targets, runs its arguments and restores the container paths. Files of the image in place of
+    a link are moved aside rather than removed.
+    """
+    setup = []
+    cleanup = []
+    for path, target in links:
+        setup.append('if [ -e {path} ] && [ ! -L {path} ]; then mv {path} {path}.eod_image; fi && mkdir -p {parent} && '
+                     'ln -sfn {target} {path}'.format(path=pipes.quote(path), target=pipes.quote(target),
+                                                      parent=pipes.quote(os.path.dirname(path))))
+        cleanup.insert(0, 'rm -f {path}; if [ -e {path}.eod_image ]; then mv {path}.eod_image {path}; fi'.format(
+            path=pipes.quote(path)))
+    return '{{ {}; }} || exit {}; "$@"; rc=$?; {}; exit $rc'.format(' && '.join(setup) or 'true', SETUP_FAILED,
+                                                                    '; '.join(cleanup) or 'true')
+
+
+class ContainerPool(StateFile):
+    """
+    Long-lived containers, at most size of them per image, shared by the workers of a run. No container of a disabled
+    pool is ever leased.
+    """
+    def __init__(self, state_path=None, size=0):
+        super(ContainerPool, self).__init__(state_path)
+        self.size = size
+
+    def reset(self):
+        """Start with empty pools. Returns the ids of the containers left by a previous run that did not complete."""
+        container_ids = self.container_ids()
+        super(ContainerPool, self).reset()
+        return container_ids
+
+    def lease(self, image, start):
+        """
+        Lease an idle container of the pool of image to the calling worker, starting one by calling start() if the
+        pool is not full. start returns the record of the new container: a dictionary with its id. Returns the record
+        of the leased container, or None if every container of the pool is busy or the image cannot be used, i.e. a
+        container of the pool could not be started.
+        """
+        pid = os.getpid()
+        with self.locked() as state:
+            pool = state.setdefault(image, {'containers': {}, 'starting': []})
+            if pool.get('unusable'):
+                return None
+            # a container leased by a worker that died may still hold the links of its task, so it is not used again
+            for record in pool['containers'].values():
+                if record['worker'] and not pid_alive(record['worker']):
+                    record['broken'] = True
+            pool['starting'] = [worker for worker in pool['starting'] if pid_alive(worker)]
+            for record in pool['containers'].values():
+                if not record['worker'] and not record.get('broken'):
+                    record['worker'] = pid
+                    return record
+            if len(pool['containers']) + len(pool['starting']) >= self.size:
+                return None
+            pool['starting'].append(pid)
+        record = None
+        try:
+            record = start()
+        except (Exception, SystemExit) as e:
+            print("Could not start a container for the pool of {}; its tasks run in their own containers: {}"
+                  .format(image, e))
+        with self.locked() as state:
+            pool = state[image]
+            pool['starting'].remove(pid)
+            if record:
+                record['worker'] = pid
+                pool['containers'][record['id']] = record
+            else:
+                pool['unusable'] = True
+        return record
+
+    def release(self, image, container_id, broken=False):
+        """Give a leased container back to its pool; a broken container is not leased again."""
+        with self.locked() as state:
+            record = state[image]['containers'][container_id]
+            record['worker'] = 0
+            if broken:
+                record['broken'] = True
+
+    def container_ids(self):
+        """Return the ids of the containers of all the pools."""
+        return [container_id for pool in self.read().values() for container_id in pool['containers']]
+
+
+current = Current(ContainerPool())
+
+def configure(work_dir):
+    """
+    Enable the container pools for the run of the workflow in work_dir. The size of the pools is the reuse_pool_size
+    option of endofday.conf, by default the number of cores. Returns the ids of the containers left by a previous run
+    that did not complete, to remove.
+    """
+    size = Config.get_int('eod', 'reuse_pool_size', default_value=multiprocessing.cpu_count())
+    return current.set(ContainerPool(state_file_path(work_dir, STATE_FILE), size)).reset()
+
+def get_pool():
+    return current.get()
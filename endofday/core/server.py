@@ -0,0 +1,181 @@
+# Long running eod daemon executing the workflows submitted to it over a unix socket.
+#
+# Starting eod for every workflow pays for starting a container, reading the configuration, authenticating to Agave and
+# planning the workflow each time. The daemon does all of this once: it keeps the configuration, the Agave executors
+# (and their tokens) and the plans of the workflows it has already run, and runs each submission in a child process
+# forked from it, so that runs start from this warm state and cannot disturb each other. When adaptive concurrency is
+# enabled, the limiter is shared by all submissions, so the containers of concurrent workflows take slots from the same
+# pools.
+#
+# Protocol: the client sends one JSON line {"yaml_file": <host path>, "targets": [...]}. The daemon streams the output
+# of the run back and ends with a line holding EXIT_MARKER followed by the exit code of the run.
+
+from __future__ import print_function
+
+import argparse
+import errno
+import json
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+import requests
+
+from . import tasks
+from .client import EXIT_MARKER, SOCKET_FILE
+from .hosts import update_hosts
+from .limiter import configure as configure_limiter
+from .tasks import EOD_CONTAINER_BASE, create_cache_files, parse_yaml, run, to_eod
+
+
+class PlanCache(object):
+    """Parsed workflows by path and targets, reused as long as the workflow file and its work directory are unchanged."""
+
+    def __init__(self):
+        self.plans = {}
+
+    def get(self, yaml_file, targets):
+        stat = os.stat(yaml_file)
+        key = (yaml_file, tuple(targets))
+        version = (stat.st_size, stat.st_mtime)
+        cached = self.plans.get(key)
+        if cached and cached[0] == version and os.path.exists(cached[1].work_dir):
+            return cached[1]
+        task_file = parse_yaml(yaml_file, targets)
+        self.plans[key] = (version, task_file)
+        return task_file
+
+
+class EodServer(object):
+    """Daemon accepting workflow submissions on the unix socket at socket_path."""
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.plans = PlanCache()
+        # work directories of the workflows being run, by pid of the child process running them
+        self.children = {}
+        self.stopped = False
+        self.sock = None
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.socket_path)
+        self.sock.listen(16)
+        self.sock.settimeout(1)
+        print("eod daemon listening on {}".format(self.socket_path))
+        try:
+            while not self.stopped:
+                self.reap()
+                try:
+                    conn, _ = self.sock.accept()
+                except socket.timeout:
+                    continue
+                except socket.error as e:
+                    if e.errno == errno.EINTR:
+                        continue
+                    raise
+                conn.settimeout(None)
+                try:
+                    self.handle(conn)
+                finally:
+                    conn.close()
+        finally:
+            self.sock.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def stop(self):
+        self.stopped = True
+
+    def reap(self):
+        for pid in list(self.children):
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except OSError:
+                done = pid
+            if done:
+                del self.children[pid]
+
+    def handle(self, conn):
+        """Plan the submitted workflow and run it in a child process streaming its output to conn."""
+        out = conn.makefile('w', 0)
+        start = time.time()
+        try:
+            request = json.loads(conn.makefile('r').readline())
+            yaml_file = to_eod(os.path.abspath(request['yaml_file']))
+            targets = request.get('targets') or []
+            print("Submission of {} {}".format(yaml_file, ' '.join(targets)))
+            # planning output goes to the client as well
+            stdout = sys.stdout
+            sys.stdout = out
+            try:
+                task_file = self.plans.get(yaml_file, targets)
+            finally:
+                sys.stdout = stdout
+        except SystemExit as e:
+            # raised by Error
+            out.write('{}\n{}1\n'.format(e.code, EXIT_MARKER))
+            return
+        except Exception as e:
+            out.write('Invalid submission: {}\n{}1\n'.format(e, EXIT_MARKER))
+            return
+        self.reap()
+        if task_file.work_dir in self.children.values():
+            out.write('Workflow {} is already running.\n{}1\n'.format(task_file.name, EXIT_MARKER))
+            return
+        pid = os.fork()
+        if pid:
+            self.children[pid] = task_file.work_dir
+            return
+        # in the child: run the workflow with its output going to the client
+        self.sock.close()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        os.dup2(conn.fileno(), 1)
+        os.dup2(conn.fileno(), 2)
+        sys.stdout = os.fdopen(1, 'w', 0)
+        sys.stderr = os.fdopen(2, 'w', 0)
+        # concurrent runs of different workflows each keep the state of their tasks in their own work directory
+        tasks.dep_file = os.path.join(task_file.work_dir, '.doit.db')
+        try:
+            result = run(task_file, start)
+        except SystemExit as e:
+            print(e.code)
+            result = 1
+        except Exception:
+            traceback.print_exc()
+            result = 1
+        sys.stdout.write('{}{}\n'.format(EXIT_MARKER, result))
+        os._exit(result)
+
+
+def serve(socket_path=None):
+    socket_path = socket_path or os.path.join(EOD_CONTAINER_BASE, SOCKET_FILE)
+    requests.packages.urllib3.disable_warnings()
+    update_hosts()
+    create_cache_files()
+    server = EodServer(socket_path)
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+    # one limiter, in the served directory, for all submissions
+    concurrency_controller = configure_limiter(os.path.dirname(socket_path))
+    if concurrency_controller:
+        concurrency_controller.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    if concurrency_controller:
+        concurrency_controller.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run eod as a daemon executing the workflows submitted to it.')
+    parser.add_argument('--socket', type=str,
+                        help='Path of the unix socket to listen on. Defaults to {} in the staging directory.'.format(
+                            SOCKET_FILE))
+    args = parser.parse_args()
+    serve(args.socket)
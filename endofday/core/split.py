@@ -0,0 +1,151 @@
+# Splitting large inputs into chunks at record boundaries and merging the results computed on each chunk.
+#
+# Chunk boundaries are found by seeking to evenly spaced offsets and scanning forward to the next record start, so
+# building the index of offsets only reads a few lines per chunk. Chunks and merged outputs are then written with
+# copy_file_range(2), which lets the kernel copy (or, on file systems supporting it, share) the data without it
+# going through the eod process, falling back to a plain copy when the call is not available.
+
+from __future__ import print_function
+
+import ctypes
+import ctypes.util
+import errno
+import heapq
+import os
+
+# record formats an input can be split by
+FORMATS = ('lines', 'fastq', 'fasta', 'csv')
+
+# strategies for merging the outputs computed on each chunk; a mapping with an image and a command runs a container
+MERGE_STRATEGIES = ('concat', 'sort')
+
+BLOCK_SIZE = 1 << 20
+
+_libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+_copy_file_range = getattr(_libc, 'copy_file_range', None)
+if _copy_file_range:
+    _copy_file_range.argtypes = [ctypes.c_int, ctypes.POINTER(ctypes.c_int64), ctypes.c_int,
+                                 ctypes.POINTER(ctypes.c_int64), ctypes.c_size_t, ctypes.c_uint]
+    _copy_file_range.restype = ctypes.c_ssize_t
+
+
+def copy_range(src, dest, offset, length):
+    """Append length bytes of the open file src, starting at offset, to the open file dest."""
+    global _copy_file_range
+    dest.flush()
+    if _copy_file_range:
+        off_in = ctypes.c_int64(offset)
+        copied = 0
+        while length > 0:
+            copied = _copy_file_range(src.fileno(), ctypes.byref(off_in), dest.fileno(), None, length, 0)
+            if copied <= 0:
+                break
+            length -= copied
+        offset = off_in.value
+        dest.seek(0, os.SEEK_END)
+        if copied < 0:
+            err = ctypes.get_errno()
+            if not err in (errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP):
+                raise OSError(err, os.strerror(err))
+            if err == errno.ENOSYS:
+                _copy_file_range = None
+    # copy what is left through user space
+    src.seek(offset)
+    while length > 0:
+        block = src.read(min(length, BLOCK_SIZE))
+        if not block:
+            break
+        dest.write(block)
+        length -= len(block)
+    dest.flush()
+
+def is_record_start(lines, fmt):
+    """Whether the first of lines (the lines following a line break) starts a record of the given format."""
+    if not lines or not lines[0]:
+        return False
+    if fmt == 'fasta':
+        return lines[0].startswith(b'>')
+    if fmt == 'fastq':
+        # a quality line can start with '@' as well, but is then not followed by a separator line two lines down
+        return lines[0].startswith(b'@') and len(lines) > 2 and lines[2].startswith(b'+')
+    return True
+
+def next_record(f, offset, fmt, size):
+    """Return the offset of the first record of the file f starting at or after offset."""
+    if offset <= 0:
+        return 0
+    f.seek(offset - 1)
+    # skip to the start of the next line unless offset already is one
+    if not f.read(1) == b'\n':
+        f.readline()
+    while True:
+        position = f.tell()
+        if position >= size:
+            return size
+        lines = [f.readline() for _ in range(3)]
+        if is_record_start(lines, fmt):
+            return position
+        f.seek(position)
+        f.readline()
+
+def index(path, fmt, chunks):
+    """
+    Return the list of (offset, length) byte ranges of the chunks of the file at path, cut at record boundaries.
+    There are always chunks ranges; some of them are empty for files with fewer records than chunks. For the csv
+    format, the header line is excluded from the ranges.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        start = len(f.readline()) if fmt == 'csv' else 0
+        offsets = [start]
+        for k in range(1, chunks):
+            target = start + (size - start) * k // chunks
+            offsets.append(max(offsets[-1], next_record(f, target, fmt, size)))
+    offsets.append(size)
+    return [(offsets[k], offsets[k + 1] - offsets[k]) for k in range(chunks)]
+
+def split_file(path, chunk_paths, fmt='lines'):
+    """Split the file at path into one chunk per path in chunk_paths. CSV chunks all start with the header."""
+    ranges = index(path, fmt, len(chunk_paths))
+    with open(path, 'rb') as src:
+        header = src.readline() if fmt == 'csv' else b''
+        for chunk_path, (offset, length) in zip(chunk_paths, ranges):
+            if not os.path.exists(os.path.dirname(chunk_path)):
+                os.makedirs(os.path.dirname(chunk_path))
+            with open(chunk_path, 'wb') as dest:
+                dest.write(header)
+                copy_range(src, dest, offset, length)
+    print("Split {} into {} chunks at offsets: {}".format(path, len(chunk_paths),
+                                                          ', '.join(str(offset) for offset, _ in ranges)))
+
+def merge_files(paths, dest_path, strategy='concat', header=False):
+    """
+    Merge the files at paths into dest_path. concat appends them in order; sort merges files whose lines are sorted
+    into a single sorted file. With header, the first line of every file is a header that is written only once.
+    """
+    if not os.path.exists(os.path.dirname(dest_path)):
+        os.makedirs(os.path.dirname(dest_path))
+    tmp_path = dest_path + '.eod_merge'
+    with open(tmp_path, 'wb') as dest:
+        if strategy == 'concat':
+            for idx, path in enumerate(paths):
+                with open(path, 'rb') as src:
+                    skip = len(src.readline()) if header and idx > 0 else 0
+                    copy_range(src, dest, skip, os.path.getsize(path) - skip)
+        elif strategy == 'sort':
+            files = [open(path, 'rb') for path in paths]
+            try:
+                if header:
+                    headers = [f.readline() for f in files]
+                    dest.write(headers[0] if headers else b'')
+                # terminate the last line of every file so that it does not run into the next one
+                lines = [((line if line.endswith(b'\n') else line + b'\n') for line in f) for f in files]
+                for line in heapq.merge(*lines):
+                    dest.write(line)
+            finally:
+                for f in files:
+                    f.close()
+        else:
+            raise ValueError("Unknown merge strategy: {}".format(strategy))
+    os.rename(tmp_path, dest_path)
+    print("Merged {} chunk outputs into {}".format(len(paths), dest_path))
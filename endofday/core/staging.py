@@ -0,0 +1,46 @@
+# Staging the inputs of a task into a single directory of hard links, so that a task reading many inputs from the same
+# container directory gets one bind mount for the directory instead of one per input. Hard links rather than symbolic
+# links are used because the target of a symbolic link is resolved inside the container, where the host paths of the
+# inputs are not mounted.
+
+from __future__ import print_function
+
+import errno
+import os
+import shutil
+
+# directory, in the base directory of a task, holding its staged inputs while its container runs
+STAGED_INPUTS_DIR = '.eod_staged'
+
+
+def link_files(links, dest_dir):
+    """
+    Hard link the files of links, a list of (path, name) pairs, into dest_dir under the given names, replacing the
+    previous contents of dest_dir. Returns the names that were linked; directories, and files that cannot be linked
+    (e.g. because they are on another file system), are left out.
+    """
+    remove_dir(dest_dir)
+    os.makedirs(dest_dir)
+    return [name for path, name in links if link_file(path, os.path.join(dest_dir, name))]
+
+def link_file(path, dest):
+    """
+    Hard link the file path to dest, replacing the file at dest if there is one. Returns whether the file was linked:
+    directories, and files that cannot be linked, are not.
+    """
+    if os.path.isdir(path):
+        return False
+    try:
+        if not os.path.isdir(os.path.dirname(dest)):
+            os.makedirs(os.path.dirname(dest))
+        if os.path.lexists(dest) and not os.path.isdir(dest):
+            os.remove(dest)
+        os.link(path, dest)
+    except OSError as e:
+        if not e.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOENT):
+            raise
+        return False
+    return True
+
+def remove_dir(path):
+    shutil.rmtree(path, ignore_errors=True)
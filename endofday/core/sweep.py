@@ -0,0 +1,168 @@
+# Expanding a workflow over a grid of parameter values.
+#
+# The top-level sweep section of a workflow maps parameter names to lists of values, e.g.
+#     sweep:
+#         n: [1, 2, 5]
+#         method: [fast, exact]
+# and processes refer to the parameters in their descriptions as jinja2 variables: command: python fit.py -n {{ n }}.
+# Each process is copied once per combination of the values of the parameters it depends on, either directly or
+# through the outputs of the processes it reads, and the copies read the matching copies of their sources. Processes
+# that do not depend on any parameter run once and are shared by every variant, and all variants form a single
+# workflow.
+
+from __future__ import print_function
+
+import copy
+import itertools
+import re
+from collections import OrderedDict
+
+import jinja2
+from jinja2 import meta
+
+from .error import Error
+
+_env = jinja2.Environment()
+
+
+def variables(obj):
+    """Return the names of the template variables used in the strings of obj, a description or part of one."""
+    if isinstance(obj, basestring):
+        if '{{' in obj or '{%' in obj:
+            try:
+                return meta.find_undeclared_variables(_env.parse(obj))
+            except jinja2.TemplateSyntaxError:
+                # not a template, e.g. a docker format string
+                pass
+        return set()
+    if isinstance(obj, dict):
+        return set().union(*[variables(key) | variables(value) for key, value in obj.items()])
+    if isinstance(obj, list):
+        return set().union(*[variables(item) for item in obj])
+    return set()
+
+def render(obj, values):
+    """Return a copy of obj with the strings using the parameters in values rendered with them."""
+    if isinstance(obj, basestring):
+        if variables(obj) & set(values):
+            return _env.from_string(obj).render(values)
+        return obj
+    if isinstance(obj, dict):
+        return obj.__class__((render(key, values), render(value, values)) for key, value in obj.items())
+    if isinstance(obj, list):
+        return [render(item, values) for item in obj]
+    return obj
+
+def map_sources(desc, fn):
+    """
+    Return a copy of the process description desc with the task part of every input source <task>.<label> replaced
+    by fn(task). Inputs are given as a list of '<source> -> <dest>' entries, possibly with options, or, for Agave
+    apps, as lists of sources by input id.
+    """
+    def map_source(source):
+        parts = source.strip().split('.')
+        if not len(parts) == 2:
+            return source
+        return '{}.{}'.format(fn(parts[0]), parts[1])
+    def map_entry(entry):
+        if isinstance(entry, dict) and len(entry) == 1:
+            key, options = list(entry.items())[0]
+            return entry.__class__([(map_entry(key), options)])
+        if isinstance(entry, basestring) and len(entry.split('->')) == 2:
+            src, dest = entry.split('->')
+            return '{} -> {}'.format(map_source(src), dest.strip())
+        return entry
+    desc = copy.copy(desc)
+    inputs = desc.get('inputs')
+    if isinstance(inputs, list):
+        desc['inputs'] = [map_entry(entry) for entry in inputs]
+    elif isinstance(inputs, dict):
+        desc['inputs'] = inputs.__class__((inp_id, [map_source(source) for source in sources])
+                                          for inp_id, sources in inputs.items())
+    return desc
+
+def sources(desc):
+    """Return the names of the tasks (or 'inputs') whose outputs the process description desc reads."""
+    result = set()
+    def collect(task):
+        result.add(task)
+        return task
+    map_sources(desc, collect)
+    return result
+
+def variant_name(name, values):
+    """Return the name of the copy of the process name for the parameter values."""
+    return '_'.join([name] + ['{}_{}'.format(param, re.sub(r'[^A-Za-z0-9_-]', '_', str(value)))
+                              for param, value in values.items()])
+
+
+class Sweep(object):
+    """The expansion of the processes of a workflow over the parameter grid given by the sweep section sweep_desc."""
+
+    def __init__(self, sweep_desc, proc_dict):
+        if not isinstance(sweep_desc, dict) or not sweep_desc:
+            raise Error("Invalid sweep section: must map parameter names to lists of values.")
+        for param, values in sweep_desc.items():
+            if not isinstance(values, list) or not values:
+                raise Error("Invalid sweep section: parameter {} must have a non-empty list of values.".format(param))
+        self.grid = sweep_desc
+        self.proc_dict = proc_dict
+        # the parameters each process depends on, in the order of the sweep section
+        self.params = {}
+        for name in proc_dict:
+            self.process_params(name, [])
+        # the names and parameter values of the copies of each process
+        self.variants = OrderedDict()
+        for name in proc_dict:
+            params = self.params[name]
+            self.variants[name] = [(variant_name(name, values), values) for values in
+                                   (OrderedDict(zip(params, combination)) for combination in
+                                    itertools.product(*[self.grid[param] for param in params]))]
+
+    def process_params(self, name, path):
+        if name in self.params:
+            return self.params[name]
+        if name in path:
+            raise Error("Invalid workflow: processes {} depend on each other.".format(', '.join(path)))
+        desc = self.proc_dict[name]
+        used = variables(desc) & set(self.grid)
+        for source in sources(desc):
+            if source in self.proc_dict:
+                used |= set(self.process_params(source, path + [name]))
+        self.params[name] = [param for param in self.grid if param in used]
+        return self.params[name]
+
+    def variant_of(self, name, values):
+        """Return the name of the copy of the process name read by a process with the parameter values."""
+        if not name in self.params:
+            return name
+        return variant_name(name, OrderedDict((param, values[param]) for param in self.params[name]))
+
+    def processes(self):
+        """Return the expanded processes dictionary."""
+        result = OrderedDict()
+        for name, desc in self.proc_dict.items():
+            for variant, values in self.variants[name]:
+                if variant in result or (not variant == name and variant in self.proc_dict):
+                    raise Error("Sweep of process {} creates the process {} twice. Use parameter values that differ "
+                                "in letters, digits, _ or -.".format(name, variant))
+                if values:
+                    result[variant] = map_sources(render(copy.deepcopy(desc), values),
+                                                  lambda source: self.variant_of(source, values))
+                else:
+                    result[variant] = desc
+        return result
+
+    def expand_refs(self, refs):
+        """
+        Expand references to processes (<task>) or their outputs (<task>.<label>), such as global outputs or
+        targets, to the references to every copy of the process.
+        """
+        result = []
+        for ref in refs or []:
+            task, dot, label = ref.partition('.')
+            if task in self.variants:
+                result.extend(variant + dot + label for variant, _ in self.variants[task])
+            else:
+                result.append(ref)
+        return result
@@ -2,27 +2,50 @@ from __future__ import print_function
 
 import argparse
 import functools
+import json
 import multiprocessing
 import os
 import pipes
 import subprocess
 import sys
+import time
+import traceback
 
 from collections import OrderedDict
+from contextlib import contextmanager
 import requests
 import rfc3987
 import yaml
 
 from doit.task import dict_to_task
 from doit.cmd_base import TaskLoader
+from doit.dependency import DbmDB, Dependency, MD5Checker
 from doit.doit_cmd import DoitMain
+from doit.reporter import ConsoleReporter
 
 from agavepy.async import AgaveAsyncResponse
 
+from .cache import get_uri_cache
+from .callables import load as load_callable
 from .config import Config
+from .coordinator import configure as configure_coordinator, get_coordinator
 from .error import Error
 from .executors import AgaveExecutor, AgaveAppExecutor
 from .hosts import update_hosts
+from .journal import configure as configure_journal
+from .limiter import configure as configure_limiter, get_limiter, host_pressure
+from .local import SANDBOX_DIR as LOCAL_SANDBOX_DIR, make_links, remove_links, sandbox_command
+from .metrics import configure as configure_metrics, get_metrics, series_key
+from .placement import LOCAL, REMOTE, choose, configure as configure_placement, estimate, get_placement, task_keys
+from .precreate import candidates, configure as configure_precreate, get_precreator
+from .prefetch import configure as configure_prefetch
+from .reuse import KEEP_ALIVE, REUSE_MOUNT, SETUP_FAILED, configure as configure_reuse, exec_script, get_pool
+from .split import FORMATS as SPLIT_FORMATS, MERGE_STRATEGIES, merge_files, split_file
+from .staging import STAGED_INPUTS_DIR, link_file, link_files, remove_dir
+from .sweep import Sweep
+from .temp import POLICIES as TEMP_POLICIES, STATE_FILE as TEMP_STATE_FILE, TempOutputChecker, TempOutputs, \
+    plan_restores, run_predicate
+from .trace import configure as configure_tracing, get_tracer
 
 # Current working directory of the host, passed in as an environmental variable by the alias.sh
 HOST_BASE = os.environ.get('STAGING_DIR')
@@ -46,6 +69,18 @@ else:
     agpy_host_cache_path = os.path.join(HOST_BASE, '.agpy_cache')
     agpy_eod_cache_path = os.path.join(EOD_CONTAINER_BASE, '.agpy_cache')
 
+# host directory holding the URI cache shared by all workflows on this host. Defaults to a directory in the
+# current working directory; set uri_cache_dir in endofday.conf to share downloads across working directories.
+uri_cache_host_path = Config.get('eod', 'uri_cache_dir') or os.path.join(HOST_BASE, '.eod_cache')
+
+# host directory holding the state of the coordinator sharing the container slots of the host between the workflows
+# running on it; must be the same for all eod runs on the host.
+fair_share_host_path = Config.get('eod', 'fair_share_dir') or '/var/tmp/eod'
+
+# smallest number of file inputs mounted in the same container directory for the inputs to be staged into a single
+# directory that is mounted once; 0 disables staging.
+stage_inputs_min = Config.get_int('eod', 'stage_inputs_min', default_value=16)
+
 
 def to_eod(host_path):
     """Convert an absolute path on the host to an absolute path in the eod container"""
@@ -54,10 +89,29 @@ def to_eod(host_path):
     else:
         return os.path.join('/host', host_path[1:])
 
+def get_docker_binary():
+    """Return the docker binary to use for executing containers."""
+    host_docker = os.environ.get('DOCKER_BINARY')
+    if host_docker:
+        return '/host{}'.format(host_docker)
+    return 'docker'
+
+def remove_container(container_id):
+    """Remove a container that is not running."""
+    subprocess.call('{} rm {} > /dev/null'.format(get_docker_binary(), container_id), shell=True)
+
+def remove_pool_containers(container_ids):
+    """Stop and remove the long-lived containers of the pools of reused containers."""
+    for container_id in container_ids:
+        subprocess.call('{} rm -f {} > /dev/null'.format(get_docker_binary(), container_id), shell=True)
+
 def get_host_work_dir(wf_name):
     """Return the working directory in the host for a work file"""
     return os.path.join(HOST_BASE, wf_name)
 
+# executions of the tasks running on the host
+LOCAL_EXECUTIONS = ('docker', 'local', 'python', 'auto')
+
 # the directory where the eod_submit_job container will look for inputs'
 AGAVE_INPUTS_DIR = '/agave/inputs'
 
@@ -68,6 +122,26 @@ AGAVE_OUTPUTS_DIR = '/agave/outputs'
 # global tasks list to pass to the DockerLoader
 tasks = []
 
+# doit database of the state of the tasks
+dep_file = '{}/.doit.db'.format(EOD_CONTAINER_BASE)
+
+# Agave executors by class, workflow name and whether they created the working directory; see get_executor().
+executors = {}
+
+# exporter publishing the run metrics; set in main() when metrics are enabled.
+metrics_exporter = None
+
+# reference counts of the temporary outputs of the workflow; set in main() when the workflow has temporary outputs.
+temp_outputs = None
+
+# thread creating containers ahead of time; set in run() when containers are pre-created.
+precreate_thread = None
+
+# thread uploading the inputs of remote tasks ahead of time, and the names of the remote tasks that will run; set in
+# run() and by the DockerLoader when the workflow has remote tasks.
+prefetch_thread = None
+prefetch_tasks = set()
+
 verbose = False
 
 class GlobalInput(object):
@@ -142,6 +216,10 @@ class GlobalInput(object):
         """Determine whether this global input is used by a local task. Can only be run once all tasks are created."""
         self.used_locally = set_used_locally(self, tasks)
 
+    def get_uri_path(self):
+        """Returns the path in the eod container of the file containing the URI of this input."""
+        return self.eod_container_path
+
 def set_used_locally(obj, tasks):
     """Determine whether a GlobalInput or TaskOutput is used by a local task. obj should be the GlobalInput or
     TaskOutput.
@@ -153,11 +231,11 @@ def set_used_locally(obj, tasks):
     used_locally = False
     for task in tasks:
         # ignore remote tasks
-        if not task.execution == 'docker':
+        if not task.execution in LOCAL_EXECUTIONS:
             continue
         for inp in task.inputs:
             # if the src task has the same parent with the same label, we have a match
-            if isinstance(inp.real_source, cls) and inp.real_source.label == obj.label:
+            if isinstance(inp.real_source, cls) and inp.real_source is obj:
                 used_locally = True
                 break
     return used_locally
@@ -225,6 +303,10 @@ class TaskInput(object):
         # computed later, once all tasks have been created.
         self.real_source = None
 
+        # whether the real source already lives in remote storage and can be handed to a remote job as a URI
+        # instead of being uploaded from the host. Set by the TaskFile once all tasks have been created.
+        self.is_remote = False
+
     def set_real_source(self, global_inputs, tasks):
         """Resolves the src to a global input or task output."""
         self.real_source = resolve_source(self.src, global_inputs, tasks)
@@ -251,6 +333,9 @@ class AddedInput(object):
         # AddedInput, we add an eod_container_path attr here, which is needed in, for ex, set_doit_dict.
         self.eod_container_path = to_eod(self.host_path)
 
+        # added inputs are always created on the host.
+        self.is_remote = False
+
     def set_volume(self, global_inputs, tasks, simple_task):
         self.volume = Volume(self.host_path, self.container_path)
 
@@ -281,6 +366,9 @@ class TaskOutput(object):
         # the task that this output belongs to
         self.task_name = task_name
 
+        # the doit task producing this output: task_name, or the AgaveClusterTask its task was grouped into
+        self.producer = task_name
+
         # abs path on the host where this output can be found
         self.abs_host_path = self.get_abs_host_path()
 
@@ -299,6 +387,17 @@ class TaskOutput(object):
 
         self.volume = self.get_volume()
 
+        # whether this output is listed in the workflow's top-level outputs. Set by the TaskFile once all tasks are
+        # created.
+        self.is_global_output = False
+
+        # whether this output is an intermediate result to remove once all tasks consuming it have completed. Set by
+        # the TaskFile once all tasks are created.
+        self.temp = False
+
+        # whether this output is materialized on the host wherever its task runs. Set by tasks placed at run time.
+        self.keep_local = False
+
     def get_abs_host_path(self):
         """ Returns an absolute path on the host to this output file. """
         return os.path.join(HOST_BASE, self.wf_name, self.task_name, self.src[1:])
@@ -311,6 +410,18 @@ class TaskOutput(object):
         """Determine whether this output is used by a local task. Can only be run once all tasks are created."""
         self.used_locally = set_used_locally(self, tasks)
 
+    def needs_local_copy(self):
+        """Whether the file must be materialized on the host when the task producing it runs remotely: either a
+        local task consumes it, it is a global output of the workflow or its task may run on either side."""
+        return self.keep_local or getattr(self, 'used_locally', True) or self.is_global_output
+
+    def get_uri_path(self):
+        """Returns the path in the eod container of the file referencing the copy of this output in remote storage
+        once the task producing it ran remotely. Outputs downloaded to the host keep it next to their contents."""
+        if self.is_uri or not self.needs_local_copy():
+            return self.eod_container_path
+        return self.eod_container_path.rstrip('/') + '.eod_uri'
+
     def get_volume(self):
         """ Create a volume object for this task output."""
 
@@ -383,10 +494,28 @@ class BaseDockerTask(object):
         # outputs description
         self.outputs_desc = desc.get('outputs') or []
 
+        # options given for individual outputs, by label, e.g. {'temp': True}
+        self.output_options = {}
+
+        # options given for individual inputs, by container path, e.g. {'split': 8}
+        self.input_options = {}
+
+        # whether the task mostly waits on the disk; such tasks are limited by I/O pressure rather than CPU pressure
+        # when adaptive concurrency is enabled
+        self.io_heavy = bool(desc.get('io_heavy', False))
+
+        # whether inputs sharing a container directory may be staged into a single mounted directory; turn off for
+        # images with files of their own in the directory the inputs are mounted in, which the mount would hide
+        self.stage_inputs = bool(desc.get('stage_inputs', True))
+
+        # whether to run the task in a long-lived container of its image shared with other tasks instead of a
+        # container of its own
+        self.reuse = bool(desc.get('reuse', False))
+
         # whether to run locally or in the Agave cloud
-        # supported execution types are: 'docker', 'agave', and 'agave_app'
+        # supported execution types are: 'docker', 'local', 'python', 'auto', 'agave', and 'agave_app'
         self.execution = desc.get('execution', 'docker')
-        if self.execution == 'agave':
+        if self.execution in ('agave', 'auto'):
             # check to see if we are already executing on the agave cloud and if so, ignore this option:
             if RUNNING_IN_AGAVE:
                 self.execution = 'docker'
@@ -411,15 +540,27 @@ class BaseDockerTask(object):
     def parse_in_out_desc(self, desc, kind):
         """ Parses the inputs/outputs description and returns a list of pairs, (src, dest).
 
-        kind should be either 'input' or 'output'
+        kind should be either 'input' or 'output'. An input or output may also be given as a mapping from its
+        description to a dictionary of options, e.g.
+            - /data/aligned.sam -> sam:
+                temp: true
         """
         result = []
         for obj in desc:
-            if not len(obj.split('->')) == 2:
+            options = {}
+            if isinstance(obj, dict) and len(obj) == 1:
+                obj, options = list(obj.items())[0]
+                if not isinstance(options, dict):
+                    raise Error("Invalid options for {} {} in {} process: {}".format(kind, obj, self.name, options))
+            if not isinstance(obj, basestring) or not len(obj.split('->')) == 2:
                 raise Error("Invalid {} format in {} process: {} ".format(kind, self.name, obj) +
                             " Format should be: <source> -> <destination>")
             src, dest = obj.split('->')
             result.append((src.strip(), dest.strip()))
+            if options and kind == 'output':
+                self.output_options[dest.strip()] = options
+            elif options:
+                self.input_options[dest.strip()] = options
         return result
 
     def set_output_volume_mounts(self):
@@ -448,16 +589,13 @@ class BaseDockerTask(object):
                 result.append(volume)
         self.output_volume_mounts = result
 
-    def get_docker_command(self, envs=None):
+    def get_docker_command(self, envs=None, subcommand='run --rm', input_volumes=None):
         """
-        Returns a docker run command for executing the task image.
+        Returns a docker run command for executing the task image. Pass subcommand='create' to get a command
+        creating the container without starting it, and input_volumes to mount other volumes than the volume of each
+        input, e.g. staged input directories.
         """
-        host_docker = os.environ.get('DOCKER_BINARY')
-        if host_docker:
-            docker_binary = '/host{}'.format(host_docker)
-        else:
-            docker_binary = 'docker'
-        docker_cmd = "{} run --rm".format(docker_binary)
+        docker_cmd = "{} {}".format(get_docker_binary(), subcommand)
         # always mount the token cache file in case it is needed:
         docker_cmd += " -v {}:/root/.agpy_cache".format(agpy_host_cache_path)
         # order important here -- need to mount output dirs first so that
@@ -466,9 +604,11 @@ class BaseDockerTask(object):
         for volume in self.output_volume_mounts:
             output_str += volume.to_str()
         docker_cmd += output_str
+        if input_volumes is None:
+            input_volumes = [inp.volume for inp in self.inputs]
         input_str = ''
-        for inp in self.inputs:
-            input_str += inp.volume.to_str()
+        for volume in input_volumes:
+            input_str += volume.to_str()
         docker_cmd += input_str
         if envs:
             for k,v in envs.items():
@@ -479,25 +619,318 @@ class BaseDockerTask(object):
         docker_cmd += ' ' + self.command
         return docker_cmd, output_str, input_str
 
+    def staged_input_groups(self):
+        """
+        Return the input volumes to stage into a single directory, as a list of (container directory, volumes)
+        pairs: the volumes mounted in the same container directory when there are at least stage_inputs_min of
+        them and the directory is not within an output directory. Output directories within a staged directory are
+        mounted over it.
+        """
+        if not self.stage_inputs or stage_inputs_min <= 0:
+            return []
+        groups = OrderedDict()
+        for volume in self.input_volumes:
+            groups.setdefault(os.path.dirname(volume.container_path.rstrip('/')), []).append(volume)
+        output_dirs = [volume.container_path.rstrip('/') for volume in self.output_volume_mounts]
+        return [(directory, volumes) for directory, volumes in groups.items()
+                if len(volumes) >= stage_inputs_min and not directory == '/'
+                and not any(directory == output_dir or directory.startswith(output_dir + '/')
+                            for output_dir in output_dirs)]
+
+    @contextmanager
+    def staged_inputs(self):
+        """
+        Stage the inputs of every group of staged_input_groups() into a directory of hard links and yield the input
+        volumes to mount: one volume per staged directory and one per input that could not be staged. The links are
+        removed when the container exits so that they do not hold on to the space of temporary outputs.
+        """
+        volumes = []
+        staged = []
+        staged_dirs = []
+        try:
+            for idx, (directory, group) in enumerate(self.staged_input_groups()):
+                staged_dir = os.path.join(self.eod_base_path, STAGED_INPUTS_DIR, str(idx))
+                staged_dirs.append(staged_dir)
+                names = dict((os.path.basename(volume.container_path.rstrip('/')), volume) for volume in group)
+                linked = link_files([(to_eod(volume.host_path), name) for name, volume in names.items()], staged_dir)
+                if linked:
+                    volumes.append(Volume(os.path.join(get_host_work_dir(self.wf_name), self.name, STAGED_INPUTS_DIR,
+                                                       str(idx)), directory))
+                    staged.extend(names[name] for name in linked)
+            volumes.extend(volume for volume in self.input_volumes if not volume in staged)
+            yield volumes
+        finally:
+            if staged_dirs:
+                remove_dir(os.path.join(self.eod_base_path, STAGED_INPUTS_DIR))
+
+    @property
+    def pool(self):
+        """The pool of the concurrency limiter this task takes a slot from while it runs."""
+        return 'io' if self.io_heavy else 'cpu'
+
     def local_action_fn(self):
         """
         Execute the docker container on the local machine.
         """
+        tracer = get_tracer()
         self.pre_action()
-        docker_cmd, _, _ = self.get_docker_command(envs=getattr(self, 'envs', None))
-        # now, execute the container
-        print("Executing docker command:{}".format(docker_cmd))
-        try:
-            subprocess.check_call(docker_cmd, shell=True)
-            self.post_action()
-        except subprocess.CalledProcessError as e:
-            raise Error("Task {} failed with exception: ".format(self.name, e))
+        with get_limiter().slot(self.pool), get_coordinator().slot():
+            if not self.start_precreated(tracer) and not self.exec_reused(tracer):
+                with self.staged_inputs() as input_volumes:
+                    if tracer.enabled:
+                        return self.traced_local_action(tracer, input_volumes)
+                    docker_cmd, _, _ = self.get_docker_command(envs=getattr(self, 'envs', None),
+                                                               input_volumes=input_volumes)
+                    # now, execute the container
+                    print("Executing docker command:{}".format(docker_cmd))
+                    metrics = get_metrics()
+                    metrics.inc('eod_running_containers')
+                    try:
+                        subprocess.check_call(docker_cmd, shell=True)
+                    except subprocess.CalledProcessError as e:
+                        raise Error("Task {} failed with exception: ".format(self.name, e))
+                    finally:
+                        metrics.inc('eod_running_containers', -1)
+        self.post_action()
         # proc = subprocess.Popen(docker_cmd, shell=True)
         # proc.wait()
         # if not proc.returncode == 0:
         #     raise Error("Task {} failed with return code {}".format(self.name,
         #                                                             proc.returncode))
 
+    def traced_local_action(self, tracer, input_volumes=None):
+        """
+        Execute the docker container on the local machine in separate pull, create, start and remove steps so
+        that each of them is recorded as a span.
+        """
+        docker_binary = get_docker_binary()
+        with tracer.span('image pull', task=self.name, image=self.image) as span:
+            span['cached'] = subprocess.call('{} inspect --type=image {} > /dev/null 2>&1'.format(
+                docker_binary, self.image), shell=True) == 0
+            if not span['cached']:
+                subprocess.check_call('{} pull {}'.format(docker_binary, self.image), shell=True)
+        docker_cmd, _, _ = self.get_docker_command(envs=getattr(self, 'envs', None), subcommand='create',
+                                                   input_volumes=input_volumes)
+        print("Executing docker command:{}".format(docker_cmd))
+        try:
+            with tracer.span('container create', task=self.name, image=self.image):
+                container_id = subprocess.check_output(docker_cmd, shell=True).strip()
+        except subprocess.CalledProcessError as e:
+            raise Error("Task {} failed with exception: {}".format(self.name, e))
+        metrics = get_metrics()
+        metrics.inc('eod_running_containers')
+        try:
+            with tracer.span('container run', task=self.name, image=self.image) as span:
+                span['exit_code'] = subprocess.call('{} start -a {}'.format(docker_binary, container_id), shell=True)
+        finally:
+            metrics.inc('eod_running_containers', -1)
+            with tracer.span('container exit', task=self.name, image=self.image):
+                subprocess.call('{} rm {} > /dev/null'.format(docker_binary, container_id), shell=True)
+        if span['exit_code']:
+            raise Error("Task {} failed with return code {}".format(self.name, span['exit_code']))
+        with tracer.span('post action', task=self.name) as span:
+            self.post_action()
+            span['bytes'] = sum(os.path.getsize(out.eod_container_path) for out in self.outputs
+                                if os.path.isfile(out.eod_container_path))
+
+    def can_precreate(self):
+        """Whether the container of this task may be created ahead of time, before its inputs are complete."""
+        return False
+
+    def precreate_plan(self, unfinished):
+        """
+        Return the input volumes to create the container of this task with while the tasks in unfinished are still
+        producing some of its inputs, and the (source, link) paths in the eod container of the links to make to those
+        inputs when the task starts, or None if the container cannot be created ahead of time. The other inputs are
+        mounted as usual.
+        """
+        volumes = []
+        links = []
+        staged_dirs = OrderedDict()
+        output_dirs = [(volume.container_path.rstrip('/'), volume.host_path) for volume in self.output_volume_mounts]
+        for inp, volume in zip(self.inputs, self.input_volumes):
+            source = inp.real_source
+            if not (isinstance(source, TaskOutput) and source.producer in unfinished):
+                volumes.append(volume)
+                continue
+            if volume.container_path.endswith('/') or source.eod_container_path.endswith('/'):
+                return None
+            directory, name = os.path.split(volume.container_path)
+            covering = [(output_dir, host_path) for output_dir, host_path in output_dirs
+                        if directory == output_dir or directory.startswith(output_dir + '/')]
+            if covering:
+                # link the input into the output directory mounted over its container directory
+                output_dir, host_path = max(covering, key=lambda pair: len(pair[0]))
+                links.append((source.eod_container_path,
+                              to_eod(host_path.rstrip('/') + volume.container_path[len(output_dir):])))
+            elif self.stage_inputs and not directory == '/':
+                idx = staged_dirs.setdefault(directory, len(staged_dirs))
+                links.append((source.eod_container_path,
+                              os.path.join(self.eod_base_path, STAGED_INPUTS_DIR, str(idx), name)))
+            else:
+                return None
+        for directory, idx in staged_dirs.items():
+            volumes.append(Volume(os.path.join(get_host_work_dir(self.wf_name), self.name, STAGED_INPUTS_DIR,
+                                               str(idx)), directory))
+        return volumes, links
+
+    def precreate_container(self, unfinished):
+        """
+        Create the container of this task ahead of time. Called in the main eod process while the tasks in
+        unfinished, which produce some of the inputs of this task, are running.
+        """
+        precreator = get_precreator()
+        plan = self.precreate_plan(unfinished)
+        if plan is None or not precreator.begin(self.name):
+            return
+        input_volumes, links = plan
+        try:
+            # the directories mounted must exist for docker not to create them, and the inputs are linked into them
+            for path in [to_eod(volume.host_path) for volume in self.output_volume_mounts] + \
+                    [os.path.dirname(link) for _, link in links]:
+                if not os.path.exists(path):
+                    os.makedirs(path)
+            docker_cmd, _, _ = self.get_docker_command(envs=getattr(self, 'envs', None), subcommand='create',
+                                                       input_volumes=input_volumes)
+            print("Creating container ahead of time:{}".format(docker_cmd))
+            container_id = subprocess.check_output(docker_cmd, shell=True).strip()
+        except Exception:
+            precreator.abandon(self.name)
+            raise
+        if not precreator.finish(self.name, {'container': container_id, 'links': links}):
+            # the task started in the meantime
+            remove_container(container_id)
+
+    def start_precreated(self, tracer):
+        """
+        Start the container created ahead of time for this task, once the inputs it lacked are linked in place, and
+        remove it when it exits. Returns False if no container was created for the task or if the inputs could not
+        be linked, in which case the task must run a new container.
+        """
+        record = get_precreator().claim(self.name)
+        if not record:
+            return False
+        linked = []
+        try:
+            for source, link in record['links']:
+                if not link_file(source, link):
+                    print("Could not link input {} of task {}; running a new container.".format(source, self.name))
+                    return False
+                linked.append(link)
+            print("Starting container created ahead of time:{}".format(record['container']))
+            metrics = get_metrics()
+            metrics.inc('eod_running_containers')
+            try:
+                with tracer.span('container run', task=self.name, image=self.image) as span:
+                    span['exit_code'] = subprocess.call('{} start -a {}'.format(get_docker_binary(),
+                                                                                record['container']), shell=True)
+            finally:
+                metrics.inc('eod_running_containers', -1)
+        finally:
+            self.remove_precreated(record['container'], linked)
+        if span['exit_code']:
+            raise Error("Task {} failed with return code {}".format(self.name, span['exit_code']))
+        return True
+
+    def remove_precreated(self, container_id, linked=()):
+        """
+        Remove a container created ahead of time along with its staged input directories and the links made into
+        its output directories, apart from those replaced by outputs of the task.
+        """
+        remove_container(container_id)
+        outputs = set(output.eod_container_path for output in self.outputs)
+        for link in linked:
+            if not link in outputs and os.path.lexists(link):
+                os.remove(link)
+        remove_dir(os.path.join(self.eod_base_path, STAGED_INPUTS_DIR))
+
+    def reuse_links(self):
+        """
+        Return the (container path, target) pairs of the symbolic links giving a container of the pool of the image
+        of this task the same view of the host as the volumes of the task, output directories first, or None if some
+        volume is not in the working directory of the host or an input is also an output.
+        """
+        links = []
+        for volume in self.output_volume_mounts + self.input_volumes:
+            path = volume.container_path.rstrip('/')
+            host_path = volume.host_path.rstrip('/')
+            if not path or not (host_path == HOST_BASE or host_path.startswith(HOST_BASE + '/')):
+                return None
+            links.append((path, REUSE_MOUNT + host_path[len(HOST_BASE):]))
+        outputs = set(output.src for output in self.outputs)
+        if any(volume.container_path in outputs for volume in self.input_volumes):
+            return None
+        return links
+
+    def start_pool_container(self):
+        """Start a long-lived container of the image of this task for its pool and return its record."""
+        docker_binary = get_docker_binary()
+        docker_cmd = '{} run -d -v {}:{} -v {}:/root/.agpy_cache --entrypoint /bin/sh {} -c {}'.format(
+            docker_binary, HOST_BASE, REUSE_MOUNT, agpy_host_cache_path, self.image, pipes.quote(KEEP_ALIVE))
+        print("Starting pool container:{}".format(docker_cmd))
+        container_id = subprocess.check_output(docker_cmd, shell=True).strip()
+        try:
+            config = json.loads(subprocess.check_output('{} inspect --type=image --format "{{{{json .Config}}}}" {}'
+                                                        .format(docker_binary, self.image), shell=True) or 'null')
+        except (subprocess.CalledProcessError, ValueError):
+            subprocess.call('{} rm -f {} > /dev/null'.format(docker_binary, container_id), shell=True)
+            raise
+        config = config or {}
+        return {'id': container_id, 'entrypoint': config.get('Entrypoint') or [], 'cmd': config.get('Cmd') or []}
+
+    def get_exec_command(self, container, links, envs=None):
+        """
+        Returns a docker exec command running the task in container, the record of a container of the pool of its
+        image, with its volumes replaced by the symbolic links of links.
+        """
+        docker_cmd = "{} exec".format(get_docker_binary())
+        if envs:
+            for k,v in envs.items():
+                docker_cmd += ' -e ' + '"' + str(k) + '=' + str(v) + '"'
+        docker_cmd += ' {} sh -c {} sh'.format(container['id'], pipes.quote(exec_script(links)))
+        # the command is given to the entrypoint of the image, as with docker run
+        for arg in container['entrypoint']:
+            docker_cmd += ' ' + pipes.quote(arg)
+        if self.command:
+            docker_cmd += ' ' + self.command
+        else:
+            for arg in container['cmd']:
+                docker_cmd += ' ' + pipes.quote(arg)
+        return docker_cmd
+
+    def exec_reused(self, tracer):
+        """
+        Run the task in a container of the pool of its image if the task reuses containers. Returns False if it does
+        not, or if no container of the pool is free, in which case the task must run a new container.
+        """
+        pool = get_pool()
+        if not self.reuse or not pool.enabled:
+            return False
+        links = self.reuse_links()
+        if links is None:
+            return False
+        container = pool.lease(self.image, self.start_pool_container)
+        if not container:
+            return False
+        docker_cmd = self.get_exec_command(container, links, envs=getattr(self, 'envs', None))
+        print("Executing docker command:{}".format(docker_cmd))
+        metrics = get_metrics()
+        metrics.inc('eod_running_containers')
+        try:
+            with tracer.span('container exec', task=self.name, image=self.image) as span:
+                span['exit_code'] = subprocess.call(docker_cmd, shell=True)
+        finally:
+            metrics.inc('eod_running_containers', -1)
+            # a container whose links may not have been set up or removed is not leased again
+            pool.release(self.image, container['id'], broken=span.get('exit_code') in (None, SETUP_FAILED))
+        if span['exit_code'] == SETUP_FAILED:
+            print("Could not set up container {} for task {}; running a new container.".format(container['id'],
+                                                                                              self.name))
+            return False
+        if span['exit_code']:
+            raise Error("Task {} failed with return code {}".format(self.name, span['exit_code']))
+        return True
+
     def set_action(self, executor=None):
         """
         The action for a task is the function that is actually called by
@@ -546,7 +979,7 @@ class BaseDockerTask(object):
             if os.path.isdir(inp.real_source.eod_container_path) or inp.real_source.eod_container_path.endswith('/'):
                 # we don't care about GlobalInput directories since they don't get created by a task.
                 if isinstance(inp.real_source, TaskOutput):
-                    task_deps.append(inp.real_source.task_name)
+                    task_deps.append(inp.real_source.producer)
             # ---
             # TODO - ideally we would calculate the file dependencies in a separate task, but this will be harder since
             # we have to set an actual pydoit task, not just a python callable.
@@ -566,9 +999,14 @@ class BaseDockerTask(object):
         for output in self.outputs:
             targets.append(to_eod(output.abs_host_path))
 
+        actions = [self.action]
+        # once the task completes, release the temporary outputs it reads
+        if getattr(self, 'temp_inputs', None):
+            actions.append(self.release_temp_inputs)
+
         self.doit_dict = {
             'name': self.name,
-            'actions': [self.action],
+            'actions': actions,
             'doc': self.description,
             'targets': targets,
             'file_dep': file_deps,
@@ -576,6 +1014,9 @@ class BaseDockerTask(object):
             'task_dep': task_deps,
         }
 
+    def release_temp_inputs(self):
+        self.temp_outputs.release(self.name, self.temp_inputs)
+
     def set_input_volumes(self, global_inputs, tasks):
         """ Set the input volumes for this task, once all tasks have been created."""
         result = []
@@ -591,6 +1032,9 @@ class SimpleDockerTask(BaseDockerTask):
     def __init__(self, name, desc, wf_name):
         super(SimpleDockerTask, self).__init__(name, desc, wf_name)
 
+        # user supplied description, used to detect identical tasks
+        self.desc = desc
+
         # docker image to use
         self.image = desc.get('image')
 
@@ -617,23 +1061,282 @@ class SimpleDockerTask(BaseDockerTask):
         if not type(self.name) == str:
             raise Error("Name must be a string.")
         self.name = self.name.strip()
-        if not self.image:
+        # local and python tasks run without a container
+        if not self.image and not self.execution in ('local', 'python'):
             raise Error("No image specified for task: " + self.name)
-        if not type(self.image) == str:
+        if self.image and not type(self.image) == str:
             raise Error("Image must be a string.")
-        self.image = self.image.strip()
-        if self.execution == 'agave' or self.execution == 'docker':
+        if self.image:
+            self.image = self.image.strip()
+        if self.execution in ('agave', 'docker', 'local', 'python', 'auto'):
             pass
         else:
             raise Error("Invalid execution specified for task:{}. " +
-                        "Valid options are: docker, agave.".format(self.name))
+                        "Valid options are: docker, local, python, auto, agave.".format(self.name))
         if self.command:
             self.command = self.command.strip()
 
+    def signature(self):
+        """
+        Return a value identifying what this task computes: its description apart from the free text description and
+        the input and output labels, the resolved sources of its inputs and the container paths of its outputs. Two
+        tasks with the same signature produce the same outputs. Can only be called once input sources are resolved.
+        """
+        desc = dict((key, value) for key, value in self.desc.items() if not key in ('description', 'inputs', 'outputs'))
+        desc['image'], desc['command'], desc['execution'] = self.image, self.command, self.execution
+        inputs = sorted((id(inp.real_source), inp.dest) for inp in self.inputs)
+        outputs = sorted(out.src for out in self.outputs)
+        return json.dumps(desc, sort_keys=True, default=str), tuple(inputs), tuple(outputs)
+
+    def can_precreate(self):
+        """Only containers run by the local action of the task are created ahead of time."""
+        return self.action == self.local_action_fn and not self.reuse
+
     def remote_inputs(self):
         """Return a list of TaskInput objects that are on remote servers."""
 
 
+class LocalTask(SimpleDockerTask):
+    """ Represents a task that runs its command directly in the eod container instead of a docker container.
+    """
+    def audit(self):
+        super(LocalTask, self).audit()
+        if not self.command:
+            raise Error("No command specified for local task: " + self.name)
+
+    def can_precreate(self):
+        return False
+
+    def sandbox_links(self, sandbox):
+        """
+        Return the (path, target) pairs of the symbolic links mirroring the volumes of the task below sandbox, output
+        directories first.
+        """
+        links = []
+        for volume in self.output_volume_mounts + self.input_volumes:
+            if not volume.container_path.rstrip('/'):
+                raise Error("Local task {} cannot mount a volume at /.".format(self.name))
+            links.append((sandbox + volume.container_path.rstrip('/'), to_eod(volume.host_path.rstrip('/'))))
+        return links
+
+    def local_action_fn(self):
+        """
+        Run the command in the sandbox directory of the task, with its container paths rewritten to the sandbox.
+        """
+        sandbox = os.path.join(self.eod_base_path, LOCAL_SANDBOX_DIR)
+        links = self.sandbox_links(sandbox)
+        for volume in self.output_volume_mounts:
+            if not os.path.exists(to_eod(volume.host_path)):
+                os.makedirs(to_eod(volume.host_path))
+        command = sandbox_command(self.command, [volume.container_path for volume in
+                                                 self.output_volume_mounts + self.input_volumes], sandbox)
+        with get_limiter().slot(self.pool), get_coordinator().slot():
+            remove_dir(sandbox)
+            os.makedirs(sandbox)
+            make_links(links)
+            print("Executing local command:{}".format(command))
+            try:
+                with get_tracer().span('local run', task=self.name) as span:
+                    span['exit_code'] = subprocess.call(command, shell=True, cwd=sandbox)
+            finally:
+                remove_links(links)
+                remove_dir(sandbox)
+        if span['exit_code']:
+            raise Error("Task {} failed with return code {}".format(self.name, span['exit_code']))
+        self.post_action()
+
+
+class PythonTask(SimpleDockerTask):
+    """ Represents a task that calls a Python function in the doit worker running it instead of a docker container.
+    The function is called as function(inputs, outputs, **parameters), where inputs maps the destination of each
+    input to the path of its source and outputs maps the label of each output to the path to write it to.
+    """
+    def __init__(self, name, desc, wf_name):
+        # function to call, as <module>:<function>
+        self.callable = desc.get('callable')
+
+        # keyword arguments of the function
+        self.parameters = desc.get('parameters') or {}
+
+        super(PythonTask, self).__init__(name, desc, wf_name)
+
+    def audit(self):
+        super(PythonTask, self).audit()
+        if not isinstance(self.callable, basestring):
+            raise Error("No callable specified for python task: " + self.name)
+        if not isinstance(self.parameters, dict):
+            raise Error("Invalid parameters for python task {}: must be a mapping.".format(self.name))
+        # modules next to the workflow file can be imported
+        load_callable(self.callable, [EOD_CONTAINER_BASE])
+
+    def can_precreate(self):
+        return False
+
+    def call_args(self):
+        """Return the inputs and outputs arguments of the function."""
+        inputs = OrderedDict((inp.dest, inp.real_source.eod_container_path) for inp in self.inputs)
+        outputs = OrderedDict((out.label, out.eod_container_path) for out in self.outputs)
+        return inputs, outputs
+
+    def local_action_fn(self):
+        """
+        Call the function of the task.
+        """
+        fn = load_callable(self.callable, [EOD_CONTAINER_BASE])
+        inputs, outputs = self.call_args()
+        for path in outputs.values():
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+        with get_limiter().slot(self.pool), get_coordinator().slot():
+            print("Calling {}".format(self.callable))
+            with get_tracer().span('python call', task=self.name):
+                try:
+                    fn(inputs, outputs, **self.parameters)
+                except Exception as e:
+                    traceback.print_exc()
+                    raise Error("Task {} failed with exception: {}".format(self.name, e))
+        self.post_action()
+
+
+class AutoTask(SimpleDockerTask):
+    """ Represents a task that runs its container either on the host or in the Agave cloud, whichever is expected to
+    finish first when the task starts. Its outputs are always materialized on the host.
+    """
+    def __init__(self, name, desc, wf_name):
+        super(AutoTask, self).__init__(name, desc, wf_name)
+        for out in self.outputs:
+            out.keep_local = True
+
+    def can_precreate(self):
+        return False
+
+    def set_action(self, executor=None):
+        """The action places the task, then runs the local action or the action of the Agave executor."""
+        if executor is None:
+            # within an Agave job, where auto tasks run as docker tasks
+            return super(AutoTask, self).set_action()
+        self.remote_action = executor.get_action(self)
+        self.action = self.auto_action_fn
+
+    def upload_bytes(self):
+        """Return the size of the inputs to upload if the task runs remotely."""
+        total = 0
+        for inp in self.inputs:
+            if getattr(inp, 'is_remote', False):
+                continue
+            path = inp.real_source.eod_container_path
+            if os.path.isdir(path):
+                total += sum(os.path.getsize(os.path.join(root, name))
+                             for root, _, names in os.walk(path) for name in names)
+            elif os.path.isfile(path):
+                total += os.path.getsize(path)
+        return total
+
+    def output_bytes(self):
+        return sum(os.path.getsize(out.eod_container_path) for out in self.outputs
+                   if os.path.isfile(out.eod_container_path))
+
+    def auto_action_fn(self):
+        """
+        Run the task where it is expected to finish first given the measurements of the run so far.
+        """
+        placement = get_placement()
+        keys = task_keys(self)
+        with get_tracer().span('placement', task=self.name) as span:
+            span['local'], span['remote'] = estimate(placement.read(), keys, self.upload_bytes(),
+                                                     host_pressure()['cpu'])
+            span['placement'] = choose(span['local'], span['remote'])
+        print("Running task {} {} (estimated {:.0f}s on the host, {:.0f}s in a remote job)".format(
+            self.name, 'on the host' if span['placement'] == LOCAL else 'in the Agave cloud', span['local'],
+            span['remote']))
+        if span['placement'] == REMOTE:
+            # the executor records the runtime of the job itself
+            self.remote_action()
+        else:
+            start = time.time()
+            self.local_action_fn()
+            placement.record_runtime(LOCAL, keys, time.time() - start)
+        placement.record_output_bytes(keys, self.output_bytes())
+
+
+class SplitTask(BaseDockerTask):
+    """ Represents a task that splits the input of a process into chunks, cut at record boundaries, that copies of
+    the process then run on in parallel. Runs in the eod process; no container is needed.
+    """
+    def __init__(self, name, src, chunks, fmt, wf_name):
+        self.format = fmt
+        desc = {'description': 'Split {} into {} chunks.'.format(src, chunks),
+                'inputs': ['{} -> /split/input'.format(src)],
+                'outputs': ['/split/chunk_{} -> chunk_{}'.format(idx, idx) for idx in range(chunks)]}
+        super(SplitTask, self).__init__(name, desc, wf_name)
+        self.image = None
+        self.io_heavy = True
+        for inp in self.parse_in_out_desc(self.inputs_desc, 'input'):
+            self.inputs.append(TaskInput(src=inp[0], dest=inp[1]))
+        for out in self.parse_in_out_desc(self.outputs_desc, 'output'):
+            self.outputs.append(TaskOutput(src=out[0], label=out[1], wf_name=wf_name, task_name=self.name))
+
+    def local_action_fn(self):
+        with get_limiter().slot(self.pool):
+            split_file(self.inputs[0].real_source.eod_container_path,
+                       [out.eod_container_path for out in self.outputs], self.format)
+
+
+class MergeTask(BaseDockerTask):
+    """ Represents a task combining the outputs computed on every chunk of a split input into the outputs of the
+    original process, which it replaces in the workflow. Outputs merged with the concat or sort strategy are merged in
+    the eod process; outputs with a container strategy are merged by running that container once, with the chunk
+    outputs mounted at /merge/<label>/<chunk>.
+    """
+    def __init__(self, task, chunk_names, fmt, wf_name):
+        desc = {'description': task.description,
+                'inputs': ['{}.{} -> /merge/{}/{}'.format(chunk, out.label, out.label, idx)
+                           for out in task.outputs for idx, chunk in enumerate(chunk_names)],
+                'outputs': task.outputs_desc}
+        super(MergeTask, self).__init__(task.name, desc, wf_name)
+        # csv chunks, and therefore their outputs, each start with the header line
+        self.header = fmt == 'csv'
+        self.io_heavy = True
+        for inp in self.parse_in_out_desc(self.inputs_desc, 'input'):
+            self.inputs.append(TaskInput(src=inp[0], dest=inp[1]))
+        for out in self.parse_in_out_desc(self.outputs_desc, 'output'):
+            self.outputs.append(TaskOutput(src=out[0], label=out[1], wf_name=wf_name, task_name=self.name))
+        # the merge strategy of each output, and the container merging the outputs with a container strategy
+        self.strategies = {}
+        self.image = self.command = None
+        for out in self.outputs:
+            strategy = self.output_options.get(out.label, {}).get('merge', 'concat')
+            if isinstance(strategy, dict):
+                if not strategy.get('image') or not strategy.get('command'):
+                    raise Error("Invalid merge strategy for output {} of process {}: a container strategy requires an "
+                                "image and a command.".format(out.label, self.name))
+                if self.image and not (self.image, self.command) == (strategy['image'], strategy['command']):
+                    raise Error("All outputs of process {} merged by a container must use the same image and "
+                                "command.".format(self.name))
+                self.image, self.command = strategy['image'], strategy['command']
+            elif not strategy in MERGE_STRATEGIES:
+                raise Error("Invalid merge strategy for output {} of process {}: {}. Valid strategies are: {} or a "
+                            "mapping with an image and a command.".format(out.label, self.name, strategy,
+                                                                         ', '.join(MERGE_STRATEGIES)))
+            elif out.src.endswith('/'):
+                raise Error("Directory output {} of process {} can only be merged by a container.".format(
+                    out.label, self.name))
+            self.strategies[out.label] = strategy
+
+    def local_action_fn(self):
+        with get_limiter().slot(self.pool):
+            for out in self.outputs:
+                strategy = self.strategies[out.label]
+                if isinstance(strategy, dict):
+                    continue
+                paths = [inp.real_source.eod_container_path for inp in self.inputs
+                         if inp.dest.startswith('/merge/{}/'.format(out.label))]
+                merge_files(paths, out.eod_container_path, strategy, self.header)
+        # the merge container takes its own slot
+        if self.image:
+            super(MergeTask, self).local_action_fn()
+
+
 class AgaveDownloadTask(BaseDockerTask):
     """ Represents a task that executes a docker container to download a file on a remote server."""
 
@@ -662,6 +1365,7 @@ class AgaveDownloadTask(BaseDockerTask):
                 'image': self.image,
                 }
         super(AgaveDownloadTask, self).__init__(self.name, self.desc, wf_name)
+        self.io_heavy = True
 
         # exactly one input; still go through parse_in_out_desc to keep things uniform.
         inp = self.parse_in_out_desc(self.inputs_desc, 'input')[0]
@@ -679,6 +1383,41 @@ class AgaveDownloadTask(BaseDockerTask):
         # notify obj that this is its download task
         obj.download_task = self
 
+    def get_uri(self):
+        """Read the URI to download from the file representing the remote object."""
+        with open(self.obj.eod_container_path) as f:
+            return f.readline().strip('\n')
+
+    def local_action_fn(self):
+        """
+        Copy the resource from the host URI cache when a valid copy is available; otherwise, run the download
+        container and add the result to the cache.
+        """
+        uri = self.get_uri()
+        dest = self.outputs[0].eod_container_path
+        cache = get_uri_cache(to_eod(uri_cache_host_path))
+        if cache and cache.fetch(uri, dest, self.ae.check_uri):
+            return
+        validators = None
+        if cache:
+            # the validators are taken before the download, so that they never describe a newer version than the one
+            # downloaded
+            try:
+                _, validators = self.ae.check_uri(uri)
+            except (Exception, SystemExit) as e:
+                print("Not caching {}; could not retrieve validators: {}".format(uri, e))
+        super(AgaveDownloadTask, self).local_action_fn()
+        if validators:
+            try:
+                changed, _ = self.ae.check_uri(uri, validators)
+            except (Exception, SystemExit) as e:
+                print("Not caching {}; could not retrieve validators: {}".format(uri, e))
+                return
+            if changed:
+                print("Not caching {}; it changed during the download.".format(uri))
+                return
+            cache.insert(uri, dest, validators)
+
     def pre_action(self):
         """ Get a current access token right before executing"""
         self.envs = {'access_token': self.ae.ag.token.token_info['access_token'],
@@ -787,12 +1526,66 @@ class AgaveAppTask(BaseDockerTask):
                      'api_secret': self.ae.ag.api_secret,
                      'verify': self.ae.ag.verify}
 
+def remote_file_name(source):
+    """Return the name a GlobalInput or TaskOutput has once staged into the work directory of a remote job."""
+    if isinstance(source, GlobalInput) and source.is_uri:
+        return os.path.basename(source.uri)
+    return os.path.basename(source.abs_host_path)
+
+
+class AgaveClusterTask(BaseDockerTask):
+    """ Represents a connected group of tasks with execution 'agave' that are submitted together as a single Agave
+    job running a generated sub-workflow. Inputs produced outside of the group become global inputs of the
+    sub-workflow, and only boundary outputs (outputs consumed outside of the group or declared as global outputs) are
+    exposed.
+    """
+    def __init__(self, members, tasks, wf_name):
+        # the SimpleDockerTask objects executed by this group, in workflow order
+        self.members = members
+
+        member_names = [member.name for member in members]
+        name = 'agave_group_{}'.format(members[0].name)
+        desc = {'execution': 'agave',
+                'description': 'Agave job executing: {}'.format(', '.join(member_names))}
+        super(AgaveClusterTask, self).__init__(name, desc, wf_name)
+
+        # the group is not itself a container execution
+        self.image = None
+        self.command = None
+
+        # inputs coming from outside the group, one per distinct source
+        for member in members:
+            for inp in member.inputs:
+                if getattr(inp.real_source, 'task_name', None) in member_names:
+                    continue
+                if any(inp.real_source is existing.real_source for existing in self.inputs):
+                    continue
+                self.inputs.append(inp)
+
+        # names of the inputs once staged into the remote job directory
+        self.input_names = [remote_file_name(inp.real_source) for inp in self.inputs]
+
+        # boundary outputs
+        external_sources = set()
+        for task in tasks:
+            if task.name in member_names:
+                continue
+            for inp in task.inputs:
+                external_sources.add(id(inp.real_source))
+        for member in members:
+            for out in member.outputs:
+                if out.is_global_output or id(out) in external_sources:
+                    self.outputs.append(out)
+
+
 class TaskFile(object):
     """
     Utility class for working with a yaml file that represents a docker
     workflow.
     """
-    def __init__(self, yaml_file):
+    def __init__(self, yaml_file, targets=None):
+        # outputs (<task>.<label>) or processes to produce; defaults to the global outputs.
+        self.targets = targets or []
         if yaml_file[0] == '/':
             self.path = yaml_file
         else:
@@ -800,8 +1593,12 @@ class TaskFile(object):
         self.basic_audits()
         self.get_top_level_objects()
         self.top_level_audits()
+        if self.sweep_desc:
+            self.expand_sweep()
         self.work_dir = os.path.join(EOD_CONTAINER_BASE, self.name)
         self.tasks = []
+        # names of the processes not needed for the targets
+        self.pruned = set()
 
     def basic_audits(self):
         """
@@ -821,10 +1618,29 @@ class TaskFile(object):
             self.glob_ins = src.get('inputs')
             # the global outputs list:
             self.glob_outs = src.get('outputs')
+            # the policy for temporary outputs:
+            self.temp_desc = src.get('temp_outputs')
+            # the share of the container slots of the host this workflow gets relative to other workflows:
+            self.weight = src.get('weight', 1)
+            # the grid of parameter values to run the processes with:
+            self.sweep_desc = src.get('sweep')
 
     def top_level_audits(self):
         if not self.name:
             raise Error("Invalid yaml syntax: global name required.")
+        if isinstance(self.weight, bool) or not isinstance(self.weight, (int, float)) or self.weight <= 0:
+            raise Error("Invalid yaml syntax: weight must be a positive number, got {}.".format(self.weight))
+
+    def expand_sweep(self):
+        """
+        Replace the processes depending on the parameters of the sweep section by one copy per combination of their
+        values, and the references to them in the global outputs and the targets by references to every copy.
+        """
+        sweep = Sweep(self.sweep_desc, self.proc_dict)
+        self.proc_dict = sweep.processes()
+        self.glob_outs = sweep.expand_refs(self.glob_outs)
+        self.targets = sweep.expand_refs(self.targets)
+        print("Expanded the sweep to {} processes.".format(len(self.proc_dict)))
 
     def create_glob_ins(self):
         """
@@ -838,6 +1654,295 @@ class TaskFile(object):
             glob = GlobalInput(label.strip(), source.strip(), self.name)
             self.global_inputs.append(glob)
 
+    def set_global_outputs(self):
+        """
+        Mark the task outputs listed in the top-level outputs section. Entries are of the form <task>.<label>.
+        """
+        for glob_out in self.glob_outs or []:
+            if not len(glob_out.split('.')) == 2:
+                raise Error("Invalid global output definition: " + str(glob_out) + " format is: <task>.<label>")
+            task_name, label = [part.strip() for part in glob_out.split('.')]
+            for task in self.tasks:
+                if not task.name == task_name:
+                    continue
+                for out in task.outputs:
+                    if out.label == label:
+                        out.is_global_output = True
+                        break
+                else:
+                    print("Warning: global output {} does not match any output of task {}.".format(glob_out, task_name))
+                break
+            else:
+                if not task_name in self.pruned:
+                    print("Warning: global output {} references an unknown task.".format(glob_out))
+
+    def prune_tasks(self):
+        """
+        Keep only the tasks needed to produce the targets given on the command line or, if there are none, the global
+        outputs, i.e. the backward closure of the tasks producing them. Workflows without targets or global outputs
+        keep all their tasks. Targets are either process names or outputs of the form <task>.<label>.
+        """
+        if not Config.get_bool('eod', 'prune_tasks', default_value=True):
+            return
+        targets = self.targets or [glob_out for glob_out in self.glob_outs or [] if len(glob_out.split('.')) == 2]
+        if not targets:
+            return
+        by_name = dict((task.name, task) for task in self.tasks)
+        roots = []
+        # global outputs that match no output of their task; skipped like in set_global_outputs
+        unmatched = []
+        for target in targets:
+            task_name, _, label = [part.strip() for part in target.partition('.')]
+            task = by_name.get(task_name)
+            if not task:
+                if self.targets:
+                    raise Error("Unknown target: {}. Targets are processes or outputs of the form <task>.<label>."
+                                .format(target))
+                continue
+            if label and not label in [out.label for out in task.outputs]:
+                if self.targets:
+                    raise Error("Unknown target: {}. Task {} has no output {}.".format(target, task_name, label))
+                unmatched.append((target, task_name))
+                continue
+            roots.append(task_name)
+        if not roots:
+            return
+        needed = set()
+        while roots:
+            name = roots.pop()
+            if name in needed:
+                continue
+            needed.add(name)
+            roots.extend(getattr(inp.real_source, 'task_name', None) for inp in by_name[name].inputs
+                         if getattr(inp.real_source, 'task_name', None) in by_name)
+        self.pruned = set(by_name) - needed
+        # set_global_outputs warns about those of the tasks that are kept
+        for glob_out, task_name in unmatched:
+            if task_name in self.pruned:
+                print("Warning: global output {} does not match any output of task {}.".format(glob_out, task_name))
+        if self.pruned:
+            print("Skipping processes not needed for {}: {}".format(', '.join(targets), ', '.join(sorted(self.pruned))))
+            self.tasks = [task for task in self.tasks if task.name in needed]
+
+    def split_task(self, task):
+        """
+        Return the tasks replacing a process with a split input: a SplitTask cutting the input into chunks, one copy
+        of the process per chunk and a MergeTask combining the outputs of the copies. The split option is either the
+        number of chunks or a dictionary with the keys chunks and format (one of lines, fastq, fasta and csv).
+        """
+        splits = [inp for inp in task.inputs if 'split' in task.input_options.get(inp.dest, {})]
+        if len(splits) > 1:
+            raise Error("Only one input of process {} can be split.".format(task.name))
+        split_inp = splits[0]
+        spec = task.input_options[split_inp.dest]['split']
+        if not isinstance(spec, dict):
+            spec = {'chunks': spec}
+        chunks, fmt = spec.get('chunks'), spec.get('format', 'lines')
+        if not isinstance(chunks, int) or chunks < 1:
+            raise Error("Invalid split of input {} in process {}: chunks must be a positive number.".format(
+                split_inp.dest, task.name))
+        if not fmt in SPLIT_FORMATS:
+            raise Error("Invalid split format for input {} in process {}: {}. Valid formats are: {}".format(
+                split_inp.dest, task.name, fmt, ', '.join(SPLIT_FORMATS)))
+        split = SplitTask('{}_split'.format(task.name), split_inp.src, chunks, fmt, self.name)
+        result = [split]
+        for idx in range(chunks):
+            desc = OrderedDict(task.desc)
+            desc['description'] = '{} (chunk {} of {})'.format(task.description or task.name, idx + 1, chunks)
+            desc['inputs'] = ['{} -> {}'.format(inp.src, inp.dest) if not inp is split_inp else
+                              '{}.chunk_{} -> {}'.format(split.name, idx, inp.dest) for inp in task.inputs]
+            desc['outputs'] = ['{} -> {}'.format(out.src, out.label) for out in task.outputs]
+            result.append(task.__class__('{}_chunk_{}'.format(task.name, idx), desc, self.name))
+        result.append(MergeTask(task, [chunk.name for chunk in result[1:]], fmt, self.name))
+        print("Splitting {} of process {} into {} chunks.".format(split_inp.src, task.name, chunks))
+        return result
+
+    def merge_identical_tasks(self):
+        """
+        Run tasks with the same image, command, options and input sources only once: the duplicates are removed and
+        inputs reading their outputs read the matching outputs of the task that is kept instead. Tasks producing a
+        global output or named as a target are always kept. Repeated until no duplicates remain, since merging tasks
+        can make their consumers identical as well.
+        """
+        if not Config.get_bool('eod', 'merge_identical_tasks', default_value=True):
+            return
+        keep = set(target.partition('.')[0].strip() for target in self.targets)
+        while True:
+            canonical = {}
+            aliases = {}
+            removed = []
+            for task in self.tasks:
+                if not isinstance(task, SimpleDockerTask):
+                    continue
+                signature = task.signature()
+                if not signature in canonical:
+                    canonical[signature] = task
+                elif not task.name in keep and not any(out.is_global_output for out in task.outputs):
+                    original = canonical[signature]
+                    print("Task {} is identical to task {}; running it once.".format(task.name, original.name))
+                    by_src = dict((out.src, out) for out in original.outputs)
+                    for out in task.outputs:
+                        aliases[id(out)] = by_src[out.src]
+                    removed.append(task)
+            if not removed:
+                return
+            self.tasks = [task for task in self.tasks if not task in removed]
+            for task in self.tasks:
+                for inp in task.inputs:
+                    if id(inp.real_source) in aliases:
+                        inp.real_source = aliases[id(inp.real_source)]
+                        inp.src_task, inp.src_name = inp.real_source.task_name, inp.real_source.label
+                        inp.src = '{}.{}'.format(inp.src_task, inp.src_name)
+
+    def set_temp_outputs(self):
+        """
+        Mark the outputs to remove once all their consumers have completed: outputs with the temp option and, if the
+        workflow sets intermediates in its temp_outputs section, every output that is not a global output. The
+        temp_outputs section is either a policy name or a dictionary with the keys policy and intermediates.
+        """
+        desc = self.temp_desc or {}
+        if isinstance(desc, basestring):
+            desc = {'policy': desc}
+        self.temp_policy = desc.get('policy', 'delete')
+        if not self.temp_policy in TEMP_POLICIES:
+            raise Error("Invalid temp_outputs policy: {}. Supported policies are: {}".format(
+                self.temp_policy, ', '.join(TEMP_POLICIES)))
+        intermediates = desc.get('intermediates', False)
+        for task in self.tasks:
+            for out in task.outputs:
+                options = getattr(task, 'output_options', {}).get(out.label, {})
+                out.temp = bool(options.get('temp', intermediates))
+                if out.temp and out.is_global_output:
+                    if options.get('temp'):
+                        print("Warning: keeping temporary output {}.{} since it is a global output.".format(
+                            task.name, out.label))
+                    out.temp = False
+        # the local file of a remote output only holds its URI; the downloaded copy is the one to remove.
+        for task in self.tasks:
+            if isinstance(task, AgaveDownloadTask) and getattr(task.obj, 'temp', False):
+                task.outputs[0].temp = True
+            for out in task.outputs:
+                if out.is_uri:
+                    out.temp = False
+
+    def set_temp_inputs(self):
+        """
+        Record on each task the temporary outputs it reads so that it can release them when it completes. Must run
+        once the final list of tasks is known.
+        """
+        self.temp_outputs = None
+        self.temp_consumers = {}
+        for task in self.tasks:
+            for out in task.outputs:
+                if out.temp:
+                    self.temp_consumers.setdefault(out.eod_container_path, [])
+        if not self.temp_consumers:
+            return
+        self.temp_outputs = TempOutputs(os.path.join(self.work_dir, TEMP_STATE_FILE), self.temp_policy)
+        for task in self.tasks:
+            task.temp_inputs = sorted(set(inp.real_source.eod_container_path for inp in task.inputs
+                                          if getattr(inp.real_source, 'temp', False)))
+            task.temp_outputs = self.temp_outputs
+            for path in task.temp_inputs:
+                self.temp_consumers[path].append(task.name)
+
+    def set_remote_inputs(self):
+        """
+        Detect remote to remote edges: inputs of tasks executing in the Agave cloud whose source is either a URI
+        global input or the output of another task executing in the Agave cloud. These inputs are passed to the
+        remote job as URIs so that the data never round-trips through the host. Outputs that must be downloaded
+        anyway (see TaskOutput.needs_local_copy) are still passed as URIs to the archived copy rather than uploaded
+        again.
+        """
+        producers = dict((task.name, task) for task in self.tasks)
+        for task in self.tasks:
+            if not task.execution == 'agave':
+                continue
+            for inp in task.inputs:
+                source = inp.real_source
+                if isinstance(source, GlobalInput):
+                    inp.is_remote = source.is_uri
+                elif isinstance(source, TaskOutput):
+                    producer = producers.get(source.task_name)
+                    inp.is_remote = source.is_uri or (producer is not None and producer.execution == 'agave')
+
+    def get_consumers(self):
+        """
+        Returns a dictionary mapping the name of each task to the set of names of the tasks consuming one of its
+        outputs.
+        """
+        consumers = dict((task.name, set()) for task in self.tasks)
+        for task in self.tasks:
+            for inp in task.inputs:
+                producer = getattr(inp.real_source, 'task_name', None)
+                if producer in consumers:
+                    consumers[producer].add(task.name)
+        return consumers
+
+    def cluster_agave_tasks(self):
+        """
+        Replace each connected group of two or more tasks with execution 'agave' by a single AgaveClusterTask, so
+        that the whole group pays the job queue and staging overhead only once.
+        """
+        if not Config.get_bool('eod', 'cluster_agave_tasks', default_value=True):
+            return
+        agave_tasks = [task for task in self.tasks if isinstance(task, SimpleDockerTask) and task.execution == 'agave']
+        groups = OrderedDict((task.name, [task]) for task in agave_tasks)
+        group_of = dict((task.name, task.name) for task in agave_tasks)
+        # merge the groups of the end points of every agave -> agave edge
+        for task in agave_tasks:
+            for inp in task.inputs:
+                producer = getattr(inp.real_source, 'task_name', None)
+                if not producer in group_of or group_of[producer] == group_of[task.name]:
+                    continue
+                keep, drop = group_of[producer], group_of[task.name]
+                for member in groups.pop(drop):
+                    group_of[member.name] = keep
+                    groups[keep].append(member)
+        consumers = self.get_consumers()
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            members.sort(key=lambda member: self.tasks.index(member))
+            member_names = set(member.name for member in members)
+            # a local task both fed by and feeding the group would create a cycle.
+            if self.reaches(consumers, member_names):
+                print("Not grouping agave tasks {}: a local task depends on the group and feeds it.".format(
+                    ', '.join(sorted(member_names))))
+                continue
+            # all external inputs are staged into the same remote job directory, so their names must be unique.
+            sources = dict((id(inp.real_source), inp.real_source) for member in members for inp in member.inputs
+                           if not getattr(inp.real_source, 'task_name', None) in member_names)
+            names = [remote_file_name(source) for source in sources.values()]
+            if not len(set(names)) == len(names):
+                print("Not grouping agave tasks {}: their inputs do not have unique names.".format(
+                    ', '.join(sorted(member_names))))
+                continue
+            cluster = AgaveClusterTask(members, self.tasks, self.name)
+            # the tasks consuming outputs of the members depend on the group, the only one of them doit runs
+            for member in members:
+                for out in member.outputs:
+                    out.producer = cluster.name
+            print("Grouping agave tasks {} into a single job: {}".format(', '.join(sorted(member_names)), cluster.name))
+            position = self.tasks.index(members[0])
+            self.tasks = [task for task in self.tasks if not task.name in member_names]
+            self.tasks.insert(position, cluster)
+
+    def reaches(self, consumers, names):
+        """Whether a task outside of names is both downstream and upstream of tasks in names."""
+        pending = [consumer for name in names for consumer in consumers[name] if not consumer in names]
+        seen = set()
+        while pending:
+            current = pending.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            for consumer in consumers.get(current, ()):
+                if consumer in names:
+                    return True
+                pending.append(consumer)
+        return False
+
     def create_tasks(self):
         """
         Creates the task objects associated with the processes dictionary.
@@ -847,19 +1952,32 @@ class TaskFile(object):
             task_type = src.get('execution', 'docker')
             if task_type == 'agave_app':
                 task = AgaveAppTask(name, src, self.name)
+            elif task_type == 'local':
+                task = LocalTask(name, src, self.name)
+            elif task_type == 'python':
+                task = PythonTask(name, src, self.name)
+            elif task_type == 'auto':
+                task = AutoTask(name, src, self.name)
             else:
                 task = SimpleDockerTask(name, src, self.name)
+            if any('split' in options for options in task.input_options.values()):
+                self.tasks.extend(self.split_task(task))
+                continue
             self.tasks.append(task)
         # once tasks are created, set real_source on the task inputs
         for task in self.tasks:
             for inp in task.inputs:
                 inp.set_real_source(self.global_inputs, self.tasks)
+        # then keep only the tasks needed for the requested outputs
+        self.prune_tasks()
         # once the real_sources have been set, determine if remote GlobalInputs and TaskOutputs are used locally,
         # and create a task to download them if necessary
         for inp in self.global_inputs:
             inp.set_used_locally(self.tasks)
             if inp.is_uri and inp.used_locally:
                 self.tasks.append(AgaveDownloadTask(inp, self.name))
+        self.set_global_outputs()
+        self.merge_identical_tasks()
         for task in self.tasks:
             for out in task.outputs:
                 out.set_used_locally(self.tasks)
@@ -868,7 +1986,7 @@ class TaskFile(object):
         # with these new download tasks created, the real sources for inputs could have changed. Update them:
         for task in self.tasks:
             # only matters for local tasks that aren't download tasks
-            if not task.execution == 'docker' or isinstance(task, AgaveDownloadTask):
+            if not task.execution in LOCAL_EXECUTIONS or isinstance(task, AgaveDownloadTask):
                 continue
             for inp in task.inputs:
                 if not inp.real_source:
@@ -877,6 +1995,11 @@ class TaskFile(object):
                 if inp.real_source.is_uri:
                     inp.real_source = inp.real_source.download_task.outputs[0]
 
+        self.set_temp_outputs()
+        self.set_remote_inputs()
+        self.cluster_agave_tasks()
+        self.set_temp_inputs()
+
         # finally, once all tasks are created, we can add the output volumes to each task, create an agave executor if
         # needed, and set the action
         for task in self.tasks:
@@ -884,11 +2007,12 @@ class TaskFile(object):
             task.set_input_volumes(self.global_inputs, self.tasks)
             # agave app tasks and download tasks get an AgaveAppExecutor so they use local_action_fn
             if isinstance(task, AgaveAppTask) or isinstance(task, AgaveDownloadTask):
-                task.ae = AgaveAppExecutor(wf_name=self.name, create_home_dir=False)
+                task.ae = get_executor(AgaveAppExecutor, self.name, create_home_dir=False)
                 task.set_action(task.ae)
             # docker tasks with execution 'agave' use an AgaveExecutor with the
-            elif task.execution == 'agave':
-                task.ae = AgaveExecutor(wf_name=self.wf_name)
+            # tasks with execution 'auto' use one too, when they are placed remotely
+            elif task.execution in ('agave', 'auto'):
+                task.ae = get_executor(AgaveExecutor, self.name)
                 task.set_action(task.ae)
             # plain docker task running locally; no executor
             else:
@@ -896,6 +2020,17 @@ class TaskFile(object):
             task.set_doit_dict()
 
 
+def get_executor(cls, wf_name, create_home_dir=True):
+    """
+    Return an executor of class cls for the workflow wf_name. Executors hold an authenticated Agave client, so one is
+    created per kind of executor and workflow and shared by its tasks, and by later runs of the workflow in an eod
+    daemon.
+    """
+    key = (cls, wf_name, create_home_dir)
+    if not key in executors:
+        executors[key] = cls(wf_name=wf_name, create_home_dir=create_home_dir)
+    return executors[key]
+
 def create_cache_files():
     """ Creates the .agpy and .agpy_cache files in the eod container."""
     # Need to create the .agpy file as well since the agavepy client created by the AgaveExecutors will look for this
@@ -906,21 +2041,157 @@ def create_cache_files():
     if not os.path.exists(agpy_eod_cache_path):
         open(agpy_eod_cache_path, 'a').close()
 
-def parse_yaml(yaml_file):
-    task_file = TaskFile(yaml_file)
+def parse_yaml(yaml_file, targets=None):
+    task_file = TaskFile(yaml_file, targets)
     task_file.create_glob_ins()
     task_file.create_tasks()
     return task_file
 
 
+class TaskStateReporter(ConsoleReporter):
+    """
+    Console reporter that also keeps track of the state of every task, so that the metrics exporter can publish the
+    number of tasks by state and the number of tasks ready to run, so that the containers of the tasks about to
+    become ready can be created ahead of time, and so that the inputs of remote tasks are uploaded as soon as they
+    are available.
+    """
+    # states of the tasks whose dependents may run
+    FINISHED_STATES = ('success', 'up-to-date', 'ignored')
+
+    def __init__(self, outstream, options):
+        super(TaskStateReporter, self).__init__(outstream, options)
+        self.order = []
+        self.states = {}
+        self.producers = {}
+        # tasks whose containers are created ahead of time, by name, and the names of those already submitted
+        self.precreatable = dict((task.name, task) for task in tasks if task.can_precreate())
+        self.precreated = set()
+        # remote tasks whose inputs are uploaded ahead of time, by name, and the (name, index) of the inputs already
+        # submitted
+        self.prefetchable = dict((task.name, task) for task in tasks if task.name in prefetch_tasks)
+        self.prefetched = set()
+        if metrics_exporter:
+            metrics_exporter.collect = self.collect
+
+    def initialize(self, tasks):
+        producer_of = {}
+        for task in tasks.values():
+            for target in task.targets:
+                producer_of[target] = task.name
+        for task in tasks.values():
+            self.order.append(task.name)
+            self.states[task.name] = 'pending'
+            self.producers[task.name] = set(task.task_dep) | set(producer_of[f] for f in task.file_dep
+                                                                 if f in producer_of)
+        if prefetch_thread:
+            self.prefetch()
+
+    def set_state(self, task, state):
+        self.states[task.name] = state
+        if precreate_thread:
+            self.precreate()
+        if prefetch_thread and state in self.FINISHED_STATES:
+            self.prefetch()
+
+    def execute_task(self, task):
+        super(TaskStateReporter, self).execute_task(task)
+        self.set_state(task, 'running')
+
+    def add_failure(self, task, exception):
+        super(TaskStateReporter, self).add_failure(task, exception)
+        self.set_state(task, 'failure')
+
+    def add_success(self, task):
+        super(TaskStateReporter, self).add_success(task)
+        self.set_state(task, 'success')
+
+    def skip_uptodate(self, task):
+        super(TaskStateReporter, self).skip_uptodate(task)
+        self.set_state(task, 'up-to-date')
+
+    def skip_ignore(self, task):
+        super(TaskStateReporter, self).skip_ignore(task)
+        self.set_state(task, 'ignored')
+
+    def precreate(self):
+        """Submit the containers of the tasks about to become ready for creation, up to the configured number."""
+        ahead = get_precreator().ahead - len([name for name in self.precreated if self.states[name] == 'pending'])
+        for name in candidates(self.order, self.states, self.producers, self.FINISHED_STATES):
+            if ahead <= 0:
+                break
+            if name in self.precreated or not name in self.precreatable:
+                continue
+            self.precreated.add(name)
+            unfinished = set(producer for producer in self.producers[name]
+                             if not self.states.get(producer) in self.FINISHED_STATES)
+            precreate_thread.submit(functools.partial(self.precreatable[name].precreate_container, unfinished))
+            ahead -= 1
+
+    def prefetch(self):
+        """Submit the uploads of the inputs of the pending remote tasks that became available."""
+        for name in self.order:
+            if not name in self.prefetchable or not self.states[name] == 'pending':
+                continue
+            task = self.prefetchable[name]
+            inputs = []
+            for idx, inp in enumerate(task.inputs):
+                producer = getattr(inp.real_source, 'producer', None)
+                if (name, idx) in self.prefetched or \
+                        (producer and not self.states.get(producer) in self.FINISHED_STATES):
+                    continue
+                self.prefetched.add((name, idx))
+                inputs.append(inp)
+            if inputs:
+                prefetch_thread.submit(functools.partial(task.ae.prefetch, task, inputs))
+
+    def collect(self):
+        """Return the task metrics as a dictionary of series identifiers to values."""
+        states = dict(self.states)
+        values = {}
+        for state in states.values():
+            key = series_key('eod_tasks', {'state': state})
+            values[key] = values.get(key, 0) + 1
+        values['eod_ready_tasks'] = len([name for name, state in states.items() if state == 'pending' and
+                                         all(states.get(p) in self.FINISHED_STATES for p in self.producers[name])])
+        return values
+
+
 class DockerLoader(TaskLoader):
     @staticmethod
     def load_tasks(cmd, opt_values, pos_args):
         cpus = multiprocessing.cpu_count()
         task_list = [dict_to_task(task.doit_dict) for task in tasks]
         config = {'verbosity': 2,
-                  'dep_file': '{}/.doit.db'.format(EOD_CONTAINER_BASE)}
-        if cpus > 1:
+                  'dep_file': dep_file}
+        if metrics_exporter or precreate_thread or prefetch_thread:
+            config['reporter'] = TaskStateReporter
+        task_dict = dict((task.name, task) for task in task_list)
+        if temp_outputs:
+            # retired temporary outputs are replaced by stubs that the checker treats as the original files
+            config['check_file_uptodate'] = TempOutputChecker
+            dependency = Dependency(DbmDB, config['dep_file'], checker_cls=TempOutputChecker)
+            try:
+                forced = plan_restores(task_dict, dependency)
+            finally:
+                dependency.close()
+            for name in forced:
+                task_dict[name].uptodate.append((False, None, None))
+        if prefetch_thread:
+            # inputs are only uploaded ahead of time for the remote tasks that will run
+            dependency = Dependency(DbmDB, config['dep_file'],
+                                    checker_cls=TempOutputChecker if temp_outputs else MD5Checker)
+            try:
+                will_run = run_predicate(task_dict, dependency)
+                global prefetch_tasks
+                prefetch_tasks = set(task.name for task in tasks if task.execution == 'agave' and will_run(task.name))
+            finally:
+                dependency.close()
+        limiter = get_limiter()
+        if limiter.enabled:
+            # enough workers for the largest limit; the limiter decides how many of them run a container at a time
+            config['num_process'] = limiter.maximum
+            print("Using multiprocessing with {} processes and adaptive concurrency.".format(limiter.maximum))
+        elif cpus > 1:
             config['num_process'] = cpus
             print("Using multiprocessing with {} processes.".format(cpus))
         return task_list, config
@@ -942,15 +2213,82 @@ def ordered_load(stream, Loader=yaml.Loader, object_pairs_hook=OrderedDict):
 
 
 
-def main(yaml_file):
+def main(yaml_file, targets=None):
     create_cache_files()
+    start = time.time()
     # parse yml file and add tasks to global 'tasks' variable
-    task_file = parse_yaml(yaml_file)
+    task_file = parse_yaml(yaml_file, targets)
+    concurrency_controller = configure_limiter(task_file.work_dir)
+    if concurrency_controller:
+        concurrency_controller.start()
+    try:
+        result = run(task_file, start)
+    finally:
+        if concurrency_controller:
+            concurrency_controller.stop()
+    sys.exit(result)
+
+def run(task_file, start):
+    """
+    Execute the tasks of a parsed workflow with doit and return the doit exit code. start is the time planning the
+    workflow started, for the trace.
+    """
+    trace_path = configure_tracing(task_file.work_dir)
+    get_tracer().add('plan', start, time.time(), workflow=task_file.name, tasks=len(task_file.tasks))
+    configure_journal(task_file.work_dir)
+    heartbeat = configure_coordinator(to_eod(fair_share_host_path), task_file.name, task_file.weight)
+    if heartbeat:
+        heartbeat.start()
+    global metrics_exporter
+    metrics_exporter = configure_metrics(task_file.work_dir)
+    if metrics_exporter:
+        metrics_exporter.start()
+    global temp_outputs
+    temp_outputs = task_file.temp_outputs
+    if temp_outputs:
+        temp_outputs.reset(task_file.temp_consumers)
+    if any(task.reuse for task in task_file.tasks):
+        remove_pool_containers(configure_reuse(task_file.work_dir))
+    if any(task.execution == 'auto' for task in task_file.tasks):
+        configure_placement(task_file.work_dir)
+    global precreate_thread
+    precreate_thread = configure_precreate(task_file.work_dir)
+    if precreate_thread:
+        precreate_thread.start()
+    global prefetch_thread
+    prefetch_thread = None
+    if any(task.execution == 'agave' for task in task_file.tasks):
+        prefetch_thread = configure_prefetch(task_file.work_dir)
+    if prefetch_thread:
+        prefetch_thread.start()
     # load global tasks
     for task in task_file.tasks:
         tasks.append(task)
-    # execute the doit engine.
-    sys.exit(DoitMain(DockerLoader()).run(sys.argv[2:]))
+    try:
+        # execute the doit engine.
+        result = DoitMain(DockerLoader()).run([])
+        # temporary outputs without consumers, or whose consumers were up to date, are retired once the whole
+        # workflow completed.
+        if temp_outputs and result == 0:
+            temp_outputs.retire_all(task_file.temp_consumers.keys())
+    finally:
+        # also when doit fails or the run is interrupted
+        if precreate_thread:
+            precreate_thread.stop()
+            task_dict = dict((task.name, task) for task in task_file.tasks)
+            for name, record in get_precreator().leftovers().items():
+                task_dict[name].remove_precreated(record['container'])
+        if prefetch_thread:
+            prefetch_thread.stop()
+        if get_pool().enabled:
+            remove_pool_containers(get_pool().container_ids())
+        if heartbeat:
+            heartbeat.stop()
+        if metrics_exporter:
+            metrics_exporter.stop()
+        if trace_path:
+            get_tracer().write_trace(trace_path)
+    return result
 
 if __name__ == '__main__':
     requests.packages.urllib3.disable_warnings()
@@ -958,8 +2296,11 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Execute workflow of docker containers described in a yaml file.')
     parser.add_argument('yaml_file', type=str,
                         help='Yaml file to parse')
+    parser.add_argument('targets', type=str, nargs='*',
+                        help='Outputs (<task>.<label>) or processes to produce. Defaults to the global outputs of the '
+                             'workflow, or to all of its processes if it declares none.')
     parser.add_argument('--username', type=str,
                         help='username for running in the Agave cloud.')
     args = parser.parse_args()
-    main(args.yaml_file)
+    main(args.yaml_file, args.targets)
     main()
\ No newline at end of file
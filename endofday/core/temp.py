@@ -0,0 +1,202 @@
+# Removal of temporary (intermediate) outputs once every task consuming them has completed.
+#
+# A retired output is replaced by a small stub recording the size and md5 of the original file, and, with the
+# compress policy, the location of a gzipped copy. The doit checker below treats a stub as the original file, so
+# retiring an output neither makes its producer out of date nor changes the dependencies of its consumers. When a
+# consumer has to run again, the output is restored from the compressed copy or regenerated by running its producer
+# (see plan_restores).
+
+from __future__ import print_function
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+from doit.dependency import MD5Checker
+
+from .locks import locked_json
+
+# first line of a stub replacing a retired output
+STUB_MAGIC = '#eod retired temporary output\n'
+
+# stubs are tiny; anything larger is a regular file
+MAX_STUB_SIZE = 4096
+
+# suffix of the compressed copy of an output retired with the compress policy
+COMPRESSED_SUFFIX = '.eod.gz'
+
+# name of the file, in the workflow directory, holding the remaining consumers of each temporary output
+STATE_FILE = '.eod_temp.json'
+
+# what to do with a temporary output once its last consumer completes
+POLICIES = ('delete', 'compress', 'keep')
+
+
+def file_md5(path):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+def read_stub(path, size=None):
+    """Return the description of the original file if path is a stub of a retired output, otherwise None."""
+    try:
+        if size is None:
+            size = os.path.getsize(path)
+        if size > MAX_STUB_SIZE or not os.path.isfile(path):
+            return None
+        with open(path) as f:
+            if not f.readline() == STUB_MAGIC:
+                return None
+            return json.loads(f.read())
+    except (IOError, OSError, ValueError):
+        return None
+
+def retire(path, policy):
+    """Replace the output at path with a stub, keeping a compressed copy with the compress policy."""
+    if policy == 'keep' or not os.path.isfile(path) or read_stub(path):
+        return
+    stub = {'timestamp': os.path.getmtime(path),
+            'size': os.path.getsize(path),
+            'md5': file_md5(path)}
+    if policy == 'compress':
+        compressed = path + COMPRESSED_SUFFIX
+        with open(path, 'rb') as src, gzip.open(compressed + '.tmp', 'wb') as dest:
+            shutil.copyfileobj(src, dest)
+        os.rename(compressed + '.tmp', compressed)
+        stub['compressed'] = compressed
+    # write the stub next to the output and rename it over the output, so a file hardlinked elsewhere (e.g. in the
+    # URI cache) is left untouched.
+    with open(path + '.eod_stub', 'w') as f:
+        f.write(STUB_MAGIC)
+        json.dump(stub, f)
+    os.rename(path + '.eod_stub', path)
+    print("Retired temporary output: {}".format(path))
+
+def restore(path):
+    """Restore a retired output from its compressed copy. Returns False if it has to be regenerated instead."""
+    stub = read_stub(path)
+    if not stub:
+        return True
+    compressed = stub.get('compressed')
+    if not compressed or not os.path.exists(compressed):
+        return False
+    with gzip.open(compressed, 'rb') as src, open(path + '.eod_restore', 'wb') as dest:
+        shutil.copyfileobj(src, dest)
+    # keep the original modification time so doit sees the same file
+    os.utime(path + '.eod_restore', (stub['timestamp'], stub['timestamp']))
+    os.rename(path + '.eod_restore', path)
+    os.remove(compressed)
+    print("Restored temporary output: {}".format(path))
+    return True
+
+
+class TempOutputChecker(MD5Checker):
+    """doit file checker treating the stub of a retired output as the original file."""
+
+    def check_modified(self, file_path, file_stat, state):
+        stub = read_stub(file_path, file_stat.st_size)
+        if stub:
+            return not stub['md5'] == state[2]
+        return super(TempOutputChecker, self).check_modified(file_path, file_stat, state)
+
+    def get_state(self, dep, current_state):
+        stub = read_stub(dep)
+        if stub:
+            state = (stub['timestamp'], stub['size'], stub['md5'])
+            return None if current_state and tuple(current_state) == state else state
+        return super(TempOutputChecker, self).get_state(dep, current_state)
+
+
+class TempOutputs(object):
+    """
+    Reference counts of the temporary outputs of a run. The remaining consumers of every output are kept in a state
+    file so that the doit worker processes can share them.
+    """
+    def __init__(self, state_path, policy='delete'):
+        self.state_path = state_path
+        self.policy = policy
+
+    def reset(self, consumers):
+        """Start a run; consumers maps the path of every temporary output to the names of the tasks reading it."""
+        with locked_json(self.state_path) as state:
+            state.clear()
+            for path, names in consumers.items():
+                state[path] = sorted(set(names))
+
+    def release(self, task_name, paths):
+        """Record that task_name completed and retire the outputs in paths it was the last consumer of."""
+        done = []
+        with locked_json(self.state_path) as state:
+            for path in paths:
+                remaining = [name for name in state.get(path, []) if not name == task_name]
+                state[path] = remaining
+                if not remaining:
+                    done.append(path)
+        for path in done:
+            retire(path, self.policy)
+
+    def retire_all(self, paths):
+        """Retire every output in paths; used once the whole run completed successfully."""
+        for path in paths:
+            retire(path, self.policy)
+
+
+def run_predicate(tasks, dependency):
+    """
+    Return a function telling whether the task called name will run. tasks is the dictionary of doit tasks of the run
+    and dependency the doit Dependency object for its database. A task is considered to run if it is out of date or if
+    any task it depends on runs.
+    """
+    producer_of = {}
+    for task in tasks.values():
+        for target in task.targets:
+            producer_of[target] = task.name
+
+    def upstream(task):
+        return set(task.task_dep) | set(producer_of[dep] for dep in task.file_dep if dep in producer_of)
+
+    runs = {}
+
+    def will_run(name, visiting=()):
+        if not name in runs:
+            task = tasks[name]
+            status = dependency.get_status(task, tasks).status
+            runs[name] = status != 'up-to-date' or any(will_run(dep, visiting + (name,)) for dep in upstream(task)
+                                                       if not dep in visiting)
+        return runs[name]
+
+    return will_run
+
+def plan_restores(tasks, dependency):
+    """
+    Make retired outputs available again for the tasks that will run. tasks is the dictionary of doit tasks of the
+    run and dependency the doit Dependency object for its database. Outputs with a compressed copy are restored
+    right away; for the others, the producing task is returned so that the caller forces it to run again.
+    """
+    producer_of = {}
+    for task in tasks.values():
+        for target in task.targets:
+            producer_of[target] = task.name
+    stubs = [path for path in producer_of if read_stub(path)]
+    if not stubs:
+        return set()
+
+    will_run = run_predicate(tasks, dependency)
+    forced = set()
+    pending = [path for path in stubs if any(path in task.file_dep and will_run(task.name)
+                                             for task in tasks.values())]
+    while pending:
+        path = pending.pop()
+        if restore(path):
+            continue
+        producer = tasks[producer_of[path]]
+        if producer.name in forced:
+            continue
+        forced.add(producer.name)
+        print("Regenerating temporary output {} by running {} again.".format(path, producer.name))
+        pending.extend(dep for dep in producer.file_dep if dep in producer_of and read_stub(dep))
+    return forced
@@ -1,3 +1,26 @@
+import os
+
+import jinja2
+
+HERE = os.path.dirname(os.path.abspath((__file__)))
+
+# jinja2 environments, one per template directory, shared by every ConfigGen in the process. Templates are compiled
+# the first time they are used and kept in the environment's cache.
+_environments = {}
+
+
+def get_environment(searchpath=HERE):
+    """Return the shared jinja2 environment loading templates from searchpath."""
+    env = _environments.get(searchpath)
+    if env is None:
+        env = jinja2.Environment(loader=jinja2.FileSystemLoader(searchpath),
+                                 trim_blocks=True,
+                                 lstrip_blocks=True,
+                                 auto_reload=False)
+        _environments[searchpath] = env
+    return env
+
+
 class ConfigGen(object):
     """
     Utility class for generating a config file from a jinja template.
@@ -5,11 +28,13 @@ class ConfigGen(object):
     def __init__(self, template_str):
         self.template_str = template_str
 
-    def compile(self, configs, env):
+    def compile(self, configs, env=None):
+        if env is None:
+            env = get_environment()
         template = env.get_template(self.template_str)
         return template.render(configs)
 
-    def generate_conf(self, configs, path, env):
+    def generate_conf(self, configs, path, env=None):
         output = self.compile(configs, env)
         with open(path, 'w+') as f:
             f.write(output)
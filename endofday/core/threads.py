@@ -0,0 +1,44 @@
+# Background work of the main eod process done ahead of the tasks needing it.
+
+from __future__ import print_function
+
+import threading
+import traceback
+from Queue import Empty, Queue
+
+from .limiter import POLL_INTERVAL
+
+
+class QueueThread(threading.Thread):
+    """
+    Daemon thread of the main eod process calling the functions submitted to it, one at a time, in the order they are
+    submitted. what describes the work done by the functions in error messages, e.g. 'create a container'. A function
+    that fails is reported, and the work is then left to the worker running its task.
+    """
+    def __init__(self, what):
+        super(QueueThread, self).__init__()
+        self.daemon = True
+        self.what = what
+        self.queue = Queue()
+        self.stopped = threading.Event()
+
+    def submit(self, fn):
+        """Call fn in the thread."""
+        self.queue.put(fn)
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                fn = self.queue.get(timeout=POLL_INTERVAL)
+            except Empty:
+                continue
+            try:
+                fn()
+            # the executors report errors with Error, which exits
+            except (Exception, SystemExit):
+                print("Could not {} ahead of time:\n{}".format(self.what, traceback.format_exc()))
+
+    def stop(self):
+        """Stop once the current function returns; the functions still queued are dropped."""
+        self.stopped.set()
+        self.join()
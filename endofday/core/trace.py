@@ -0,0 +1,176 @@
+# Records timing spans for the phases of a workflow execution and exports them as a Chrome trace.
+#
+# The resulting JSON file can be loaded in chrome://tracing or https://ui.perfetto.dev to get a timeline of the
+# run with one row per task. Since doit executes tasks in separate processes, spans are first appended to an events
+# file (one JSON document per line) and merged into the trace once the run completes.
+
+from __future__ import print_function
+
+import json
+import os
+import re
+import threading
+import time
+from calendar import timegm
+from contextlib import contextmanager
+
+from .config import Config
+
+# timestamp format used by the Agave services, e.g. 2016-02-28T10:00:00.000-06:00
+TIMESTAMP_RE = re.compile(r'(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(\.\d+)?(Z|[+-]\d\d:?\d\d)?$')
+
+# spans derived from the status history of an Agave job: (span name, start status, end statuses)
+JOB_PHASES = (('remote staging', 'PENDING', ('QUEUED', 'RUNNING')),
+              ('job queue wait', 'QUEUED', ('RUNNING',)),
+              ('remote run', 'RUNNING', ('CLEANING_UP', 'ARCHIVING', 'FINISHED', 'FAILED', 'STOPPED', 'KILLED')),
+              ('remote archiving', 'ARCHIVING', ('ARCHIVING_FINISHED', 'FINISHED', 'ARCHIVING_FAILED')))
+
+
+def parse_timestamp(value):
+    """Convert an ISO 8601 timestamp returned by Agave to seconds since the epoch."""
+    match = TIMESTAMP_RE.match(value.strip())
+    if not match:
+        return None
+    year, month, day, hour, minute, second, fraction, zone = match.groups()
+    seconds = timegm((int(year), int(month), int(day), int(hour), int(minute), int(second)))
+    if fraction:
+        seconds += float(fraction)
+    if zone and not zone == 'Z':
+        sign = -1 if zone[0] == '+' else 1
+        zone = zone[1:].replace(':', '')
+        seconds += sign * (int(zone[:2]) * 3600 + int(zone[2:]) * 60)
+    return seconds
+
+def job_history_spans(history):
+    """
+    Convert the status history of an Agave job (a list of dictionaries with status and created fields, oldest
+    first) to a list of (name, start, end) spans.
+    """
+    first_seen = {}
+    order = []
+    for event in history:
+        status = event.get('status')
+        created = event.get('created')
+        if not status or not created or status in first_seen:
+            continue
+        stamp = parse_timestamp(str(created))
+        if stamp is None:
+            continue
+        first_seen[status] = stamp
+        order.append(status)
+    spans = []
+    for name, start_status, end_statuses in JOB_PHASES:
+        if not start_status in first_seen:
+            continue
+        start = first_seen[start_status]
+        ends = [first_seen[status] for status in order if status in end_statuses and first_seen[status] >= start]
+        if ends:
+            spans.append((name, start, min(ends)))
+    return spans
+
+
+class Tracer(object):
+    """
+    Collects spans for one workflow execution. A Tracer without an events_path is disabled and all its methods
+    are no-ops, so callers never need to check whether tracing is on.
+    """
+    def __init__(self, events_path=None):
+        self.events_path = events_path
+
+    @property
+    def enabled(self):
+        return bool(self.events_path)
+
+    def add(self, name, start, end, task=None, cat='eod', **args):
+        """Record a span with known start and end times (in seconds since the epoch)."""
+        if not self.enabled:
+            return
+        event = {'name': name,
+                 'cat': cat,
+                 'start': start,
+                 'end': end,
+                 'task': task,
+                 'pid': os.getpid(),
+                 'tid': threading.current_thread().ident,
+                 'args': args}
+        # a single write of a short line to a file opened in append mode is atomic, so concurrent doit processes
+        # can share the events file.
+        with open(self.events_path, 'a') as f:
+            f.write(json.dumps(event) + '\n')
+
+    @contextmanager
+    def span(self, name, task=None, cat='eod', **args):
+        """Context manager recording a span for the duration of the block. The yielded dictionary can be used to
+        add arguments (e.g. bytes moved) that are only known at the end of the block."""
+        start = time.time()
+        extra = {}
+        try:
+            yield extra
+        finally:
+            args.update(extra)
+            self.add(name, start, time.time(), task=task, cat=cat, **args)
+
+    def read_events(self):
+        events = []
+        if not self.enabled or not os.path.exists(self.events_path):
+            return events
+        with open(self.events_path) as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+        return events
+
+    def write_trace(self, path):
+        """Merge the recorded spans into a Chrome trace file at path, with one row per task."""
+        if not self.enabled:
+            return
+        events = self.read_events()
+        if not events:
+            return
+        origin = min(event['start'] for event in events)
+        rows = {}
+        trace_events = []
+        for event in sorted(events, key=lambda event: event['start']):
+            row = event.get('task') or 'engine'
+            if not row in rows:
+                rows[row] = len(rows) + 1
+                trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': rows[row],
+                                     'args': {'name': row}})
+            args = dict(event.get('args') or {})
+            args['os_pid'] = event.get('pid')
+            trace_events.append({'name': event['name'],
+                                 'cat': event.get('cat', 'eod'),
+                                 'ph': 'X',
+                                 'pid': 1,
+                                 'tid': rows[row],
+                                 'ts': int((event['start'] - origin) * 1e6),
+                                 'dur': int(max(event['end'] - event['start'], 0) * 1e6),
+                                 'args': args})
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+        os.remove(self.events_path)
+        print("Trace written to: {}".format(path))
+
+
+# the tracer for the current process; replaced by configure() when tracing is enabled.
+tracer = Tracer()
+
+
+def configure(work_dir):
+    """
+    Enable tracing for a run whose files live in work_dir if the trace option is set in endofday.conf. Returns
+    the path of the trace file to write at the end of the run, or None.
+    """
+    global tracer
+    if not Config.get_bool('eod', 'trace', default_value=False):
+        return None
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir)
+    path = os.path.join(work_dir, 'trace-{}.json'.format(time.strftime('%Y%m%d-%H%M%S')))
+    tracer = Tracer(events_path=path + '.events')
+    return path
+
+def get_tracer():
+    return tracer
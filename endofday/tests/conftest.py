@@ -0,0 +1,11 @@
+"""
+Fixtures shared by the tests.
+"""
+
+import pytest
+
+
+@pytest.fixture
+def state_path(tmpdir):
+    """Path of a state file for the StateFile objects of a run; see core.locks."""
+    return str(tmpdir.join('.eod_state.json'))
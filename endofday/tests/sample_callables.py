@@ -0,0 +1,9 @@
+"""
+Functions used by the processes of sample_python_wf.yml.
+"""
+
+def concat(inputs, outputs, sep=''):
+    with open(outputs['output'], 'w') as out:
+        for path in inputs.values():
+            with open(path) as f:
+                out.write(f.read() + sep)
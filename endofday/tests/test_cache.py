@@ -0,0 +1,82 @@
+"""
+Tests for the cache module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_cache.py
+"""
+
+import pytest
+import sys
+
+sys.path.append('/')
+
+from core.cache import UriCache
+
+URI = 'agave://ex.storage.system//data/input.txt'
+URI_2 = 'agave://ex.storage.system//data/input_2.txt'
+
+
+def unchanged(uri, validators):
+    return False, validators
+
+def changed(uri, validators):
+    return True, {'etag': 'new'}
+
+def failing(uri, validators):
+    # the executors report errors with Error, which exits
+    sys.exit(1)
+
+def write(path, contents):
+    with open(path, 'w') as f:
+        f.write(contents)
+
+@pytest.fixture
+def cache(tmpdir):
+    return UriCache(str(tmpdir.join('cache')), max_bytes=10)
+
+
+def test_miss(cache, tmpdir):
+    assert not cache.fetch(URI, str(tmpdir.join('dest')), unchanged)
+
+def test_insert_and_fetch(cache, tmpdir):
+    src = str(tmpdir.join('src'))
+    write(src, 'abc')
+    cache.insert(URI, src, {'etag': 'v1'})
+    dest = str(tmpdir.join('wf', 'dest'))
+    assert cache.fetch(URI, dest, unchanged)
+    assert open(dest).read() == 'abc'
+    # consumers get their own copy, so writing to it leaves the cached file intact
+    write(dest, 'xyz')
+    assert open(cache.data_path(URI)).read() == 'abc'
+
+def test_stale_entry_is_dropped(cache, tmpdir):
+    src = str(tmpdir.join('src'))
+    write(src, 'abc')
+    cache.insert(URI, src, {'etag': 'v1'})
+    assert not cache.fetch(URI, str(tmpdir.join('dest')), changed)
+    assert cache.lookup(URI) is None
+
+def test_failed_revalidation_is_a_miss(cache, tmpdir):
+    src = str(tmpdir.join('src'))
+    write(src, 'abc')
+    cache.insert(URI, src, {'etag': 'v1'})
+    assert not cache.fetch(URI, str(tmpdir.join('dest')), failing)
+    assert cache.lookup(URI)
+
+def test_lru_eviction(cache, tmpdir):
+    src = str(tmpdir.join('src'))
+    write(src, 'abcdef')
+    cache.insert(URI, src, {})
+    src_2 = str(tmpdir.join('src_2'))
+    write(src_2, 'ghijkl')
+    cache.insert(URI_2, src_2, {})
+    # both entries together exceed the 10 byte quota, so the least recently used is evicted.
+    assert cache.lookup(URI) is None
+    assert cache.lookup(URI_2)['size'] == 6
+
+def test_oversized_file_not_cached(cache, tmpdir):
+    src = str(tmpdir.join('src'))
+    write(src, 'a' * 11)
+    cache.insert(URI, src, {})
+    assert cache.lookup(URI) is None
@@ -0,0 +1,60 @@
+"""
+Tests for the coordinator module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_coordinator.py
+"""
+
+import sys
+import time
+
+sys.path.append('/')
+
+from core.coordinator import HEARTBEAT_TIMEOUT, HostCoordinator, fair_shares
+
+
+def coordinator(state_path, run_id, weight=1):
+    coordinator = HostCoordinator(state_path, run_id, weight, capacity=4)
+    coordinator.register()
+    return coordinator
+
+
+def test_fair_shares():
+    runs = {'sweep': {'weight': 1, 'running': [1, 2], 'waiting': []},
+            'urgent': {'weight': 3, 'running': [], 'waiting': [3]},
+            'idle': {'weight': 5, 'running': [], 'waiting': []}}
+    assert fair_shares(runs, 8) == {'sweep': 2, 'urgent': 6}
+
+def test_single_run_uses_every_slot(state_path):
+    sweep = coordinator(state_path, 'sweep')
+    assert all(sweep.try_acquire() for _ in range(4))
+    assert not sweep.try_acquire()
+    sweep.release()
+    assert sweep.try_acquire()
+
+def test_waiting_run_below_its_share_goes_first(state_path):
+    sweep = coordinator(state_path, 'sweep')
+    urgent = coordinator(state_path, 'urgent', weight=3)
+    for _ in range(4):
+        sweep.try_acquire()
+    assert not urgent.try_acquire()
+    sweep.release()
+    # the free slot goes to the urgent workflow, which is below its share, not back to the sweep
+    assert not sweep.try_acquire()
+    assert urgent.try_acquire()
+
+def test_unregistered_and_stale_runs_give_their_slots_back(state_path):
+    sweep = coordinator(state_path, 'sweep')
+    other = coordinator(state_path, 'other')
+    for _ in range(4):
+        sweep.try_acquire()
+    sweep.unregister()
+    assert other.try_acquire()
+    stale = coordinator(state_path, 'stale')
+    for _ in range(3):
+        stale.try_acquire()
+    with stale.locked() as state:
+        state['runs']['stale']['heartbeat'] = time.time() - HEARTBEAT_TIMEOUT - 1
+    assert other.try_acquire()
+    assert not 'stale' in other.read()['runs']
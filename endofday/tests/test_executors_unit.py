@@ -94,3 +94,57 @@ def test_job(ae, task_file):
     glob_inputs = job_json.get('inputs').get('glob_in')
     assert len(glob_inputs) == 1
     assert glob_inputs[0] == 'agave://' + ae.storage_system + '//home/ubuntu/jstubbs/test_suite_wf/global_inputs/input.txt'
+
+def test_job_remote_inputs(tmpdir, monkeypatch):
+    from core import tasks as tasks_module
+    from core.tasks import Config
+    # executors without an Agave client, so that parsing the workflow does not log in
+    monkeypatch.setattr(tasks_module, 'get_executor', lambda cls, wf_name, create_home_dir=True: cls.__new__(cls))
+    get_bool = Config.get_bool
+    monkeypatch.setattr(Config, 'get_bool', lambda section, option, default_value=False:
+                        False if option == 'cluster_agave_tasks' else get_bool(section, option, default_value))
+    add_5, mult_3 = parse_yaml(os.path.join(HERE, 'sample_remote_wf.yml')).tasks
+    output = add_5.outputs[0]
+    if not os.path.exists(os.path.dirname(output.get_uri_path())):
+        os.makedirs(os.path.dirname(output.get_uri_path()))
+    uri = 'agave://' + SYSTEM_ID + '//home/jstubbs/archive/jobs/add_5/data/output.txt'
+    with open(output.get_uri_path(), 'w') as f:
+        f.write(uri + '\n')
+    ae = AgaveExecutor.__new__(AgaveExecutor)
+    ae.wf_name = 'test_remote_wf'
+    ae.storage_system = SYSTEM_ID
+    ae.system_homedir = '/home/ubuntu'
+    ae.home_dir = 'jstubbs'
+    ae.email = None
+    monkeypatch.setattr(mult_3, 'eod_rel_path', 'test_remote_wf/mult_3', raising=False)
+    job_json = json.loads(ae.get_job(mult_3))
+    # the downloaded output of add_5 is staged from its archived copy rather than uploaded again
+    assert job_json.get('inputs').get('glob_in') == [uri]
+
+def test_fetch_outputs_failed_download(tmpdir, monkeypatch):
+    from core.error import Error
+
+    class Stub(object):
+        pass
+    ae = AgaveExecutor.__new__(AgaveExecutor)
+    ae.storage_system = SYSTEM_ID
+    ae.system_homedir = '/home/ubuntu'
+    ae.home_dir = 'jstubbs'
+    rsp = Stub()
+    rsp.response = {'archivePath': 'jstubbs/archive/jobs/job-1'}
+    output = Stub()
+    output.abs_host_path = output.eod_container_path = str(tmpdir.join('add_5', 'output.txt'))
+    output.task_name = 'add_5'
+    output.src = '/data/output.txt'
+    output.needs_local_copy = lambda: True
+    output.get_uri_path = lambda: output.eod_container_path + '.eod_uri'
+
+    def download_file(local_path, remote_path, task_name=None):
+        # an Error that does not exit, as fetch_outputs carries on with the other outputs
+        e = Error.__new__(Error)
+        e.msg = 'not found'
+        raise e
+    monkeypatch.setattr(ae, 'download_file', download_file)
+    ae.fetch_outputs(rsp, 'test_remote_wf', [output])
+    # no reference to an output that is not on the host either
+    assert not os.path.exists(output.get_uri_path())
@@ -0,0 +1,54 @@
+"""
+Tests for the jobs module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_jobs.py
+"""
+
+import json
+import sys
+
+sys.path.append('/')
+
+from core.jobs import app_job, eod_job, param_value
+
+SYSTEM_ID = 'endofday.local.storage.com'
+WF_PATH = 'agave://endofday.local.storage.com//home/jstubbs/algebra.yml'
+
+
+def test_eod_job():
+    job = json.loads(eod_job('test_wf', WF_PATH, ['agave://a//input.txt', 'agave://b//other.txt'], SYSTEM_ID,
+                             task_name='add_5'))
+    assert job['name'] == 'eod-test_wf-add_5'
+    assert job['appId'] == 'endofday-local-0.0.1'
+    assert job['inputs']['wf'] == [WF_PATH]
+    assert job['inputs']['glob_in'] == ['agave://a//input.txt', 'agave://b//other.txt']
+    assert job['archive'] is True
+    assert job['archiveSystem'] == SYSTEM_ID
+    assert not 'notifications' in job
+
+def test_eod_job_without_inputs():
+    job = json.loads(eod_job('test_wf', WF_PATH, [], SYSTEM_ID))
+    assert job['name'] == 'eod-test_wf-'
+    assert not 'glob_in' in job['inputs']
+
+def test_eod_job_notifications():
+    job = json.loads(eod_job('test_wf', WF_PATH, [], SYSTEM_ID, email='jdoe@example.com'))
+    assert len(job['notifications']) == 5
+    assert job['notifications'][0] == {'url': 'jdoe@example.com', 'event': 'FINISHED', 'persistent': True}
+
+def test_app_job():
+    job = json.loads(app_job('add_n', [('input_id_1', ['agave://a//input.txt'])],
+                             {'some_param_id': '1', 'verbose': 'True', 'name': 'foo'}, SYSTEM_ID))
+    assert job['name'] == 'eod---add_n'
+    assert job['appId'] == 'add_n'
+    assert job['inputs'] == {'input_id_1': ['agave://a//input.txt']}
+    assert job['parameters'] == {'some_param_id': 1, 'verbose': True, 'name': 'foo'}
+    assert job['archive'] is False
+
+def test_param_value():
+    assert param_value('3') == 3
+    assert param_value('FALSE') is False
+    assert param_value('1.5') == '1.5'
+    assert param_value(7) == 7
@@ -0,0 +1,91 @@
+"""
+Tests for the journal module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_journal.py
+"""
+
+import pytest
+import sys
+
+sys.path.append('/')
+
+from core import journal as journal_module
+from core.journal import Journal
+
+JOB = {'name': 'eod-wf-step_1', 'appId': 'eod-1.0', 'inputs': {'wf': 'agave://storage//home/wf.yml'}}
+
+
+@pytest.fixture
+def journal(state_path):
+    return Journal(state_path)
+
+@pytest.fixture
+def upload(tmpdir):
+    path = str(tmpdir.join('input.txt'))
+    with open(path, 'w') as f:
+        f.write('1 2 3\n')
+    return path
+
+
+def test_find_job(journal):
+    journal.job_submitted('step_1', JOB, 'job-1')
+    assert journal.find_job('step_1', JOB) == 'job-1'
+    assert journal.find_job('step_2', JOB) is None
+    # a different job description is never reattached
+    assert journal.find_job('step_1', dict(JOB, appId='eod-2.0')) is None
+
+def test_find_job_of_definition(journal):
+    journal.job_submitted('step_1', JOB, 'job-1', 'name: wf\n')
+    assert journal.find_job('step_1', JOB, 'name: wf\n') == 'job-1'
+    # the job references the definition by path, so a definition changed in place is only told apart by its contents
+    assert journal.find_job('step_1', JOB, 'name: wf_2\n') is None
+    assert journal.find_job('step_1', JOB) is None
+
+def test_failed_and_completed_jobs_are_forgotten(journal):
+    journal.job_submitted('step_1', JOB, 'job-1')
+    journal.job_failed('step_1')
+    assert journal.find_job('step_1', JOB) is None
+    journal.job_submitted('step_1', JOB, 'job-2')
+    journal.task_done('step_1')
+    assert journal.entry('step_1') == {}
+
+def test_uploads(journal, upload):
+    assert not journal.uploaded('step_1', upload, 'wf/step_1')
+    journal.job_submitted('step_1', JOB, 'job-1')
+    journal.upload_done('step_1', upload, 'wf/step_1')
+    assert journal.uploaded('step_1', upload, 'wf/step_1')
+    assert not journal.uploaded('step_1', upload, 'wf/step_2')
+    # the job used other inputs
+    assert journal.find_job('step_1', JOB) is None
+    with open(upload, 'a') as f:
+        f.write('4\n')
+    assert not journal.uploaded('step_1', upload, 'wf/step_1')
+
+def test_reattach_to_submitted_job(journal, monkeypatch, tmpdir):
+    from benchmarks.fake_agave import FakeAgave
+    from core.executors import AgaveExecutor
+    from core.jobs import eod_job
+
+    monkeypatch.setattr(journal_module.current, 'value', journal)
+    server = FakeAgave(job_duration=60).start()
+    try:
+        executor = AgaveExecutor('test', url=server.url, username='test', password='test', client_name='test',
+                                 client_key='test', client_secret='test', storage_system='test.storage',
+                                 home_dir='test', verify=False)
+        job = eod_job('test', 'agave://test.storage//test/wf.yml', [], 'test.storage', task_name='step_1')
+        defn = tmpdir.join('wf.yml')
+        defn.write('name: step_1\n')
+        rsp = executor.submit(job, 'step_1', defn_path=str(defn))
+        # the engine is interrupted while waiting on the job; the next run submits the same job again
+        again = executor.submit(job, 'step_1', defn_path=str(defn))
+        assert again.response.get('id') == rsp.response.get('id')
+        assert len(server.state.jobs) == 1
+        # the workflow definition changed in between
+        defn.write('name: step_1\nprocesses: {}\n')
+        new = executor.submit(job, 'step_1', defn_path=str(defn))
+        assert not new.response.get('id') == rsp.response.get('id')
+        assert len(server.state.jobs) == 2
+    finally:
+        server.stop()
@@ -0,0 +1,81 @@
+"""
+Tests for the limiter module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_limiter.py
+"""
+
+import os
+import pytest
+import sys
+
+sys.path.append('/')
+
+from core.limiter import ConcurrencyLimiter, host_pressure, read_pressure
+
+PSI = """some avg10={} avg60=1.00 avg300=0.50 total=123456
+full avg10=0.00 avg60=0.00 avg300=0.00 total=0
+"""
+
+
+@pytest.fixture
+def limiter(state_path):
+    limiter = ConcurrencyLimiter(state_path, initial=2, maximum=4)
+    limiter.reset()
+    return limiter
+
+@pytest.fixture
+def pressure_dir(tmpdir):
+    root = tmpdir.mkdir('pressure')
+    for resource, avg10 in (('cpu', '42.50'), ('io', '3.00'), ('memory', '0.00')):
+        root.join(resource).write(PSI.format(avg10))
+    return str(root)
+
+
+def test_read_pressure(pressure_dir):
+    assert read_pressure('cpu', pressure_dir) == 42.5
+    assert read_pressure('irq', pressure_dir) is None
+    assert host_pressure(pressure_dir) == {'cpu': 42.5, 'io': 3.0, 'memory': 0.0}
+
+def test_load_average_fallback(tmpdir):
+    pressure = host_pressure(str(tmpdir))
+    assert 0 <= pressure['cpu'] <= 100
+    assert pressure['io'] is None
+
+def test_slots(limiter):
+    assert limiter.try_acquire('cpu')
+    assert limiter.try_acquire('cpu')
+    assert not limiter.try_acquire('cpu')
+    # the io pool is limited separately
+    assert limiter.try_acquire('io')
+    limiter.release('cpu')
+    assert limiter.try_acquire('cpu')
+
+def test_slots_of_dead_processes_are_freed(limiter):
+    pid = os.fork()
+    if not pid:
+        os._exit(0)
+    os.waitpid(pid, 0)
+    with limiter.locked() as state:
+        state['cpu']['holders'] = [pid, pid]
+    assert limiter.try_acquire('cpu')
+    assert limiter.try_acquire('cpu')
+    assert limiter.read()['cpu']['holders'] == [os.getpid(), os.getpid()]
+
+def test_adjust(limiter):
+    limiter.try_acquire('cpu')
+    limiter.try_acquire('cpu')
+    # grows by one while saturated and without pressure, up to the maximum
+    assert limiter.adjust({'cpu': 0.0, 'io': 0.0, 'memory': 0.0}) == {'cpu': 3, 'io': 2}
+    assert limiter.adjust({'cpu': 0.0, 'io': 0.0, 'memory': 0.0}) == {'cpu': 3, 'io': 2}
+    limiter.try_acquire('cpu')
+    assert limiter.adjust({'cpu': 1.0, 'io': 1.0, 'memory': 1.0})['cpu'] == 4
+    limiter.try_acquire('cpu')
+    assert limiter.adjust({'cpu': 1.0, 'io': 1.0, 'memory': 1.0})['cpu'] == 4
+    # halves under pressure; memory pressure limits both pools
+    assert limiter.adjust({'cpu': 60.0, 'io': 0.0, 'memory': 0.0}) == {'cpu': 2, 'io': 2}
+    assert limiter.adjust({'cpu': 0.0, 'io': 0.0, 'memory': 80.0}) == {'cpu': 1, 'io': 1}
+    assert limiter.adjust({'cpu': 0.0, 'io': 0.0, 'memory': 80.0}) == {'cpu': 1, 'io': 1}
+    # unknown pressure leaves the limit unchanged
+    assert limiter.adjust({'cpu': None, 'io': None, 'memory': None}) == {'cpu': 1, 'io': 1}
@@ -0,0 +1,39 @@
+"""
+Tests for the local module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_local.py
+"""
+
+import os
+import subprocess
+import sys
+
+sys.path.append('/')
+
+from core.local import make_links, remove_links, sandbox_command
+
+
+def test_sandbox_command():
+    command = sandbox_command('cat /data/parts/0 /data/parts/1 > /data/out.txt; tool INPUT=/data/in /database/x',
+                              ['/data/', '/data/parts/0'], '/box')
+    # paths are only rewritten at word boundaries, so /database is left alone
+    assert command == 'cat /box/data/parts/0 /box/data/parts/1 > /box/data/out.txt; tool INPUT=/box/data/in /database/x'
+    assert sandbox_command('echo "/tmp"', [], '/box') == 'echo "/tmp"'
+
+def test_links(tmpdir):
+    outputs = tmpdir.mkdir('task').mkdir('data')
+    source = tmpdir.join('input.txt')
+    source.write('input\n')
+    # a mount point file left by a container is replaced
+    outputs.join('input.txt').write('')
+    sandbox = str(tmpdir.join('sandbox'))
+    links = [(sandbox + '/data', str(outputs)), (sandbox + '/data/input.txt', str(source))]
+    make_links(links)
+    subprocess.check_call(sandbox_command('cp /data/input.txt /data/output.txt', ['/data', '/data/input.txt'],
+                                          sandbox), shell=True)
+    remove_links(links)
+    assert sorted(os.listdir(str(outputs))) == ['output.txt']
+    assert outputs.join('output.txt').read() == 'input\n'
+    assert os.listdir(sandbox) == []
@@ -0,0 +1,52 @@
+"""
+Tests for the locks module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_locks.py
+"""
+
+import os
+import sys
+
+sys.path.append('/')
+
+from core.locks import Current, StateFile, locked_json, read_json, state_file_path
+
+
+def test_locked_json(state_path):
+    with locked_json(state_path) as state:
+        state['a'] = 1
+    with locked_json(state_path) as state:
+        state['b'] = 2
+    assert read_json(state_path) == {'a': 1, 'b': 2}
+
+def test_corrupt_state_file(state_path):
+    with open(state_path, 'w') as f:
+        f.write('{')
+    assert read_json(state_path, {}) == {}
+
+def test_state_file(state_path):
+    state_file = StateFile(state_path)
+    assert state_file.enabled
+    with state_file.locked() as state:
+        state['a'] = 1
+    assert state_file.read() == {'a': 1}
+    state_file.reset()
+    assert state_file.read() == {}
+
+def test_disabled_state_file():
+    state_file = StateFile()
+    assert not state_file.enabled
+    assert state_file.read() == {}
+
+def test_state_file_path(tmpdir):
+    work_dir = str(tmpdir.join('wf'))
+    assert state_file_path(work_dir, '.eod_x.json') == os.path.join(work_dir, '.eod_x.json')
+    assert os.path.isdir(work_dir)
+
+def test_current():
+    current = Current(StateFile())
+    assert not current.get().enabled
+    state_file = current.set(StateFile('/tmp/.eod_x.json'))
+    assert current.get() is state_file
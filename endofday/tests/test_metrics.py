@@ -0,0 +1,85 @@
+"""
+Tests for the metrics module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_metrics.py
+"""
+
+import pytest
+import sys
+
+sys.path.append('/')
+
+from core.metrics import Metrics, MetricsExporter, render
+
+
+@pytest.fixture
+def metrics(state_path):
+    return Metrics(state_path)
+
+
+def test_counters_and_gauges(metrics):
+    metrics.inc('eod_bytes_uploaded_total', 10)
+    metrics.inc('eod_bytes_uploaded_total', 5)
+    metrics.inc('eod_running_containers')
+    metrics.inc('eod_running_containers', -1)
+    assert metrics.values() == {'eod_bytes_uploaded_total': 15, 'eod_running_containers': 0}
+
+def test_remote_job_states(metrics):
+    metrics.move('eod_remote_jobs', None, {'state': 'QUEUED'})
+    metrics.move('eod_remote_jobs', {'state': 'QUEUED'}, {'state': 'RUNNING'})
+    values = metrics.values()
+    assert values['eod_remote_jobs{state="QUEUED"}'] == 0
+    assert values['eod_remote_jobs{state="RUNNING"}'] == 1
+
+def test_render():
+    text = render({'eod_remote_jobs{state="RUNNING"}': 2})
+    assert '# TYPE eod_remote_jobs gauge\neod_remote_jobs{state="RUNNING"} 2\n' in text
+    # metrics not updated yet are reported as zero
+    assert '# TYPE eod_bytes_downloaded_total counter\neod_bytes_downloaded_total 0\n' in text
+
+def test_exporter_writes_file(metrics, tmpdir):
+    path = str(tmpdir.join('metrics.prom'))
+    exporter = MetricsExporter(metrics, path, collect=lambda: {'eod_ready_tasks': 3})
+    metrics.inc('eod_running_containers', 2)
+    exporter.write()
+    text = open(path).read()
+    assert 'eod_ready_tasks 3\n' in text
+    assert 'eod_running_containers 2\n' in text
+
+class Stub(object):
+    pass
+
+def poll(metrics, monkeypatch, statuses, result=None):
+    """Wait for a job going through statuses, as reported by getStatus, with an AgaveExecutor stand-in."""
+    from core import executors, metrics as metrics_module
+    from core.executors import AgaveExecutor
+
+    ae = AgaveExecutor.__new__(AgaveExecutor)
+    ae.ag = Stub()
+    ae.ag.token = Stub()
+    ae.ag.token.token_info = {'access_token': 'abc'}
+    ae.ag.jobs = Stub()
+    ae.ag.jobs.getStatus = lambda jobId: {'status': statuses.pop(0)}
+    rsp = Stub()
+    rsp.url = 'https://api/jobs/v2/1'
+    rsp.response = {'id': '1'}
+    rsp.result = result
+    monkeypatch.setattr(metrics_module.current, 'value', metrics)
+    monkeypatch.setattr(executors.time, 'sleep', lambda seconds: None)
+    return ae.wait_for_job(rsp, 'add_5')
+
+def test_remote_job_polled_once(metrics, monkeypatch):
+    # rsp.result is not set: the job is not polled again once its terminal status is known
+    assert poll(metrics, monkeypatch, ['QUEUED', 'RUNNING', 'FINISHED']) == 'FINISHED'
+    values = metrics.values()
+    assert values['eod_remote_jobs{state="FINISHED"}'] == 1
+    assert values['eod_remote_jobs{state="RUNNING"}'] == 0
+
+def test_remote_job_status_unavailable(metrics, monkeypatch):
+    # getStatus fails after the first call; the gauge still follows the job to its terminal status
+    assert poll(metrics, monkeypatch, ['RUNNING'], result=lambda: 'FAILED') == 'FAILED'
+    values = metrics.values()
+    assert values['eod_remote_jobs{state="FAILED"}'] == 1
+    assert values['eod_remote_jobs{state="RUNNING"}'] == 0
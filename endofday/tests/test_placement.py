@@ -0,0 +1,48 @@
+"""
+Tests for the placement module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_placement.py
+"""
+
+import pytest
+import sys
+
+sys.path.append('/')
+
+from core.placement import DEFAULT_QUEUE_WAIT, LOCAL, REMOTE, PlacementStats, choose, estimate
+
+
+@pytest.fixture
+def stats(state_path):
+    return PlacementStats(state_path)
+
+
+def test_unmeasured_tasks_run_locally():
+    local, remote = estimate({}, ['task:add_5'], in_bytes=0)
+    assert remote == local + DEFAULT_QUEUE_WAIT
+    assert choose(local, remote) == LOCAL
+
+def test_pressure_sends_tasks_to_the_cloud(stats):
+    stats.record_runtime(LOCAL, ['task:fit', 'image:jstubbs/fit'], 60)
+    stats.record_job([('job queue wait', 0, 10), ('remote run', 10, 90)], ['task:fit', 'image:jstubbs/fit'])
+    stats.record_transfer('upload', 50e6, 1)
+    stats.record_transfer('download', 50e6, 1)
+    state = stats.read()
+    # an idle host is faster
+    local, remote = estimate(state, ['task:fit'], in_bytes=100e6)
+    assert (local, remote) == (60, 10 + 80 + 2 + 2)
+    assert choose(local, remote) == LOCAL
+    # a busy one is not; a shard never run before uses the measurements of its image
+    local, remote = estimate(state, ['task:fit_1', 'image:jstubbs/fit'], in_bytes=100e6, cpu_pressure=50)
+    assert local == 120
+    assert choose(local, remote) == REMOTE
+
+def test_moving_averages(stats):
+    stats.record_runtime(LOCAL, ['task:a'], 10)
+    stats.record_runtime(LOCAL, ['task:a'], 20)
+    assert stats.read()['runtime'][LOCAL]['task:a'] == pytest.approx(13)
+    # small transfers are ignored
+    stats.record_transfer('upload', 1000, 0.5)
+    assert not 'upload_bandwidth' in stats.read()
@@ -0,0 +1,58 @@
+"""
+Tests for the precreate module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_precreate.py
+"""
+
+import pytest
+import sys
+
+sys.path.append('/')
+
+from core.precreate import Precreator, candidates
+
+FINISHED = ('success', 'up-to-date', 'ignored')
+
+
+@pytest.fixture
+def precreator(state_path):
+    precreator = Precreator(state_path, ahead=2)
+    precreator.reset()
+    return precreator
+
+
+def test_candidates():
+    producers = {'align': set(), 'sort': set(['align']), 'index': set(['sort']), 'call': set(['sort', 'ref'])}
+    states = {'align': 'running', 'sort': 'pending', 'index': 'pending', 'ref': 'pending', 'call': 'pending'}
+    order = ['align', 'sort', 'index', 'ref', 'call']
+    assert candidates(order, states, producers, FINISHED) == ['sort']
+    states.update(align='success', sort='running', ref='up-to-date')
+    assert candidates(order, states, producers, FINISHED) == ['index', 'call']
+    # tasks with a failed producer never become ready
+    states.update(sort='failure')
+    assert candidates(order, states, producers, FINISHED) == []
+
+def test_claim_created_container(precreator):
+    assert precreator.begin('sort')
+    assert precreator.finish('sort', {'container': 'abc', 'links': []})
+    assert precreator.claim('sort') == {'container': 'abc', 'links': []}
+    # a task is only created ahead of time once
+    assert not precreator.begin('sort')
+    assert precreator.leftovers() == {}
+
+def test_task_started_before_creation_completed(precreator):
+    assert precreator.begin('sort')
+    assert precreator.claim('sort') is None
+    # the container created too late must be removed by the caller
+    assert not precreator.finish('sort', {'container': 'abc', 'links': []})
+
+def test_leftovers(precreator):
+    precreator.begin('index')
+    precreator.finish('index', {'container': 'def', 'links': []})
+    precreator.begin('call')
+    precreator.abandon('call')
+    assert precreator.leftovers() == {'index': {'container': 'def', 'links': []}}
+    assert precreator.claim('index') is None
+    assert precreator.begin('call')
@@ -0,0 +1,46 @@
+"""
+Tests for the prefetch module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_prefetch.py
+"""
+
+import pytest
+import sys
+import threading
+import time
+
+sys.path.append('/')
+
+from core.prefetch import Prefetcher
+
+
+@pytest.fixture
+def prefetcher(state_path):
+    prefetcher = Prefetcher(state_path)
+    prefetcher.reset()
+    return prefetcher
+
+
+def test_claim_uploaded_input(prefetcher):
+    assert prefetcher.begin('/staging/input.txt', 'wf/task/data')
+    prefetcher.finish('/staging/input.txt', 'wf/task/data')
+    assert prefetcher.claim('/staging/input.txt', 'wf/task/data')
+    # the same file is uploaded again for another remote directory
+    assert not prefetcher.claim('/staging/input.txt', 'wf/other/data')
+    assert not prefetcher.begin('/staging/input.txt', 'wf/other/data')
+
+def test_claim_waits_for_upload(prefetcher):
+    assert prefetcher.begin('/staging/input.txt', 'wf/task/data')
+    timer = threading.Timer(0.3, prefetcher.finish, ('/staging/input.txt', 'wf/task/data'))
+    timer.start()
+    start = time.time()
+    assert prefetcher.claim('/staging/input.txt', 'wf/task/data')
+    assert time.time() - start >= 0.3
+    timer.join()
+
+def test_failed_upload_is_left_to_the_worker(prefetcher):
+    assert prefetcher.begin('/staging/input.txt', 'wf/task/data')
+    prefetcher.finish('/staging/input.txt', 'wf/task/data', uploaded=False)
+    assert not prefetcher.claim('/staging/input.txt', 'wf/task/data')
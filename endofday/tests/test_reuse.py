@@ -0,0 +1,73 @@
+"""
+Tests for the reuse module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_reuse.py
+"""
+
+import os
+import pytest
+import subprocess
+import sys
+
+sys.path.append('/')
+
+from core.reuse import SETUP_FAILED, ContainerPool, exec_script
+
+
+@pytest.fixture
+def pool(state_path):
+    pool = ContainerPool(state_path, size=2)
+    pool.reset()
+    return pool
+
+def starter(container_id):
+    return lambda: {'id': container_id, 'entrypoint': [], 'cmd': []}
+
+
+def test_exec_script(tmpdir):
+    image_dir = tmpdir.mkdir('tmp')
+    image_dir.join('image_file').write('image\n')
+    outputs = tmpdir.mkdir('work').mkdir('task').mkdir('tmp')
+    tmpdir.join('work', 'input').write('input\n')
+    links = [(str(image_dir), str(outputs)), (str(image_dir.join('input')), str(tmpdir.join('work', 'input')))]
+    script = exec_script(links)
+    # the command sees the output directory of the task and its input in place of the files of the image
+    assert subprocess.check_output(['sh', '-c', script, 'sh', 'sh', '-c', 'cat {0}/input; ls {0} > {0}/output'.format(
+        image_dir)]) == b'input\n'
+    assert outputs.join('output').read() == 'input\noutput\n'
+    assert sorted(os.listdir(str(outputs))) == ['output']
+    # and the files of the image are restored afterwards
+    assert os.listdir(str(image_dir)) == ['image_file']
+    assert subprocess.call(['sh', '-c', script, 'sh', 'false']) == 1
+    assert subprocess.call(['sh', '-c', exec_script([('/proc/eod', '/')]), 'sh', 'true']) == SETUP_FAILED
+
+def test_lease_and_release(pool):
+    first = pool.lease('ctpts', starter('a'))
+    assert first['id'] == 'a'
+    assert pool.lease('ctpts', starter('b'))['id'] == 'b'
+    # the pool is full and both containers are busy
+    assert pool.lease('ctpts', starter('c')) is None
+    pool.release('ctpts', 'a')
+    assert pool.lease('ctpts', starter('c'))['id'] == 'a'
+    # a broken container is never leased again
+    pool.release('ctpts', 'b', broken=True)
+    assert pool.lease('ctpts', starter('c')) is None
+    assert sorted(pool.container_ids()) == ['a', 'b']
+
+def test_containers_of_dead_workers_are_not_reused(pool):
+    pool.lease('ctpts', starter('a'))
+    with pool.locked() as state:
+        state['ctpts']['containers']['a']['worker'] = 2 ** 22 + 1
+    assert pool.lease('ctpts', starter('b'))['id'] == 'b'
+    # both are removed when the next run starts
+    assert sorted(pool.reset()) == ['a', 'b']
+    assert pool.container_ids() == []
+
+def test_unusable_image(pool):
+    def fail():
+        raise subprocess.CalledProcessError(1, 'docker run')
+    # the task falls back to its own container
+    assert pool.lease('ctpts', fail) is None
+    assert pool.lease('ctpts', starter('a')) is None
@@ -0,0 +1,48 @@
+"""
+Tests for the server and client modules.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_server.py
+"""
+
+import io
+import os
+import pytest
+import sys
+import threading
+
+sys.path.append('/')
+
+from core.client import submit
+from core.server import EodServer, PlanCache
+
+HERE = os.path.dirname(os.path.abspath((__file__)))
+
+
+@pytest.fixture
+def server(tmpdir):
+    server = EodServer(str(tmpdir.join('.eod.sock')))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    while not os.path.exists(server.socket_path):
+        pass
+    yield server
+    server.stop()
+    thread.join()
+
+
+def test_plan_cache():
+    plans = PlanCache()
+    task_file = plans.get(os.path.join(HERE, 'sample_wf.yml'), [])
+    assert plans.get(os.path.join(HERE, 'sample_wf.yml'), []) is task_file
+    # other targets are planned separately
+    assert not plans.get(os.path.join(HERE, 'sample_wf.yml'), ['add_5']) is task_file
+
+def test_invalid_submission(server, tmpdir):
+    out = io.BytesIO()
+    assert submit(str(tmpdir.join('missing.yml')), socket_path=server.socket_path, out=out) == 1
+    assert b'No such file or directory' in out.getvalue()
+
+def test_no_daemon(tmpdir):
+    assert submit(os.path.join(HERE, 'sample_wf.yml'), socket_path=str(tmpdir.join('.eod.sock'))) == 1
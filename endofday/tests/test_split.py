@@ -0,0 +1,75 @@
+"""
+Tests for the split module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_split.py
+"""
+
+import sys
+
+sys.path.append('/')
+
+from core.split import index, merge_files, split_file
+
+
+def write(path, contents):
+    with open(path, 'w') as f:
+        f.write(contents)
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+def split(tmpdir, contents, chunks, fmt):
+    path = str(tmpdir.join('input'))
+    write(path, contents)
+    paths = [str(tmpdir.join('chunks', str(idx))) for idx in range(chunks)]
+    split_file(path, paths, fmt)
+    return paths
+
+
+def test_split_lines(tmpdir):
+    contents = ''.join('line {}\n'.format(idx) for idx in range(10))
+    paths = split(tmpdir, contents, 3, 'lines')
+    assert ''.join(read(path) for path in paths) == contents
+    assert all(read(path).endswith('\n') for path in paths)
+
+def test_split_fastq_at_record_boundaries(tmpdir):
+    # quality lines starting with '@' must not be taken for the start of a record
+    contents = ''.join('@read{}\nACGT\n+\n{}\n'.format(idx, '@III' if idx % 2 else 'IIII') for idx in range(50))
+    paths = split(tmpdir, contents, 4, 'fastq')
+    for path in paths:
+        lines = read(path).splitlines()
+        assert lines[0].startswith('@read')
+        assert len(lines) % 4 == 0
+    assert ''.join(read(path) for path in paths) == contents
+
+def test_split_fasta(tmpdir):
+    contents = ''.join('>seq{}\nACGT\nACGT\n'.format(idx) for idx in range(10))
+    paths = split(tmpdir, contents, 3, 'fasta')
+    assert all(read(path).startswith('>seq') for path in paths)
+
+def test_split_csv_keeps_header(tmpdir):
+    contents = 'id,value\n' + ''.join('{},{}\n'.format(idx, idx) for idx in range(20))
+    paths = split(tmpdir, contents, 3, 'csv')
+    assert all(read(path).startswith('id,value\n') for path in paths)
+    merged = str(tmpdir.join('merged'))
+    merge_files(paths, merged, header=True)
+    assert read(merged) == contents
+
+def test_more_chunks_than_records(tmpdir):
+    path = str(tmpdir.join('input'))
+    write(path, 'a\nb\n')
+    ranges = index(path, 'lines', 4)
+    assert len(ranges) == 4
+    assert sum(length for _, length in ranges) == 4
+
+def test_sort_merge(tmpdir):
+    paths = []
+    for idx, contents in enumerate(['a\nd\n', 'b\nc\ne']):
+        paths.append(str(tmpdir.join(str(idx))))
+        write(paths[-1], contents)
+    merged = str(tmpdir.join('merged'))
+    merge_files(paths, merged, 'sort')
+    assert read(merged) == 'a\nb\nc\nd\ne\n'
@@ -0,0 +1,45 @@
+"""
+Tests for the staging module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_staging.py
+"""
+
+import os
+import sys
+
+sys.path.append('/')
+
+from core.staging import link_file, link_files, remove_dir
+
+
+def test_link_files(tmpdir):
+    shards = []
+    for idx in range(3):
+        path = tmpdir.join('shard_{}.txt'.format(idx))
+        path.write('{}\n'.format(idx))
+        shards.append((str(path), str(idx)))
+    staged = str(tmpdir.join('staged'))
+    os.makedirs(os.path.join(staged, 'stale'))
+    # directories are never linked
+    assert link_files(shards + [(str(tmpdir.mkdir('dir')), 'dir')], staged) == ['0', '1', '2']
+    assert sorted(os.listdir(staged)) == ['0', '1', '2']
+    assert os.stat(os.path.join(staged, '1')).st_ino == os.stat(shards[1][0]).st_ino
+    remove_dir(staged)
+    assert not os.path.exists(staged)
+
+def test_missing_files_are_not_linked(tmpdir):
+    staged = str(tmpdir.join('staged'))
+    assert link_files([(str(tmpdir.join('missing.txt')), '0')], staged) == []
+    assert os.listdir(staged) == []
+
+def test_link_file_replaces_file(tmpdir):
+    output = tmpdir.join('output.bam')
+    output.write('new\n')
+    stale = tmpdir.join('task', 'data', 'input.bam')
+    stale.write('stale\n', ensure=True)
+    assert link_file(str(output), str(stale))
+    assert stale.read() == 'new\n'
+    # the directory of the link is created when missing
+    assert link_file(str(output), str(tmpdir.join('task', 'data', 'sub', 'input.bam')))
@@ -0,0 +1,59 @@
+"""
+Tests for the sweep module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_sweep.py
+"""
+
+import pytest
+import sys
+from collections import OrderedDict
+
+sys.path.append('/')
+
+from core.sweep import Sweep, map_sources, render, variables
+
+
+def processes():
+    return OrderedDict([
+        ('ref', {'image': 'jstubbs/index', 'inputs': ['inputs.genome -> /data/genome.fa'],
+                 'outputs': ['/data/index -> index']}),
+        ('fit', {'image': 'jstubbs/fit', 'inputs': [{'ref.index -> /data/index': {'split': 2}}],
+                 'outputs': ['/data/fit.txt -> fit'], 'command': 'python fit.py -a {{ alpha }}'}),
+        ('app', {'app_id': 'report', 'execution': 'agave_app', 'inputs': {'fits': ['fit.fit', 'inputs.genome']},
+                 'parameters': {'title': 'report {{ alpha }}'}}),
+    ])
+
+
+def test_variables_and_render():
+    desc = processes()['fit']
+    assert variables(desc) == set(['alpha'])
+    assert render(desc, {'alpha': 0.5})['command'] == 'python fit.py -a 0.5'
+    # strings without swept parameters are left alone
+    assert render('docker ps -f {{.Names}}', {'alpha': 0.5}) == 'docker ps -f {{.Names}}'
+
+def test_map_sources():
+    desc = map_sources(processes()['app'], lambda task: task.upper())
+    assert desc['inputs'] == {'fits': ['FIT.fit', 'INPUTS.genome']}
+    desc = map_sources(processes()['fit'], lambda task: task + '_1')
+    assert desc['inputs'] == [{'ref_1.index -> /data/index': {'split': 2}}]
+
+def test_sweep():
+    sweep = Sweep(OrderedDict([('alpha', [0.5, 1])]), processes())
+    expanded = sweep.processes()
+    assert list(expanded) == ['ref', 'fit_alpha_0_5', 'fit_alpha_1', 'app_alpha_0_5', 'app_alpha_1']
+    # the reference index does not depend on alpha and is shared
+    assert expanded['ref'] == processes()['ref']
+    assert expanded['fit_alpha_1']['inputs'] == [{'ref.index -> /data/index': {'split': 2}}]
+    assert expanded['app_alpha_1']['inputs'] == {'fits': ['fit_alpha_1.fit', 'inputs.genome']}
+    assert expanded['app_alpha_1']['parameters'] == {'title': 'report 1'}
+    assert sweep.expand_refs(['app.report', 'ref', 'inputs.genome']) == [
+        'app_alpha_0_5.report', 'app_alpha_1.report', 'ref', 'inputs.genome']
+
+def test_invalid_sweep():
+    with pytest.raises(SystemExit):
+        Sweep({'alpha': []}, processes())
+    # 0.5 and 0_5 give the same process name
+    with pytest.raises(SystemExit):
+        Sweep({'alpha': [0.5, '0_5']}, processes()).processes()
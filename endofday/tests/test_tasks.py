@@ -47,6 +47,51 @@ def mix_task_file():
     # task_file.create_tasks()
     return mix_task_file
 
+@pytest.fixture(scope='session')
+def cluster_task_file():
+    tf_path = os.path.join(HERE, 'sample_cluster_wf.yml')
+    return parse_yaml(tf_path)
+
+@pytest.fixture(scope='session')
+def cluster_dir_task_file():
+    tf_path = os.path.join(HERE, 'sample_cluster_dir_wf.yml')
+    return parse_yaml(tf_path)
+
+@pytest.fixture(scope='session')
+def dup_task_file():
+    tf_path = os.path.join(HERE, 'sample_dup_wf.yml')
+    return parse_yaml(tf_path)
+
+@pytest.fixture(scope='session')
+def split_task_file():
+    tf_path = os.path.join(HERE, 'sample_split_wf.yml')
+    return parse_yaml(tf_path)
+
+@pytest.fixture(scope='session')
+def sweep_task_file():
+    tf_path = os.path.join(HERE, 'sample_sweep_wf.yml')
+    return parse_yaml(tf_path)
+
+@pytest.fixture(scope='session')
+def local_task_file():
+    tf_path = os.path.join(HERE, 'sample_local_wf.yml')
+    return parse_yaml(tf_path)
+
+@pytest.fixture(scope='session')
+def python_task_file():
+    tf_path = os.path.join(HERE, 'sample_python_wf.yml')
+    return parse_yaml(tf_path)
+
+@pytest.fixture(scope='session')
+def auto_agave_task_file():
+    tf_path = os.path.join(HERE, 'sample_auto_wf.yml')
+    return parse_yaml(tf_path)
+
+@pytest.fixture(scope='session')
+def temp_task_file():
+    tf_path = os.path.join(HERE, 'sample_temp_wf.yml')
+    return parse_yaml(tf_path)
+
 
 def test_basic_task_file_attrs(task_file):
     assert task_file.path == os.path.join(HERE, 'sample_wf.yml')
@@ -218,6 +263,11 @@ def test_sum_inputs(task_file):
     assert inp.src_name == 'loc_in'
     assert inp.src_task == 'inputs'
 
+def test_global_outputs(task_file):
+    assert task_file.tasks[2].outputs[0].is_global_output
+    assert task_file.tasks[2].outputs[0].needs_local_copy()
+    assert not task_file.tasks[0].outputs[0].is_global_output
+
 
 
 # agave_task_file tests
@@ -385,4 +435,297 @@ def test_mix_inp_real_source(mix_task_file):
     task2 = mix_task_file.tasks[5]
     assert len(task2.inputs) == 1
     assert len(task2.outputs) == 1
-    assert inp.real_source == task2.outputs[0]
\ No newline at end of file
+    assert inp.real_source == task2.outputs[0]
+
+
+# cluster_task_file tests
+def test_cluster_tasks(cluster_task_file):
+    assert len(cluster_task_file.tasks) == 2
+    cluster = cluster_task_file.tasks[0]
+    assert cluster.name == 'agave_group_add_5'
+    assert cluster.execution == 'agave'
+    assert [member.name for member in cluster.members] == ['add_5', 'mult_3']
+    assert cluster_task_file.tasks[1].name == 'sum'
+
+def test_cluster_inputs(cluster_task_file):
+    cluster = cluster_task_file.tasks[0]
+    assert [inp.src for inp in cluster.inputs] == ['inputs.input', 'inputs.loc_in']
+    assert cluster.input_names == ['input.txt', 'loc_in.txt']
+    assert cluster.inputs[0].is_remote
+    assert not cluster.inputs[1].is_remote
+
+def test_cluster_boundary_outputs(cluster_task_file):
+    cluster = cluster_task_file.tasks[0]
+    assert len(cluster.outputs) == 1
+    out = cluster.outputs[0]
+    assert out.task_name == 'mult_3'
+    assert out.label == 'output'
+    assert out.used_locally
+    assert cluster.doit_dict['targets'] == ['/staging/test_suite_wf/mult_3/tmp/output']
+
+def test_cluster_directory_output(cluster_dir_task_file):
+    cluster, sum_task = cluster_dir_task_file.tasks
+    assert cluster.outputs[0].task_name == 'mult_3'
+    assert cluster.outputs[0].producer == cluster.name
+    # the consumer of a directory leaving the group depends on the group, as mult_3 is not a doit task
+    assert sum_task.doit_dict['task_dep'] == [cluster.name]
+
+def test_agave_remote_inputs(monkeypatch):
+    from core import tasks as tasks_module
+    from core.tasks import Config
+    # executors without an Agave client, so that parsing the workflow does not log in
+    monkeypatch.setattr(tasks_module, 'get_executor', lambda cls, wf_name, create_home_dir=True: cls.__new__(cls))
+    get_bool = Config.get_bool
+    monkeypatch.setattr(Config, 'get_bool', lambda section, option, default_value=False:
+                        False if option == 'cluster_agave_tasks' else get_bool(section, option, default_value))
+    add_5, mult_3 = parse_yaml(os.path.join(HERE, 'sample_remote_wf.yml')).tasks
+    assert add_5.inputs[0].is_remote
+    # the output of add_5 is a global output, so it is downloaded, and still passed to mult_3 as a URI
+    assert add_5.outputs[0].needs_local_copy()
+    assert mult_3.inputs[0].is_remote
+    assert add_5.outputs[0].get_uri_path() == '/staging/test_remote_wf/add_5/data/output.txt.eod_uri'
+    # the global input is a file containing its URI
+    assert add_5.inputs[0].real_source.get_uri_path() == add_5.inputs[0].real_source.eod_container_path
+
+def test_temp_outputs(temp_task_file):
+    assert temp_task_file.temp_policy == 'compress'
+    add_5, mult_3, sum_task = temp_task_file.tasks
+    assert add_5.outputs[0].temp
+    assert not mult_3.outputs[0].temp
+    # global outputs are never removed
+    assert not sum_task.outputs[0].temp
+
+def test_temp_consumers(temp_task_file):
+    add_5, mult_3, sum_task = temp_task_file.tasks
+    path = add_5.outputs[0].eod_container_path
+    assert temp_task_file.temp_consumers == {path: ['mult_3', 'sum']}
+    assert mult_3.temp_inputs == [path]
+    assert sum_task.temp_inputs == [path]
+    assert not add_5.temp_inputs
+    assert sum_task.release_temp_inputs in sum_task.doit_dict['actions']
+
+def test_prune_to_targets():
+    task_file = parse_yaml(os.path.join(HERE, 'sample_wf.yml'), targets=['mult_3.output'])
+    assert [task.name for task in task_file.tasks] == ['add_5', 'mult_3']
+    assert task_file.pruned == set(['sum'])
+
+def test_prune_unknown_target():
+    # Error exits with its message
+    with pytest.raises(SystemExit):
+        parse_yaml(os.path.join(HERE, 'sample_wf.yml'), targets=['mult_3.foo'])
+
+def test_unknown_global_output_label(tmpdir):
+    wf = tmpdir.join('unknown_output_wf.yml')
+    wf.write("""name: test_unknown_output_wf
+inputs:
+    - loc_in <- loc_in.txt
+outputs:
+    - add_5.foo
+processes:
+    add_5:
+        image: jstubbs/add_n
+        inputs:
+            - inputs.loc_in -> /data/input.txt
+        outputs:
+            - /data/output.txt -> output
+        command: python add_n.py -i 5
+""")
+    # the entry is skipped with a warning and nothing is pruned
+    task_file = parse_yaml(str(wf))
+    assert [task.name for task in task_file.tasks] == ['add_5']
+    assert not task_file.tasks[0].outputs[0].is_global_output
+
+def test_sweep(sweep_task_file):
+    names = [task.name for task in sweep_task_file.tasks]
+    assert names == ['prep', 'add_n_n_1', 'add_n_n_5', 'mult_n_n_1_f_2', 'mult_n_n_1_f_3', 'mult_n_n_5_f_2',
+                     'mult_n_n_5_f_3', 'sum_n_1_f_2', 'sum_n_1_f_3', 'sum_n_5_f_2', 'sum_n_5_f_3']
+    tasks = dict((task.name, task) for task in sweep_task_file.tasks)
+    assert tasks['add_n_n_5'].command == 'python add_n.py -i 5'
+    assert tasks['add_n_n_5'].inputs[0].real_source is tasks['prep'].outputs[0]
+    assert tasks['mult_n_n_5_f_3'].inputs[0].real_source is tasks['add_n_n_5'].outputs[0]
+    assert tasks['sum_n_1_f_3'].outputs[0].is_global_output
+
+def test_workflow_weight(task_file, tmpdir):
+    assert task_file.weight == 1
+    wf = tmpdir.join('weighted_wf.yml')
+    wf.write('name: weighted_wf\nweight: 0\ninputs: []\nprocesses: {}\n')
+    with pytest.raises(SystemExit):
+        parse_yaml(str(wf))
+
+def test_merge_identical_tasks(dup_task_file):
+    assert [task.name for task in dup_task_file.tasks] == ['add_5', 'mult_3', 'mult_4', 'sum']
+    add_5, mult_3, mult_4, sum_task = dup_task_file.tasks
+    assert mult_4.inputs[0].real_source is add_5.outputs[0]
+    assert mult_4.inputs[0].src == 'add_5.output'
+    assert [inp.real_source for inp in sum_task.inputs] == [mult_3.outputs[0], mult_3.outputs[0], mult_4.outputs[0]]
+
+def test_split_tasks(split_task_file):
+    assert [task.name for task in split_task_file.tasks] == ['add_5_split', 'add_5_chunk_0', 'add_5_chunk_1',
+                                                             'add_5_chunk_2', 'add_5', 'sum']
+    split = split_task_file.tasks[0]
+    assert [out.label for out in split.outputs] == ['chunk_0', 'chunk_1', 'chunk_2']
+    chunk = split_task_file.tasks[2]
+    assert chunk.image == 'jstubbs/add_n'
+    assert chunk.inputs[0].real_source is split.outputs[1]
+    assert chunk.inputs[0].dest == '/data/input.txt'
+    # splitting runs in the I/O pool of the concurrency limiter, the chunks in the CPU pool
+    assert split.pool == 'io'
+    assert chunk.pool == 'cpu'
+
+def test_merge_task(split_task_file):
+    merge, sum_task = split_task_file.tasks[4:]
+    assert merge.strategies == {'output': 'concat', 'log': {'image': 'jstubbs/merge_logs',
+                                                            'command': 'python merge.py /merge/log'}}
+    assert merge.image == 'jstubbs/merge_logs'
+    assert [inp.dest for inp in merge.inputs][:3] == ['/merge/output/0', '/merge/output/1', '/merge/output/2']
+    assert sum_task.inputs[0].real_source is merge.outputs[0]
+
+def test_staged_inputs(split_task_file, monkeypatch):
+    from core import tasks as tasks_module
+    merge = split_task_file.tasks[4]
+    monkeypatch.setattr(tasks_module, 'stage_inputs_min', 3)
+    groups = merge.staged_input_groups()
+    assert [(directory, len(volumes)) for directory, volumes in groups] == [('/merge/output', 3), ('/merge/log', 3)]
+    # every input of the merge container could be linked, so each directory is mounted once
+    monkeypatch.setattr(tasks_module, 'link_files', lambda links, dest_dir: [name for _, name in links])
+    with merge.staged_inputs() as input_volumes:
+        cmd, _, input_str = merge.get_docker_command(input_volumes=input_volumes)
+    assert input_str == ('-v /testsuite/cwd/on/host/test_split_wf/add_5/.eod_staged/0:/merge/output '
+                         '-v /testsuite/cwd/on/host/test_split_wf/add_5/.eod_staged/1:/merge/log ')
+    monkeypatch.setattr(tasks_module, 'stage_inputs_min', 4)
+    assert merge.staged_input_groups() == []
+
+def test_precreate_plan(task_file):
+    sum_task = [task for task in task_file.tasks if task.name == 'sum'][0]
+    volumes, links = sum_task.precreate_plan(unfinished=set(['mult_3']))
+    # the output of mult_3 is linked into the output directory of sum when it starts; loc_in is mounted as usual
+    assert [volume.container_path for volume in volumes] == ['/data/loc_in']
+    assert links == [('/staging/test_suite_wf/mult_3/tmp/output', '/staging/test_suite_wf/sum/data/in.txt')]
+    volumes, links = sum_task.precreate_plan(unfinished=set())
+    assert [volume.container_path for volume in volumes] == ['/data/in.txt', '/data/loc_in']
+    assert links == []
+
+def test_reuse_links(task_file):
+    sum_task = [task for task in task_file.tasks if task.name == 'sum'][0]
+    links = sum_task.reuse_links()
+    assert links == [('/data', '/.eod_work/test_suite_wf/sum/data'),
+                     ('/data/in.txt', '/.eod_work/test_suite_wf/mult_3/tmp/output'),
+                     ('/data/loc_in', '/.eod_work/loc_in.txt')]
+    cmd = sum_task.get_exec_command({'id': 'abc', 'entrypoint': ['/entry.sh'], 'cmd': []}, links)
+    assert cmd.startswith('docker exec abc sh -c ')
+    assert cmd.endswith(" sh /entry.sh python sum.py")
+    # the global input of add_5 is outside of the working directory, which is all the containers of a pool mount
+    add_5 = [task for task in task_file.tasks if task.name == 'add_5'][0]
+    assert add_5.reuse_links() is None
+
+def test_local_task(local_task_file):
+    from core.tasks import LocalTask
+    add_5, concat = local_task_file.tasks
+    assert isinstance(concat, LocalTask)
+    assert concat.image is None
+    assert not concat.can_precreate()
+    # the output of add_5 is consumed on the host
+    assert add_5.outputs[0].used_locally
+    assert concat.sandbox_links('/sandbox') == [
+        ('/sandbox/data', '/staging/test_local_wf/concat/data'),
+        ('/sandbox/data/parts/0', '/staging/loc_in.txt'),
+        ('/sandbox/data/parts/1', '/staging/test_local_wf/add_5/data/output.txt')]
+
+def test_python_task(python_task_file, tmpdir):
+    from core.tasks import PythonTask
+    add_5, concat = python_task_file.tasks
+    assert isinstance(concat, PythonTask)
+    assert add_5.outputs[0].used_locally
+    inputs, outputs = concat.call_args()
+    assert list(inputs.items()) == [('first', '/staging/loc_in.txt'),
+                                    ('second', '/staging/test_python_wf/add_5/data/output.txt')]
+    assert list(outputs.items()) == [('output', '/staging/test_python_wf/concat/data/output.txt')]
+    assert concat.doit_dict['targets'] == list(outputs.values())
+    from tests.sample_callables import concat as concat_fn
+    from core.callables import load
+    assert load(concat.callable) is concat_fn
+
+def test_auto_agave_task(auto_agave_task_file):
+    from core.tasks import AutoTask
+    add_5, add_10 = auto_agave_task_file.tasks
+    assert isinstance(add_5, AutoTask)
+    assert add_5.action == add_5.auto_action_fn
+    assert not add_5.can_precreate()
+    # the output of an auto task is always on the host, and uploaded for the agave task consuming it
+    assert add_5.outputs[0].needs_local_copy()
+    assert not add_10.inputs[0].is_remote
+    assert add_5.upload_bytes() == os.path.getsize(add_5.inputs[0].real_source.eod_container_path)
+
+def test_missing_callable(tmpdir):
+    wf = tmpdir.join('missing_callable_wf.yml')
+    wf.write("""name: test_missing_callable_wf
+inputs:
+    - loc_in <- loc_in.txt
+processes:
+    concat:
+        execution: python
+        callable: tests.sample_callables:missing
+        outputs:
+            - /data/output.txt -> output
+""")
+    with pytest.raises(SystemExit) as e:
+        parse_yaml(str(wf))
+    assert 'Callable not found' in str(e.value)
+
+def run_download(tmpdir, monkeypatch, remote, changes_during_download=False):
+    """
+    Run a download task of a URI whose remote version is remote, a dictionary with its etag and contents, through the
+    URI cache in tmpdir. Returns the cache.
+    """
+    from core import tasks as tasks_module
+    from core.cache import UriCache
+    from core.tasks import AgaveDownloadTask, BaseDockerTask
+
+    class Stub(object):
+        pass
+    task = AgaveDownloadTask.__new__(AgaveDownloadTask)
+    task.obj = Stub()
+    task.obj.eod_container_path = str(tmpdir.join('uri'))
+    tmpdir.join('uri').write(URI + '\n')
+    output = Stub()
+    output.eod_container_path = str(tmpdir.join('dest'))
+    task.outputs = [output]
+    task.ae = Stub()
+
+    def check_uri(uri, validators=None):
+        current = {'etag': remote['etag']}
+        return current != validators, current
+    task.ae.check_uri = check_uri
+    cache = UriCache(str(tmpdir.join('cache')))
+    monkeypatch.setattr(tasks_module, 'get_uri_cache', lambda cache_dir: cache)
+
+    def download(self):
+        with open(self.outputs[0].eod_container_path, 'w') as f:
+            f.write(remote['contents'])
+        if changes_during_download:
+            remote.update(etag='v3', contents='v3')
+    monkeypatch.setattr(BaseDockerTask, 'local_action_fn', download)
+    task.local_action_fn()
+    return cache
+
+URI = 'agave://ex.storage.system//data/input.txt'
+
+def test_cached_download(tmpdir, monkeypatch):
+    remote = {'etag': 'v1', 'contents': 'v1'}
+    cache = run_download(tmpdir, monkeypatch, remote)
+    assert open(cache.data_path(URI)).read() == 'v1'
+    # a consumer writing to its input does not change the cached file
+    tmpdir.join('dest').write('corrupt')
+    run_download(tmpdir, monkeypatch, remote)
+    assert tmpdir.join('dest').read() == 'v1'
+    remote.update(etag='v2', contents='v2')
+    cache = run_download(tmpdir, monkeypatch, remote)
+    assert tmpdir.join('dest').read() == 'v2'
+    assert open(cache.data_path(URI)).read() == 'v2'
+
+def test_download_changed_meanwhile_is_not_cached(tmpdir, monkeypatch):
+    remote = {'etag': 'v1', 'contents': 'v1'}
+    cache = run_download(tmpdir, monkeypatch, remote, changes_during_download=True)
+    # the validators of v3 must not be recorded for the contents of v1
+    assert tmpdir.join('dest').read() == 'v1'
+    assert cache.lookup(URI) is None
@@ -0,0 +1,74 @@
+"""
+Tests for the temp module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_temp.py
+"""
+
+import os
+import pytest
+import sys
+
+sys.path.append('/')
+
+from core.temp import COMPRESSED_SUFFIX, TempOutputChecker, TempOutputs, read_stub, restore, retire
+
+
+def write(path, contents):
+    with open(path, 'w') as f:
+        f.write(contents)
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+@pytest.fixture
+def output(tmpdir):
+    path = str(tmpdir.join('out.sam'))
+    write(path, 'aligned reads\n' * 100)
+    return path
+
+
+def test_delete_policy(output):
+    checker = TempOutputChecker()
+    state = checker.get_state(output, None)
+    retire(output, 'delete')
+    stub = read_stub(output)
+    assert stub['md5'] == state[2]
+    assert os.path.getsize(output) < stub['size']
+    # the stub is seen as the original file
+    assert not checker.check_modified(output, os.stat(output), state)
+    assert checker.get_state(output, state) is None
+    # and a retired output without a compressed copy has to be regenerated
+    assert not restore(output)
+
+def test_compress_policy(output):
+    contents = read(output)
+    mtime = os.path.getmtime(output)
+    retire(output, 'compress')
+    assert os.path.exists(output + COMPRESSED_SUFFIX)
+    assert read_stub(output)
+    assert restore(output)
+    assert read(output) == contents
+    assert abs(os.path.getmtime(output) - mtime) < 1e-3
+    assert not os.path.exists(output + COMPRESSED_SUFFIX)
+
+def test_keep_policy(output):
+    contents = read(output)
+    retire(output, 'keep')
+    assert read(output) == contents
+
+def test_modified_output_is_detected(output):
+    checker = TempOutputChecker()
+    state = checker.get_state(output, None)
+    write(output, 'other reads\n')
+    assert checker.check_modified(output, os.stat(output), state)
+
+def test_release_after_last_consumer(output, tmpdir):
+    temp = TempOutputs(str(tmpdir.join('.eod_temp.json')))
+    temp.reset({output: ['sort', 'index']})
+    temp.release('sort', [output])
+    assert not read_stub(output)
+    temp.release('index', [output])
+    assert read_stub(output)
@@ -0,0 +1,27 @@
+"""
+Tests for the threads module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_threads.py
+"""
+
+import sys
+import threading
+
+sys.path.append('/')
+
+from core.error import Error
+from core.threads import QueueThread
+
+
+def test_thread_survives_errors():
+    thread = QueueThread('upload inputs')
+    thread.start()
+    done = threading.Event()
+    thread.submit(lambda: Error("upload failed"))
+    thread.submit(lambda: 1 / 0)
+    thread.submit(done.set)
+    assert done.wait(5)
+    thread.stop()
+    assert not thread.is_alive()
@@ -0,0 +1,59 @@
+"""
+Tests for the trace module.
+
+To run the tests:
+1. Build the latest image as jstubbs/eod and run tests using:
+    $ docker run --rm -it --entrypoint=py.test -v /:/host -v $(pwd):/staging -e RUNNING_IN_DOCKER=true -e STAGING_DIR=/testsuite/cwd/on/host jstubbs/eod /tests/test_trace.py
+"""
+
+import json
+import os
+import sys
+
+sys.path.append('/')
+
+from core.trace import Tracer, job_history_spans, parse_timestamp
+
+
+def test_parse_timestamp():
+    assert parse_timestamp('1970-01-01T00:00:10.500Z') == 10.5
+    assert parse_timestamp('1970-01-01T00:00:00.000-06:00') == 6 * 3600
+    assert parse_timestamp('not a date') is None
+
+def test_job_history_spans():
+    history = [{'status': 'PENDING', 'created': '2016-02-28T10:00:00.000-06:00'},
+               {'status': 'QUEUED', 'created': '2016-02-28T10:00:05.000-06:00'},
+               {'status': 'RUNNING', 'created': '2016-02-28T10:01:05.000-06:00'},
+               {'status': 'ARCHIVING', 'created': '2016-02-28T10:03:05.000-06:00'},
+               {'status': 'FINISHED', 'created': '2016-02-28T10:03:15.000-06:00'}]
+    spans = dict((name, end - start) for name, start, end in job_history_spans(history))
+    assert spans == {'remote staging': 5, 'job queue wait': 60, 'remote run': 120, 'remote archiving': 10}
+
+def test_disabled_tracer(tmpdir):
+    tracer = Tracer()
+    with tracer.span('plan'):
+        pass
+    path = str(tmpdir.join('trace.json'))
+    tracer.write_trace(path)
+    assert not os.path.exists(path)
+
+def test_write_trace(tmpdir):
+    path = str(tmpdir.join('trace.json'))
+    tracer = Tracer(events_path=path + '.events')
+    tracer.add('plan', 100.0, 100.5)
+    with tracer.span('container run', task='add_5', image='jstubbs/add_n') as span:
+        span['exit_code'] = 0
+    tracer.add('download', 101.0, 102.0, task='add_5', bytes=10)
+    tracer.write_trace(path)
+    assert not os.path.exists(path + '.events')
+    events = json.load(open(path))['traceEvents']
+    rows = dict((event['args']['name'], event['tid']) for event in events if event['ph'] == 'M')
+    assert sorted(rows.keys()) == ['add_5', 'engine']
+    spans = dict((event['name'], event) for event in events if event['ph'] == 'X')
+    assert spans['plan']['ts'] == 0
+    assert spans['plan']['dur'] == 500000
+    assert spans['plan']['tid'] == rows['engine']
+    assert spans['download']['args']['bytes'] == 10
+    assert spans['container run']['args']['image'] == 'jstubbs/add_n'
+    assert spans['container run']['args']['exit_code'] == 0
+    assert spans['container run']['tid'] == rows['add_5']